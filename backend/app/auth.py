@@ -1,13 +1,17 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import BackgroundTasks, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 from clerk_backend_api import Clerk
-from clerk_backend_api.security.verifytoken import verify_token
-from clerk_backend_api.security.types import VerifyTokenOptions
 from dotenv import load_dotenv
 from . import models
-from .database import get_db
-from sqlalchemy.orm import Session
+from .database import get_async_db, SessionLocal
+from .cache import TTLCache
+from .token_verifier import verifier_from_env
+from .services import counters
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
 load_dotenv()
 
@@ -15,12 +19,185 @@ security = HTTPBearer()
 # The new SDK uses bearer_auth instead of bearer_token
 clerk = Clerk(bearer_auth=os.getenv("CLERK_SECRET_KEY"))
 
+# Session tokens are verified offline against Clerk's cached JWKS
+token_verifier = verifier_from_env()
+
+# Resolved principals keyed by Clerk subject. Entries never outlive the token
+# they were built from and are dropped explicitly when roles/subroles change.
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300")),
+)
+
+# Clerk subjects whose profile was synced recently; an entry's lifetime is the
+# minimum gap between two background profile syncs for the same user.
+profile_sync_marks = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("AUTH_PROFILE_SYNC_INTERVAL_SECONDS", "3600")),
+)
+
+def invalidate_principal(clerk_id: str):
+    """Forces the next request for this Clerk user to be resolved from scratch."""
+    if clerk_id:
+        principal_cache.invalidate(clerk_id)
+
+def fetch_clerk_profile(user_id: str):
+    """Returns (email, full_name) for a Clerk user via the Backend API."""
+    print(f"[AUTH] Fetching user {user_id} from Clerk API...")
+    try:
+        user_res = clerk.users.get(user_id=user_id)
+    except Exception as e:
+        print(f"[AUTH ERROR] Clerk API fetch failed: {str(e)}")
+        raise
+
+    # Try to extract the user data
+    if hasattr(user_res, 'to_dict'):
+        user = user_res.to_dict()
+    elif hasattr(user_res, 'dict'):
+        user = user_res.dict()
+    else:
+        # Fallback if it's already a dict or something else
+        user = user_res
+
+    print(f"[AUTH] User data retrieved. Name: {user.get('first_name')} {user.get('last_name')}")
+
+    email_addresses = user.get("email_addresses", [])
+    email = email_addresses[0].get("email_address") if email_addresses else None
+    full_name = f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip()
+    return email, full_name
+
+def build_principal(db_user: models.User, clerk_id: str):
+    return {
+        "role": db_user.role,
+        "id": str(db_user.id),
+        "clerk_id": clerk_id,
+        "email": db_user.email,
+        "full_name": db_user.full_name,
+        "assigned_class_id": str(db_user.assigned_class_id) if db_user.assigned_class_id else None,
+        "assigned_stream_id": str(db_user.assigned_stream_id) if db_user.assigned_stream_id else None,
+        "subroles": [sr.subrole_name for sr in db_user.subroles]
+    }
+
+def link_or_create_user(db: Session, user_id: str, email: str, full_name: str):
+    """
+    Slow path for Clerk users without a linked local record: links an
+    existing account by email or registers a new one. This is the only
+    place the auth dependency writes to the database. The Clerk profile is
+    fetched by the caller so no HTTP call happens inside the DB session.
+    """
+    print(f"[AUTH] Syncing to DB. Email: {email}")
+
+    try:
+        db_user = None
+        if email:
+            print(f"[AUTH] User {user_id} not found by Clerk ID. Searching by email: {email}")
+            db_user = db.query(models.User).filter(models.User.email == email).first()
+            if db_user:
+                print(f"[AUTH] Found existing user by email. Linking Clerk ID {user_id}")
+                db_user.clerk_id = user_id
+                if full_name:
+                    db_user.full_name = full_name
+                db.commit()
+                return db_user
+
+        # If user doesn't exist, create them and assign role ONCE
+        print(f"[AUTH] No existing record for {email}. Creating new user...")
+
+        # Check registration policy before creating new user
+        config = db.query(models.GlobalConfig).first()
+        if config and not config.allow_public_signup:
+            # If this is the FIRST user ever, we ALWAYS allow it as SUPER_ADMIN
+            user_count = db.query(models.User).count()
+            if user_count > 0:
+                print(f"[AUTH] Access blocked for {email}: Public registration disabled.")
+                raise HTTPException(status_code=403, detail="Registration is currently disabled.")
+
+        user_count = db.query(models.User).count()
+        assigned_role = "SUPER_ADMIN" if user_count == 0 else "none"
+        print(f"[AUTH] ASSIGNING PERMANENT ROLE: {assigned_role}")
+
+        db_user = models.User(
+            clerk_id=user_id,
+            email=email,
+            full_name=full_name,
+            role=assigned_role
+        )
+        db.add(db_user)
+        counters.bump(db, **counters.role_deltas(None, assigned_role))
+        try:
+            db.commit()
+            db.refresh(db_user)
+
+            # If this is the FIRST user, also assign the 'director' subrole
+            if assigned_role == "SUPER_ADMIN":
+                db_subrole = models.UserSubrole(user_id=db_user.id, subrole_name="director")
+                db.add(db_subrole)
+                db.commit()
+                print(f"[AUTH] Assigned 'director' subrole to first user: {email}")
+
+            print(f"[AUTH] New local user created with ID: {db_user.id}, Role: {db_user.role}")
+        except Exception as commit_err:
+            print(f"[AUTH ERROR] Failed to commit new user: {str(commit_err)}")
+            db.rollback()
+            db_user = db.query(models.User).filter(models.User.email == email).first()
+            if not db_user:
+                raise HTTPException(status_code=500, detail="User synchronization failed.")
+        return db_user
+
+    except HTTPException:
+        raise
+    except Exception as db_err:
+        print(f"[AUTH ERROR] Database operation failed: {str(db_err)}")
+        raise
+
+def profile_sync_due(clerk_id: str):
+    """True at most once per PROFILE_SYNC_INTERVAL for a given Clerk user."""
+    if profile_sync_marks.get(clerk_id):
+        return False
+    profile_sync_marks.set(clerk_id, True)
+    return True
+
+def sync_clerk_profile(clerk_id: str):
+    """
+    Background task: pulls name/email from Clerk and writes them back only
+    if they drifted. Runs after the response with its own session.
+    """
+    db = SessionLocal()
+    try:
+        email, full_name = fetch_clerk_profile(clerk_id)
+        db_user = db.query(models.User).filter(models.User.clerk_id == clerk_id).first()
+        if not db_user:
+            return
+
+        needs_update = False
+        if full_name and db_user.full_name != full_name:
+            db_user.full_name = full_name
+            needs_update = True
+        if email and db_user.email != email:
+            db_user.email = email
+            needs_update = True
+
+        if needs_update:
+            db.commit()
+            invalidate_principal(clerk_id)
+            print(f"[AUTH] Profile metadata synced for {email}")
+    except Exception as e:
+        db.rollback()
+        # Let the next request retry instead of waiting out the interval
+        profile_sync_marks.invalidate(clerk_id)
+        print(f"[AUTH ERROR] Profile sync failed for {clerk_id}: {str(e)}")
+    finally:
+        db.close()
+
 async def get_current_user(
+    background_tasks: BackgroundTasks,
     auth: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verifies the Clerk JWT and returns the user object with its role.
+    Runs on the event loop: DB reads go through the async session and
+    blocking calls (JWKS refresh, Clerk API) are pushed to the threadpool.
     """
     token = auth.credentials
     print(f"[AUTH] Start get_current_user. Token present: {bool(token)}")
@@ -30,7 +207,11 @@ async def get_current_user(
         if os.getenv("ENV") == "dev" and token == "dev_token_admin":
             print("[AUTH] Mock token detected. Returning dev admin.")
             # Fetch a real admin user to ensure FKs work
-            admin = db.query(models.User).filter(models.User.role == "SUPER_ADMIN").first()
+            result = await db.execute(
+                select(models.User).options(selectinload(models.User.subroles))
+                .filter(models.User.role == "SUPER_ADMIN").limit(1)
+            )
+            admin = result.scalars().first()
             if admin:
                  return {
                      "role": "SUPER_ADMIN", 
@@ -44,10 +225,9 @@ async def get_current_user(
             # Fallback if no admin exists (e.g. fresh db)
             return {"role": "SUPER_ADMIN", "id": "33333333-3333-3333-3333-333333333333", "email": "dev@admin.com", "full_name": "Dev Admin"}
             
-        # Verify the token locally (or via JWKS)
+        # Verify the token locally against the cached JWKS
         print("[AUTH] Verifying token...")
-        options = VerifyTokenOptions(secret_key=os.getenv("CLERK_SECRET_KEY"))
-        payload = verify_token(token, options)
+        payload = await run_in_threadpool(token_verifier.verify, token)
         
         user_id = payload.get("sub")
         print(f"[AUTH] Token verified. Subject (user_id): {user_id}")
@@ -56,126 +236,32 @@ async def get_current_user(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token payload",
             )
+
+        cached = principal_cache.get(user_id)
+        if cached is not None:
+            print(f"[AUTH] Principal cache hit for {user_id}")
+            return {**cached, "subroles": list(cached["subroles"])}
         
-        # Fetch the full user object to get metadata
-        print(f"[AUTH] Fetching user {user_id} from Clerk API...")
-        try:
-            user_res = clerk.users.get(user_id=user_id)
-        except Exception as e:
-            print(f"[AUTH ERROR] Clerk API fetch failed: {str(e)}")
-            raise
-        
-        # Try to extract the user data
-        if hasattr(user_res, 'to_dict'):
-            user = user_res.to_dict()
-        elif hasattr(user_res, 'dict'):
-            user = user_res.dict()
+        # Fast path: the account is already linked, so a single indexed
+        # read is enough. Profile drift is handled off the request path.
+        result = await db.execute(
+            select(models.User).options(
+                selectinload(models.User.subroles)
+            ).filter(models.User.clerk_id == user_id)
+        )
+        db_user = result.scalars().first()
+        if db_user:
+            if profile_sync_due(user_id):
+                background_tasks.add_task(sync_clerk_profile, user_id)
         else:
-            # Fallback if it's already a dict or something else
-            user = user_res
-        
-        print(f"[AUTH] User data retrieved. Name: {user.get('first_name')} {user.get('last_name')}")
-        
-        # We store the role in public_metadata
-        role = user.get("public_metadata", {}).get("role", "librarian")
-        email_addresses = user.get("email_addresses", [])
-        email = email_addresses[0].get("email_address") if email_addresses else None
-        full_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
-
-        print(f"[AUTH] Syncing to DB. Email: {email}")
+            email, full_name = await run_in_threadpool(fetch_clerk_profile, user_id)
+            db_user = await db.run_sync(link_or_create_user, user_id, email, full_name)
+            await db.refresh(db_user, ["subroles"])
 
-        try:
-            # 1. Find user in local database
-            # Strategy: Find by clerk_id first, then try email to handle migrations/merges
-            db_user = db.query(models.User).filter(models.User.clerk_id == user_id).first()
-            
-            if not db_user and email:
-                print(f"[AUTH] User {user_id} not found by Clerk ID. Searching by email: {email}")
-                db_user = db.query(models.User).filter(models.User.email == email).first()
-                if db_user:
-                    print(f"[AUTH] Found existing user by email. Linking Clerk ID {user_id}")
-                    db_user.clerk_id = user_id
-                    db.commit()
-
-            # 2. If user doesn't exist, create them and assign role ONCE
-            newly_created = False
-            if not db_user:
-                print(f"[AUTH] No existing record for {email}. Creating new user...")
-                
-                # Check registration policy before creating new user
-                config = db.query(models.GlobalConfig).first()
-                if config and not config.allow_public_signup:
-                    # If this is the FIRST user ever, we ALWAYS allow it as SUPER_ADMIN
-                    user_count = db.query(models.User).count()
-                    if user_count > 0:
-                        print(f"[AUTH] Access blocked for {email}: Public registration disabled.")
-                        raise HTTPException(status_code=403, detail="Registration is currently disabled.")
-
-                user_count = db.query(models.User).count()
-                assigned_role = "SUPER_ADMIN" if user_count == 0 else "none"
-                print(f"[AUTH] ASSIGNING PERMANENT ROLE: {assigned_role}")
-
-                db_user = models.User(
-                    clerk_id=user_id,
-                    email=email,
-                    full_name=full_name,
-                    role=assigned_role
-                )
-                db.add(db_user)
-                try:
-                    db.commit()
-                    db.refresh(db_user)
-                    
-                    # If this is the FIRST user, also assign the 'director' subrole
-                    if assigned_role == "SUPER_ADMIN":
-                        db_subrole = models.UserSubrole(user_id=db_user.id, subrole_name="director")
-                        db.add(db_subrole)
-                        db.commit()
-                        print(f"[AUTH] Assigned 'director' subrole to first user: {email}")
-
-                    newly_created = True
-                    print(f"[AUTH] New local user created with ID: {db_user.id}, Role: {db_user.role}")
-                except Exception as commit_err:
-                    print(f"[AUTH ERROR] Failed to commit new user: {str(commit_err)}")
-                    db.rollback()
-                    db_user = db.query(models.User).filter(models.User.email == email).first()
-                    if not db_user:
-                        raise HTTPException(status_code=500, detail="User synchronization failed.")
-            
-            # 3. Source of Truth: Use the role strictly from the Database
-            role = db_user.role
-            print(f"[AUTH] Database role for {email}: {role}")
-
-            # 4. Sync profile metadata (excluding role) to keep DB fresh
-            needs_update = False
-            if db_user.full_name != full_name and full_name:
-                db_user.full_name = full_name
-                needs_update = True
-            if db_user.email != email and email:
-                db_user.email = email
-                needs_update = True
-            
-            if needs_update:
-                db.commit()
-                print(f"[AUTH] Profile metadata synced for {email}")
-
-        except HTTPException:
-            raise
-        except Exception as db_err:
-            print(f"[AUTH ERROR] Database operation failed: {str(db_err)}")
-            raise
-
-        print(f"[AUTH] get_current_user COMPLETED for {email} ({role})")
-        return {
-            **user, 
-            "role": role, 
-            "id": str(db_user.id), 
-            "email": email, 
-            "full_name": full_name,
-            "assigned_class_id": str(db_user.assigned_class_id) if db_user.assigned_class_id else None,
-            "assigned_stream_id": str(db_user.assigned_stream_id) if db_user.assigned_stream_id else None,
-            "subroles": [sr.subrole_name for sr in db_user.subroles]
-        }
+        print(f"[AUTH] get_current_user COMPLETED for {db_user.email} ({db_user.role})")
+        principal = build_principal(db_user, user_id)
+        principal_cache.set(user_id, principal, expires_at=payload.get("exp"))
+        return {**principal, "subroles": list(principal["subroles"])}
         
     except HTTPException:
         raise
@@ -1,8 +1,12 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from . import models, database
+from . import models, database, query_stats
+from .services import counters, report_cards, summary_refresh, recalculation
 from .routers import books, students, classes, streams, circulation, analytics, users, auth, config, logs, subjects, assignments, student_auth, student_portal, finance, student_features, timetable, attendance, cbc, report_items, head_teacher_comments, admin_exams
 
 load_dotenv()
@@ -10,7 +14,31 @@ load_dotenv()
 # Initialize tables
 models.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI(title="Library Star Pro API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Term summaries left over by the previous process
+    await run_in_threadpool(summary_refresh.flush, database.engine)
+    # Periodically fails recalculation jobs whose process stopped
+    job_checker = asyncio.create_task(recalculation.fail_interrupted_jobs_periodically())
+    # Periodically corrects drift in the dashboard counters
+    reconciler = None
+    if counters.RECONCILE_INTERVAL_SECONDS > 0:
+        reconciler = asyncio.create_task(counters.reconcile_periodically())
+    yield
+    job_checker.cancel()
+    if reconciler:
+        reconciler.cancel()
+    await run_in_threadpool(summary_refresh.flush)
+    report_cards.shutdown_pool()
+
+app = FastAPI(title="Library Star Pro API", lifespan=lifespan)
+
+# Per-request SQL statement counts / DB time (X-DB-Queries, X-DB-Time)
+if query_stats.QUERY_STATS_ENABLED:
+    query_stats.instrument_engine(database.engine)
+    if database.async_engine is not None:
+        query_stats.instrument_engine(database.async_engine.sync_engine)
+    app.middleware("http")(query_stats.query_stats_middleware)
 
 # Configure CORS
 app.add_middleware(
@@ -25,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time"],
 )
 
 # Include Routers
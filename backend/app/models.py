@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Date, Time, ForeignKey, Text, Table, UniqueConstraint, Enum
+from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Date, Time, ForeignKey, Text, Table, UniqueConstraint, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -145,6 +145,7 @@ class Student(Base):
     admission_number = Column(String, unique=True, index=True)
     password = Column(String, nullable=True) # Hashed password for student login
     activated = Column(Boolean, default=False)
+    token_version = Column(Integer, default=0, nullable=False) # Bumped to revoke issued portal tokens
     profile_photo = Column(String, nullable=True)
     class_id = Column(UUID(as_uuid=True), ForeignKey("classes.id"), nullable=True)
     stream_id = Column(UUID(as_uuid=True), ForeignKey("streams.id"), nullable=True)
@@ -268,6 +269,10 @@ class AssignmentSubmission(Base):
 
 class ExamResult(Base):
     __tablename__ = "exam_results"
+    __table_args__ = (
+        # Natural key for bulk upserts; a result without an exam is still one row per key
+        UniqueConstraint('student_id', 'exam_id', 'subject_id', 'term', 'year', name='unique_exam_result', postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
@@ -293,12 +298,34 @@ class FeeRecord(Base):
     date = Column(DateTime, default=datetime.datetime.utcnow)
     description = Column(String)
     recorded_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    fee_structure_id = Column(UUID(as_uuid=True), ForeignKey("fee_structures.id", ondelete="SET NULL"), nullable=True) # Set on structure charges
 
     student = relationship("Student", back_populates="fee_records")
     recorded_by = relationship("User")
 
+    __table_args__ = (
+        # Ledger keyset pagination walks (date, id) per student
+        Index("ix_fee_records_student_date", "student_id", "date", "id"),
+        # A fee structure charges each student at most once
+        UniqueConstraint("fee_structure_id", "student_id", name="uq_fee_record_structure_student"),
+    )
+
+class StudentFeeBalance(Base):
+    """Per-student fee totals, kept in step with fee_records by the finance write paths"""
+    __tablename__ = "student_fee_balances"
+
+    student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    total_charged = Column(Float, nullable=False, default=0)
+    total_paid = Column(Float, nullable=False, default=0)
+    balance = Column(Float, nullable=False, default=0) # total_charged - total_paid
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class FeeStructure(Base):
     __tablename__ = "fee_structures"
+    __table_args__ = (
+        # One structure per fee and class; bulk charges upsert on it
+        UniqueConstraint('class_id', 'title', 'term', 'year', name='uq_fee_structure_class_title_term_year'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     class_id = Column(UUID(as_uuid=True), ForeignKey("classes.id", ondelete="CASCADE"), nullable=False)
@@ -342,6 +369,10 @@ class Book(Base):
 
 class BorrowRecord(Base):
     __tablename__ = "borrow_records"
+    __table_args__ = (
+        # Live overdue count on the dashboard
+        Index('ix_borrow_records_status_due_date', 'status', 'due_date'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     book_id = Column(UUID(as_uuid=True), ForeignKey("books.id"))
@@ -378,6 +409,14 @@ class GlobalConfig(Base):
     allow_public_signup = Column(Boolean, default=True)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+class DashboardCounter(Base):
+    """Rollup counters for the analytics dashboard, kept in step by the write paths"""
+    __tablename__ = "dashboard_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
 
 
 class SystemLog(Base):
@@ -464,6 +503,9 @@ class Competency(Base):
 
 class StudentCompetencyAssessment(Base):
     __tablename__ = "student_competency_assessments"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'subject_id', 'competency_id', 'exam_id', 'term', 'year', name='unique_competency_assessment', postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -500,6 +542,9 @@ class Rubric(Base):
 
 class SubjectTermResult(Base):
     __tablename__ = "subject_term_results"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'subject_id', 'term', 'year', name='unique_subject_term_result', postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
@@ -515,6 +560,20 @@ class SubjectTermResult(Base):
     student = relationship("Student", back_populates="subject_term_results")
     subject = relationship("Subject")
 
+class PendingSummaryRefresh(Base):
+    """SubjectTermResult keys waiting for the debounced refresh (services/summary_refresh)"""
+    __tablename__ = "pending_summary_refreshes"
+    __table_args__ = (
+        UniqueConstraint('subject_id', 'term', 'year', 'student_id', name='unique_pending_summary_refresh', postgresql_nulls_not_distinct=True),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    subject_id = Column(UUID(as_uuid=True), nullable=False)
+    term = Column(String)
+    year = Column(Integer)
+    student_id = Column(UUID(as_uuid=True), nullable=False)
+    marked_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
 # ─── Admin-Configurable Report Items ────────────────────────────────────────
 report_item_type_enum = Enum(
     "competency",
@@ -585,3 +644,82 @@ class HeadTeacherCommentTemplate(Base):
     comment = Column(Text, nullable=False)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+
+# ─── Background Recalculation Jobs ───────────────────────────────────────────
+class RecalculationJob(Base):
+    """A term-wide recalculation of SubjectTermResults, run in the background"""
+    __tablename__ = "recalculation_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    term = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    status = Column(String, default="pending") # pending | running | completed | completed_with_errors | failed
+    total_subjects = Column(Integer, default=0, nullable=False)
+    completed_subjects = Column(Integer, default=0, nullable=False)
+    failed_subjects = Column(Integer, default=0, nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True) # Refreshed by the process running the job
+    finished_at = Column(DateTime, nullable=True)
+
+    items = relationship("RecalculationJobItem", back_populates="job", cascade="all, delete-orphan")
+
+class RecalculationJobItem(Base):
+    """Per-subject progress of a RecalculationJob"""
+    __tablename__ = "recalculation_job_items"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("recalculation_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    subject_id = Column(UUID(as_uuid=True), ForeignKey("subjects.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, default="pending") # pending | running | completed | failed
+    summaries_count = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    job = relationship("RecalculationJob", back_populates="items")
+    subject = relationship("Subject")
+
+    @property
+    def subject_name(self):
+        return self.subject.name if self.subject else None
+
+# ─── Report Card Snapshots ───────────────────────────────────────────────────
+class ReportCardSnapshot(Base):
+    """Frozen report card document for a completed term, served as-is to the portal"""
+    __tablename__ = "report_card_snapshots"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'term', 'year', name='unique_report_card_snapshot'),
+        Index('ix_report_card_snapshots_term_year', 'term', 'year'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    term = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    document = Column(Text, nullable=False) # Serialized report card JSON
+    etag = Column(String, nullable=False) # sha256 of document
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# ─── Rankings ────────────────────────────────────────────────────────────────
+class StudentRanking(Base):
+    """
+    Materialized positions for a term. `scope` is class | stream (overall mean
+    of subject summaries), subject (SubjectTermResult.total_score) or exam
+    (ExamResult percentage); `ref_id` is the class, stream, subject or exam.
+    """
+    __tablename__ = "student_rankings"
+
+    term = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    scope = Column(String, primary_key=True)
+    ref_id = Column(UUID(as_uuid=True), primary_key=True)
+    student_id = Column(UUID(as_uuid=True), ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=True)
+    position = Column(Integer, nullable=False)
+    out_of = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_student_rankings_student_term', 'student_id', 'term', 'year'),
+    )
@@ -0,0 +1,88 @@
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+
+# Per-request SQL accounting. The middleware puts a fresh RequestQueryStats in
+# the context; engine event hooks add to whatever stats object is current.
+# Sync routes run in the threadpool with a copy of the request context, so
+# they see (and mutate) the same object. The statement count and DB time are
+# cheap and always on (DB_QUERY_STATS=false opts out). Tallying statement
+# shapes for N+1 logging is on by default only in development (ENV=dev); set
+# DB_NPLUSONE_LOGGING to override.
+QUERY_STATS_ENABLED = os.getenv("DB_QUERY_STATS", "true").lower() not in ("0", "false", "no")
+NPLUSONE_LOGGING_ENABLED = os.getenv("DB_NPLUSONE_LOGGING", "true" if os.getenv("ENV") == "dev" else "false").lower() not in ("0", "false", "no")
+NPLUSONE_THRESHOLD = int(os.getenv("DB_NPLUSONE_THRESHOLD", "5"))
+
+class RequestQueryStats:
+    def __init__(self, track_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter() if track_statements else None
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        if self.statements is not None:
+            self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int):
+        """Statement shapes executed at least `threshold` times - probable N+1 loads."""
+        if self.statements is None:
+            return []
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("current_query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start_time")
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+def instrument_engine(engine):
+    """Attaches the statement counters to a sync Engine (use async_engine.sync_engine for async)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def endpoint_name(request: Request):
+    endpoint = request.scope.get("endpoint")
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if endpoint is not None:
+        return f"{request.method} {path} ({endpoint.__name__})"
+    return f"{request.method} {path}"
+
+async def query_stats_middleware(request: Request, call_next):
+    """Adds X-DB-Queries / X-DB-Time headers and, if enabled, logs probable N+1 patterns."""
+    if not QUERY_STATS_ENABLED:
+        return await call_next(request)
+
+    stats = RequestQueryStats(track_statements=NPLUSONE_LOGGING_ENABLED)
+    token = current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        current_stats.reset(token)
+
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time"] = f"{stats.duration * 1000:.2f}"
+
+    repeated = stats.repeated_statements(NPLUSONE_THRESHOLD)
+    if repeated:
+        name = endpoint_name(request)
+        for statement, n in repeated:
+            shape = " ".join(statement.split())
+            print(f"[DB] Probable N+1 in {name}: {n}x {shape[:200]}")
+    return response
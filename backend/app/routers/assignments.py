@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import schemas, auth, database
@@ -19,7 +20,10 @@ async def create_assignment(
     db: Session = Depends(database.get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    """Creates an assignment with optional file upload to Cloudinary"""
+    """
+    Creates an assignment with optional file upload to Cloudinary. The upload
+    and the DB write are blocking, so both run in the threadpool.
+    """
     # Authorization: Only teachers can create assignments
     if current_user.get("role") not in ["teacher", "admin", "SUPER_ADMIN"]:
         raise HTTPException(status_code=403, detail="Only teachers can create assignments")
@@ -27,7 +31,7 @@ async def create_assignment(
     # Handle file upload
     file_data = None
     if file:
-        file_data = cloudinary.upload_file(file.file, filename=file.filename)
+        file_data = await run_in_threadpool(cloudinary.upload_file, file.file, filename=file.filename)
         if not file_data:
             raise HTTPException(status_code=500, detail="Failed to upload file to Cloudinary")
 
@@ -40,7 +44,7 @@ async def create_assignment(
         teacher_id=current_user.get("id")
     )
 
-    return service.create_assignment(db, assignment_data, file_data)
+    return await run_in_threadpool(service.create_assignment, db, assignment_data, file_data)
 
 @router.get("/", response_model=List[schemas.AssignmentResponse])
 def list_assignments(
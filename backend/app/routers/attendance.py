@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from uuid import UUID
 import datetime
@@ -12,10 +13,10 @@ router = APIRouter(
 )
 
 @router.post("/submit", response_model=schemas.AttendanceSessionResponse)
-def submit_attendance(
+async def submit_attendance(
     data: schemas.AttendanceBulkSubmit,
     current_user: dict = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     # Validate that timetable_slot_id is provided
     if not data.timetable_slot_id:
@@ -25,11 +26,12 @@ def submit_attendance(
         )
     
     # Check if session exists for this subject, date, AND timetable slot
-    session = db.query(models.AttendanceSession).filter(
+    result = await db.execute(select(models.AttendanceSession).filter(
         models.AttendanceSession.subject_id == data.subject_id,
         models.AttendanceSession.session_date == data.date,
         models.AttendanceSession.timetable_slot_id == data.timetable_slot_id
-    ).first()
+    ))
+    session = result.scalars().first()
 
     if not session:
         # Create new session
@@ -42,23 +44,22 @@ def submit_attendance(
             submitted_at=datetime.datetime.utcnow()
         )
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await db.flush()
     else:
         # Update existing session details
         session.teacher_id = UUID(current_user['id']) # Update teacher if changed
         session.status = "submitted"
         session.submitted_at = datetime.datetime.utcnow()
-        db.commit()
+
+    # Load the session's existing records once instead of one query per student
+    result = await db.execute(select(models.AttendanceRecord).filter(
+        models.AttendanceRecord.attendance_session_id == session.id
+    ))
+    existing = {r.student_id: r for r in result.scalars()}
 
     # Process records
     for item in data.students:
-        # Check if record exists
-        record = db.query(models.AttendanceRecord).filter(
-            models.AttendanceRecord.attendance_session_id == session.id,
-            models.AttendanceRecord.student_id == item.student_id
-        ).first()
-
+        record = existing.get(item.student_id)
         if record:
             record.status = item.status
         else:
@@ -68,22 +69,24 @@ def submit_attendance(
                 status=item.status
             )
             db.add(record)
-    
-    db.commit()
-    db.refresh(session)
+            existing[item.student_id] = record
+
+    await db.commit()
+    await db.refresh(session)
     return session
 
 @router.get("/session/{subject_id}/{date}", response_model=schemas.AttendanceSessionResponse)
-def get_attendance_session(
+async def get_attendance_session(
     subject_id: UUID,
     date: datetime.date,
     current_user: dict = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    session = db.query(models.AttendanceSession).filter(
+    result = await db.execute(select(models.AttendanceSession).filter(
         models.AttendanceSession.subject_id == subject_id,
         models.AttendanceSession.session_date == date
-    ).first()
+    ))
+    session = result.scalars().first()
 
     if not session:
         raise HTTPException(status_code=404, detail="Attendance session not found")
@@ -91,12 +94,12 @@ def get_attendance_session(
     return session
 
 @router.get("/records/{session_id}", response_model=List[schemas.AttendanceRecordResponse])
-def get_session_records(
+async def get_session_records(
     session_id: UUID,
     current_user: dict = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    records = db.query(models.AttendanceRecord).filter(
+    result = await db.execute(select(models.AttendanceRecord).filter(
         models.AttendanceRecord.attendance_session_id == session_id
-    ).all()
-    return records
+    ))
+    return result.scalars().all()
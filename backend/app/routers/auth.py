@@ -7,7 +7,7 @@ router = APIRouter()
 def get_me(current_user: dict = Depends(auth.get_current_user)):
     """
     Returns the current user's database record.
-    The get_current_user dependency ensures the DB is synced with Clerk.
+    Profile fields are kept in sync with Clerk in the background by get_current_user.
     """
     return {
         "id": current_user.get("id"),
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from .. import schemas, auth, models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..services import cbc as service
+from ..services import recalculation
+from ..services import admin_exams
+from ..services import score_sheet
+from ..services import report_cards
+from ..services import rankings
+from ..services import exam_statistics
 from uuid import UUID
 
 router = APIRouter(prefix="/cbc", tags=["CBC Grading"])
@@ -15,9 +24,42 @@ def check_teacher_admin_access(current_user: dict = Depends(auth.get_current_use
         return current_user
     raise HTTPException(status_code=403, detail="Access denied. Requires Teacher or Admin role.")
 
+async def run_read(db: AsyncSession, response_type, fn, *args, **kwargs):
+    """
+    Runs a sync service read on the async session and serializes the result
+    inside the same call, so relationship lazy loads in the response schema
+    happen while the session can still perform I/O.
+    """
+    def call(session: Session):
+        result = fn(session, *args, **kwargs)
+        if result is None:
+            return None
+        return TypeAdapter(response_type).validate_python(result, from_attributes=True)
+    return await db.run_sync(call)
+
+def resolve_term(db: Session, term: Optional[str], year: Optional[int]):
+    """Fills a missing term/year from the current term exam (cached academic calendar)."""
+    if term is None or year is None:
+        current = admin_exams.get_current_term(db)
+        if current:
+            term = term or current[0]
+            year = year or current[1]
+    return term, year
+
+async def term_params(
+    term: Optional[str] = None,
+    year: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Dependency for the `term` / `year` query parameters, defaulting to the
+    current term. The session only connects when the calendar cache misses.
+    """
+    return await db.run_sync(resolve_term, term, year)
+
 @router.get("/competencies", response_model=List[schemas.CompetencyResponse])
-def list_competencies(db: Session = Depends(get_db)):
-    return service.get_competencies(db)
+async def list_competencies(db: AsyncSession = Depends(get_async_db)):
+    return await run_read(db, List[schemas.CompetencyResponse], service.get_competencies)
 
 @router.post("/competencies/with-rubrics", response_model=schemas.CompetencyResponse)
 def create_competency_with_rubrics(
@@ -28,8 +70,8 @@ def create_competency_with_rubrics(
     return service.create_competency_with_rubrics(db, competency)
 
 @router.get("/subjects/{subject_id}/competencies", response_model=List[schemas.CompetencyResponse])
-def get_subject_competencies(subject_id: str, db: Session = Depends(get_db)):
-    competencies = service.get_subject_competencies(db, subject_id)
+async def get_subject_competencies(subject_id: str, db: AsyncSession = Depends(get_async_db)):
+    competencies = await run_read(db, List[schemas.CompetencyResponse], service.get_subject_competencies, subject_id)
     if competencies is None:
         raise HTTPException(status_code=404, detail="Subject not found")
     return competencies
@@ -55,32 +97,29 @@ def create_assessment(
     return service.create_competency_assessment(db, assessment, teacher.get("id"))
 
 @router.get("/assessments/student/{student_id}", response_model=List[schemas.StudentCompetencyAssessmentResponse])
-def get_student_assessments(
+async def get_student_assessments(
     student_id: str,
     subject_id: Optional[str] = None,
-    db: Session = Depends(get_db),
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
     # Authorization: Teachers/Admins or the Student themselves
     # For now, keeping it simple as per other routers
-    return service.get_student_assessments(db, student_id, subject_id)
+    return await run_read(db, List[schemas.StudentCompetencyAssessmentResponse], service.get_student_assessments, student_id, subject_id, skip=skip, limit=limit)
 
 @router.get("/assessments/subject/{subject_id}", response_model=List[schemas.StudentCompetencyAssessmentResponse])
-def get_subject_assessments(
+async def get_subject_assessments(
     subject_id: str,
-    term: Optional[str] = None,
-    year: Optional[int] = None,
-    db: Session = Depends(get_db),
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-
-    return service.get_subject_assessments(db, subject_id, term, year)
+    term, year = term_year
+    return await run_read(db, List[schemas.StudentCompetencyAssessmentResponse], service.get_subject_assessments, subject_id, term, year, skip=skip, limit=limit)
 
 @router.post("/rubrics/bulk", response_model=List[schemas.RubricResponse])
 def bulk_create_rubrics(
@@ -91,12 +130,12 @@ def bulk_create_rubrics(
     return service.bulk_create_rubrics(db, rubrics)
 
 @router.get("/rubrics/subject/{subject_id}", response_model=List[schemas.RubricResponse])
-def get_subject_rubrics(subject_id: str, db: Session = Depends(get_db)):
-    return service.get_subject_rubrics(db, subject_id)
+async def get_subject_rubrics(subject_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await run_read(db, List[schemas.RubricResponse], service.get_subject_rubrics, subject_id)
 
 @router.get("/rubrics/{rubric_id}", response_model=schemas.RubricResponse)
-def get_rubric(rubric_id: str, db: Session = Depends(get_db)):
-    rubric = service.get_rubric(db, rubric_id)
+async def get_rubric(rubric_id: str, db: AsyncSession = Depends(get_async_db)):
+    rubric = await run_read(db, schemas.RubricResponse, service.get_rubric, rubric_id)
     if not rubric:
         raise HTTPException(status_code=404, detail="Rubric not found")
     return rubric
@@ -110,29 +149,22 @@ def create_summary(
     return service.create_or_update_subject_term_result(db, summary)
 
 @router.get("/summaries/student/{student_id}", response_model=List[schemas.SubjectTermResultResponse])
-def get_student_summaries(
+async def get_student_summaries(
     student_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    return service.get_student_term_summaries(db, student_id)
+    return await run_read(db, List[schemas.SubjectTermResultResponse], service.get_student_term_summaries, student_id)
 
 @router.get("/summaries/subject/{subject_id}", response_model=List[schemas.SubjectTermResultResponse])
-def list_subject_summaries(
+async def list_subject_summaries(
     subject_id: str,
-    term: Optional[str] = None,
-    year: Optional[int] = None,
-    db: Session = Depends(get_db),
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: AsyncSession = Depends(get_async_db),
     teacher: dict = Depends(check_teacher_admin_access)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-    
-    return service.get_subject_term_results(db, subject_id, term, year)
+    term, year = term_year
+    return await run_read(db, List[schemas.SubjectTermResultResponse], service.get_subject_term_results, subject_id, term, year)
 
 @router.post("/subjects/{subject_id}/recalculate-summaries", response_model=List[schemas.SubjectTermResultResponse])
 def recalculate_subject_summaries(
@@ -145,6 +177,57 @@ def recalculate_subject_summaries(
     """Automates SubjectTermResult generation by averaging exam marks."""
     return service.calculate_subject_term_summaries(db, subject_id, term, year)
 
+@router.post("/recalculation-jobs", response_model=schemas.RecalculationJobResponse, status_code=202)
+def start_recalculation_job(
+    data: schemas.RecalculationJobCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    admin_user: dict = Depends(check_teacher_admin_access)
+):
+    """Recalculates every subject's term summaries for a term in the background."""
+    if admin_user.get("role") not in ["admin", "SUPER_ADMIN"]:
+        raise HTTPException(status_code=403, detail="Only admins can recalculate a whole term.")
+    job = recalculation.create_job(db, data.term, data.year, created_by=admin_user.get("id"))
+    background_tasks.add_task(recalculation.run_job, job.id)
+    return job
+
+@router.get("/recalculation-jobs/{job_id}", response_model=schemas.RecalculationJobResponse)
+def get_recalculation_job(
+    job_id: UUID,
+    db: Session = Depends(get_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    job = recalculation.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Recalculation job not found")
+    return job
+
+# Rankings
+@router.post("/rankings/compute")
+def compute_rankings(
+    data: schemas.RankingComputeRequest,
+    db: Session = Depends(get_db),
+    admin_user: dict = Depends(check_teacher_admin_access)
+):
+    """Recomputes and stores class, stream, subject and exam positions for a term."""
+    if admin_user.get("role") not in ["admin", "SUPER_ADMIN"]:
+        raise HTTPException(status_code=403, detail="Only admins can recompute rankings for a whole term.")
+    return rankings.compute_term_rankings(db, data.term, data.year, data.tie_method)
+
+@router.get("/rankings", response_model=List[schemas.RankingEntryResponse])
+async def list_rankings(
+    scope: str,
+    ref_id: UUID,
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Stored positions for one class, stream, subject or exam (ref_id), best first."""
+    term, year = term_year
+    return await run_read(db, List[schemas.RankingEntryResponse], rankings.get_rankings, term, year, scope, ref_id, skip=skip, limit=limit)
+
 # Exam Result Endpoints
 @router.post("/exams/results", response_model=schemas.ExamResultResponse)
 def create_exam_result(
@@ -163,22 +246,18 @@ def bulk_create_exam_results(
     return service.bulk_upsert_exam_results(db, bulk_data, teacher_id=teacher.get("id"))
 
 @router.get("/exams/results", response_model=List[schemas.ExamResultResponse])
-def list_exam_results(
+async def list_exam_results(
     student_id: Optional[str] = None,
     subject_id: Optional[str] = None,
-    term: Optional[str] = None,
-    year: Optional[int] = None,
-    db: Session = Depends(get_db),
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-            
-    return service.get_exam_results(db, student_id=student_id, subject_id=subject_id, term=term, year=year)
+    term, year = term_year
+    return await run_read(
+        db, List[schemas.ExamResultResponse], service.get_exam_results,
+        student_id=student_id, subject_id=subject_id, term=term, year=year
+    )
 
 # Exam Management
 @router.post("/exams", response_model=schemas.ExamResponse)
@@ -190,20 +269,25 @@ def create_exam(
     return service.create_exam(db, exam)
 
 @router.get("/exams/subject/{subject_id}", response_model=List[schemas.ExamResponse])
-def get_subject_exams(
+async def get_subject_exams(
     subject_id: str,
-    term: Optional[str] = None,
-    year: Optional[int] = None,
-    db: Session = Depends(get_db)
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-            
-    return service.get_subject_exams(db, subject_id, term, year)
+    term, year = term_year
+    return await run_read(db, List[schemas.ExamResponse], service.get_subject_exams, subject_id, term, year)
+
+@router.get("/exams/{exam_id}/statistics", response_model=schemas.ExamStatisticsResponse)
+async def get_exam_statistics(
+    exam_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Score distribution for an exam, overall and per class / stream."""
+    stats = await db.run_sync(exam_statistics.get_exam_statistics, exam_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return stats
 
 @router.delete("/exams/{exam_id}")
 def delete_exam(
@@ -226,73 +310,40 @@ def update_exam_competencies(
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     return exam
+
+# Class Score Sheet
+def teacher_class(teacher: dict):
+    class_id = teacher.get("assigned_class_id")
+    if not class_id:
+        raise HTTPException(status_code=400, detail="Teacher is not assigned to any class.")
+    return class_id, teacher.get("assigned_stream_id")
+
 @router.get("/class-score-sheet", response_model=schemas.ClassScoreSheetResponse)
 def get_class_score_sheet(
-    term: Optional[str] = None,
-    year: Optional[int] = None,
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
     db: Session = Depends(get_db),
     teacher: dict = Depends(check_teacher_admin_access)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-            
-    class_id = teacher.get("assigned_class_id")
-    stream_id = teacher.get("assigned_stream_id")
-
-    if not class_id:
-        raise HTTPException(status_code=400, detail="Teacher is not assigned to any class.")
-
-    # Fetch students
-    student_query = db.query(models.Student).filter(models.Student.class_id == class_id)
-    if stream_id:
-        student_query = student_query.filter(models.Student.stream_id == stream_id)
-    students = student_query.all()
-
-    # Fetch subjects
-    subject_query = db.query(models.Subject).filter(models.Subject.class_id == class_id)
-    if stream_id:
-        subject_query = subject_query.filter(
-            (models.Subject.stream_id == stream_id) | (models.Subject.stream_id == None)
+    term, year = term_year
+    class_id, stream_id = teacher_class(teacher)
+    sheet = score_sheet.get_score_sheet(db, class_id, stream_id, term, year)
+
+    subject_ids = sheet["subject_ids"]
+    response_students = [
+        schemas.StudentScoreSummary(
+            id=student_id,
+            full_name=full_name,
+            admission_number=admission_number,
+            results=dict(zip(subject_ids, levels))
         )
-    subjects = subject_query.all()
-
-    # Fetch results
-    student_ids = [s.id for s in students]
-    subject_ids = [sub.id for sub in subjects]
-    
-    results_query = db.query(models.SubjectTermResult).filter(
-        models.SubjectTermResult.student_id.in_(student_ids),
-        models.SubjectTermResult.subject_id.in_(subject_ids)
-    )
-    if term:
-        results_query = results_query.filter(models.SubjectTermResult.term == term)
-    if year:
-        results_query = results_query.filter(models.SubjectTermResult.year == year)
-    
-    existing_results = results_query.all()
-    
-    # Map results for quick lookup: (student_id, subject_id) -> performance_level
-    results_map = { (r.student_id, r.subject_id): r.performance_level for r in existing_results }
-
-    # Format response
-    response_students = []
-    for s in students:
-        student_results = {}
-        for sub in subjects:
-            student_results[str(sub.id)] = results_map.get((s.id, sub.id))
-        
-        response_students.append(schemas.StudentScoreSummary(
-            id=s.id,
-            full_name=s.full_name,
-            admission_number=s.admission_number,
-            results=student_results
-        ))
-
-    response_subjects = [schemas.SubjectInfo(id=sub.id, name=sub.name) for sub in subjects]
+        for student_id, full_name, admission_number, levels in zip(
+            sheet["student_ids"], sheet["student_names"], sheet["admission_numbers"], sheet["levels"]
+        )
+    ]
+    response_subjects = [
+        schemas.SubjectInfo(id=subject_id, name=name)
+        for subject_id, name in zip(subject_ids, sheet["subject_names"])
+    ]
 
     return schemas.ClassScoreSheetResponse(
         students=response_students,
@@ -301,74 +352,88 @@ def get_class_score_sheet(
         year=year
     )
 
+@router.get("/class-score-sheet/columnar", response_model=schemas.ClassScoreSheetColumnarResponse)
+def get_class_score_sheet_columnar(
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: Session = Depends(get_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Compact score sheet: student/subject id arrays plus a level matrix."""
+    term, year = term_year
+    class_id, stream_id = teacher_class(teacher)
+    return score_sheet.get_score_sheet(db, class_id, stream_id, term, year)
+
+@router.get("/class-score-sheet/export")
+def export_class_score_sheet(
+    format: str = "csv",
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: Session = Depends(get_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Streams the class score sheet as CSV (default) or XLSX."""
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'xlsx'")
+    term, year = term_year
+    class_id, stream_id = teacher_class(teacher)
+    sheet = score_sheet.get_score_sheet(db, class_id, stream_id, term, year)
+
+    filename = f"score-sheet-{term or 'all'}-{year or 'all'}".replace(" ", "-").lower()
+    if format == "xlsx":
+        body = score_sheet.iter_xlsx(sheet)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = score_sheet.iter_csv(sheet)
+        media_type = "text/csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
+
+# Declared before /term-reports/{student_id} so "batch" is not taken for an id
+@router.get("/term-reports/batch")
+def batch_report_cards(
+    class_id: UUID,
+    stream_id: Optional[UUID] = None,
+    format: str = "html",
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
+    db: Session = Depends(get_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Streams a ZIP with one rendered report card (HTML or PDF) per student in the class."""
+    if format not in report_cards.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'html' or 'pdf'")
+    if format == "pdf" and not report_cards.pdf_available():
+        raise HTTPException(status_code=501, detail="PDF rendering is not available on this server")
+    term, year = term_year
+    if not term or not year:
+        raise HTTPException(status_code=400, detail="term and year are required")
+
+    cards = report_cards.load_class_report_cards(db, class_id, stream_id, term, year)
+    if not cards:
+        raise HTTPException(status_code=404, detail="No students found for this class")
+
+    filename = f"report-cards-{term}-{year}".replace(" ", "-").lower()
+    return StreamingResponse(
+        report_cards.iter_zip(cards, format),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'}
+    )
+
 @router.get("/term-reports/{student_id}", response_model=schemas.FullReportCardResponse)
 def get_student_report_card(
     student_id: UUID,
-    term: Optional[str] = None,
-    year: Optional[int] = None,
+    term_year: Tuple[Optional[str], Optional[int]] = Depends(term_params),
     db: Session = Depends(get_db),
     teacher: dict = Depends(check_teacher_admin_access)
 ):
-    if term is None or year is None:
-        from ..services import admin_exams
-        current = admin_exams.get_current_term_exam(db)
-        if current:
-            term = term or current.term
-            year = year or current.year
-    # 1. Fetch student with class/stream
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if not student:
+    """The student's report card, built the same way as the portal's (positions included)."""
+    term, year = term_year
+    students = report_cards.student_query(db).filter(models.Student.id == student_id).all()
+    if not students:
         raise HTTPException(status_code=404, detail="Student not found")
-
-    # Resolve class teacher name: find user with assigned_class_id == student's class
-    class_teacher_name = "N/A"
-    if student.class_id:
-        class_teacher = db.query(models.User).filter(
-            models.User.assigned_class_id == student.class_id
-        ).first()
-        if class_teacher:
-            class_teacher_name = class_teacher.full_name
-
-    # 2. Fetch Term Report with eagerly loaded entries
-    term_report = db.query(models.TermReport).filter(
-        models.TermReport.student_id == student_id,
-        models.TermReport.term == term,
-        models.TermReport.year == year
-    ).first()
-
-    # 3. Fetch Subject Results with subject names
-    subject_results = db.query(models.SubjectTermResult, models.Subject.name).join(
-        models.Subject, models.Subject.id == models.SubjectTermResult.subject_id
-    ).filter(
-        models.SubjectTermResult.student_id == student_id,
-        models.SubjectTermResult.term == term,
-        models.SubjectTermResult.year == year
-    ).all()
-
-    subjects_data = [
-        {
-            "id": str(r.SubjectTermResult.id),
-            "subject_id": str(r.SubjectTermResult.subject_id),
-            "subject_name": r.name,
-            "performance_level": r.SubjectTermResult.performance_level,
-            "remarks": r.SubjectTermResult.remarks
-        }
-        for r in subject_results
-    ]
-
-    return {
-        "student": {
-            "full_name": student.full_name,
-            "admission_number": student.admission_number,
-            "grade": student.student_class.name if student.student_class else "N/A",
-            "stream": student.assigned_stream.name if student.assigned_stream else "N/A",
-            "class_teacher": class_teacher_name,
-        },
-        "term": term,
-        "year": year,
-        "subjects": subjects_data,
-        "term_report": term_report
-    }
+    [card] = report_cards.build_cards(db, students, term, year)
+    return card
 
 
 @router.post("/term-reports", response_model=schemas.TermReportResponse)
@@ -377,44 +442,19 @@ def upsert_term_report(
     db: Session = Depends(get_db),
     teacher: dict = Depends(check_teacher_admin_access)
 ):
-    # Upsert the header (attendance + comments)
-    report = db.query(models.TermReport).filter(
+    # Header upsert plus an entry diff; entries are only touched when sent
+    service.upsert_term_reports(db, [report_data])
+    return db.query(models.TermReport).filter(
         models.TermReport.student_id == report_data.student_id,
         models.TermReport.term == report_data.term,
         models.TermReport.year == report_data.year
     ).first()
 
-    if report:
-        report.total_days = report_data.total_days
-        report.present_days = report_data.present_days
-        report.teacher_comment = report_data.teacher_comment
-        report.head_teacher_comment = report_data.head_teacher_comment
-    else:
-        report = models.TermReport(
-            student_id=report_data.student_id,
-            term=report_data.term,
-            year=report_data.year,
-            total_days=report_data.total_days,
-            present_days=report_data.present_days,
-            teacher_comment=report_data.teacher_comment,
-            head_teacher_comment=report_data.head_teacher_comment,
-        )
-        db.add(report)
-        db.flush()  # get id before adding entries
-
-    # Rebuild entries (delete + re-insert for simplicity)
-    if report_data.entries:
-        db.query(models.TermReportEntry).filter(
-            models.TermReportEntry.report_id == report.id
-        ).delete()
-        for entry_data in report_data.entries:
-            entry = models.TermReportEntry(
-                report_id=report.id,
-                item_id=entry_data.item_id,
-                level=entry_data.level
-            )
-            db.add(entry)
-
-    db.commit()
-    db.refresh(report)
-    return report
+@router.post("/term-reports/bulk", response_model=schemas.TermReportBulkResult)
+def bulk_upsert_term_reports(
+    bulk_data: schemas.TermReportBulkCreate,
+    db: Session = Depends(get_db),
+    teacher: dict = Depends(check_teacher_admin_access)
+):
+    """Saves a whole class's term report headers and entry levels in a few set-based statements."""
+    return service.upsert_term_reports(db, bulk_data.reports)
@@ -1,5 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from typing import List, Optional
+from uuid import UUID
 from .. import database, auth, schemas
 from ..services import finance as service
 
@@ -21,6 +24,35 @@ def bulk_charge(
         current_user["email"]
     )
 
+@router.post("/bulk-charge/classes", response_model=schemas.BulkFeeChargeResult)
+def bulk_charge_classes(
+    charge_in: schemas.BulkFeeChargeRequest,
+    db: Session = Depends(database.get_db),
+    current_user: dict = Depends(auth.require_role(["admin", "SUPER_ADMIN", "finance"]))
+):
+    """Charge one fee to several classes/streams. Students already charged for it are skipped."""
+    return service.bulk_charge_classes(
+        db,
+        charge_in.class_ids,
+        charge_in.stream_ids,
+        charge_in.title,
+        charge_in.amount,
+        charge_in.term,
+        charge_in.year,
+        current_user["email"]
+    )
+
+@router.post("/fee-structures/{structure_id}/charge", response_model=schemas.BulkFeeChargeResult)
+def charge_fee_structure(
+    structure_id: UUID,
+    charge_in: Optional[schemas.FeeStructureChargeRequest] = None,
+    db: Session = Depends(database.get_db),
+    current_user: dict = Depends(auth.require_role(["admin", "SUPER_ADMIN", "finance"]))
+):
+    """Re-apply a fee structure, charging only students it has not charged yet."""
+    stream_ids = charge_in.stream_ids if charge_in else None
+    return service.charge_fee_structure(db, structure_id, stream_ids, current_user["email"])
+
 @router.post("/payments")
 def record_payment(
     payment_in: schemas.FeeRecordCreate,
@@ -35,3 +67,47 @@ def record_payment(
         current_user["id"], 
         current_user["email"]
     )
+
+@router.get("/balances", response_model=List[schemas.StudentFeeBalanceResponse])
+def list_balances(
+    class_id: Optional[UUID] = None,
+    stream_id: Optional[UUID] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: dict = Depends(auth.require_role(["admin", "SUPER_ADMIN", "finance"]))
+):
+    """Charged, paid and outstanding totals for every student, read from the maintained balances."""
+    return service.get_balances(db, class_id, stream_id, skip=skip, limit=limit)
+
+@router.get("/students/{student_id}/ledger", response_model=schemas.FeeLedgerResponse)
+def get_student_ledger(
+    student_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = service.LEDGER_PAGE_SIZE,
+    db: Session = Depends(database.get_db),
+    current_user: dict = Depends(auth.require_role(["admin", "SUPER_ADMIN", "finance"]))
+):
+    """Newest records first with running balances; pass next_cursor back to page further."""
+    return service.get_ledger(db, student_id, cursor, limit)
+
+@router.get("/arrears", response_model=schemas.ArrearsReport)
+def get_arrears(
+    class_id: Optional[UUID] = None,
+    stream_id: Optional[UUID] = None,
+    format: str = "json",
+    db: Session = Depends(database.get_db),
+    current_user: dict = Depends(auth.require_role(["admin", "SUPER_ADMIN", "finance"]))
+):
+    """Outstanding fees per class and stream, aged 0-30/31-60/61-90/90+ days. format=csv streams a download."""
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'csv'")
+    report = service.get_arrears(db, class_id, stream_id)
+    if format == "json":
+        return report
+    filename = f"arrears-{report['as_of']:%Y-%m-%d}"
+    return StreamingResponse(
+        service.iter_arrears_csv(report),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+    )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional, Any
 from jose import JWTError, jwt
 import bcrypt
 from .. import database, models, schemas
+from ..services import students as students_service
+from uuid import UUID
 import os
 
 router = APIRouter()
@@ -45,31 +48,97 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class StudentPrincipal:
+    """
+    The identity carried by a portal access token. Most portal endpoints only
+    need these ids; call load() when the full Student row is required.
+    """
+    def __init__(self, id: UUID, class_id: Optional[UUID], stream_id: Optional[UUID], activated: bool):
+        self.id = id
+        self.class_id = class_id
+        self.stream_id = stream_id
+        self.activated = activated
+
+    @classmethod
+    def from_student(cls, student: models.Student):
+        return cls(student.id, student.class_id, student.stream_id, bool(student.activated))
+
+    def load(self, db: Session) -> Optional[models.Student]:
+        return db.query(models.Student).filter(models.Student.id == self.id).first()
+
+def student_token_claims(student: models.Student):
+    return {
+        "sub": str(student.id),
+        "role": "student",
+        "class_id": str(student.class_id) if student.class_id else None,
+        "stream_id": str(student.stream_id) if student.stream_id else None,
+        "activated": bool(student.activated),
+        "ver": student.token_version or 0,
+    }
+
+def _optional_uuid(value: Optional[str]):
+    return UUID(value) if value else None
+
 async def get_current_student(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    not_activated_exception = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Account not activated. Please complete onboarding."
+    )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         student_id: str = payload.get("sub")
         if student_id is None:
             raise credentials_exception
-    except JWTError:
+        student_uuid = UUID(student_id)
+    except (JWTError, ValueError):
         raise credentials_exception
-    
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if student is None:
+
+    # Tokens minted before claims were embedded: fall back to the full row
+    if "ver" not in payload:
+        student = await db.get(models.Student, student_uuid)
+        if student is None:
+            raise credentials_exception
+        if not student.activated:
+            raise not_activated_exception
+        return StudentPrincipal.from_student(student)
+
+    # Revocation check: account resets and class/stream moves bump the version
+    current_version = await db.run_sync(students_service.get_token_version, student_uuid)
+    if current_version is None or current_version != payload["ver"]:
         raise credentials_exception
-    if not student.activated:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Account not activated. Please complete onboarding."
+    if not payload.get("activated"):
+        raise not_activated_exception
+
+    try:
+        return StudentPrincipal(
+            student_uuid,
+            _optional_uuid(payload.get("class_id")),
+            _optional_uuid(payload.get("stream_id")),
+            True,
         )
+    except ValueError:
+        raise credentials_exception
+
+async def get_current_student_record(
+    current_student: StudentPrincipal = Depends(get_current_student),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Loads the full Student row for endpoints that need profile fields.
+    Relationships are not loaded; use StudentPrincipal.load() with a sync
+    session when those are needed.
+    """
+    student = await db.get(models.Student, current_student.id)
+    if student is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     return student
 
 @router.post("/onboard/verify")
@@ -103,7 +172,7 @@ def activate_account(
     db.commit()
     
     # Create token for immediate login
-    access_token = create_access_token(data={"sub": str(student.id), "role": "student"})
+    access_token = create_access_token(data=student_token_claims(student))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login")
@@ -121,11 +190,11 @@ def login(
     if not verify_password(form_data.password, student.password):
         raise HTTPException(status_code=400, detail="Incorrect admission number or password")
     
-    access_token = create_access_token(data={"sub": str(student.id), "role": "student"})
+    access_token = create_access_token(data=student_token_claims(student))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me")
-def get_me(current_student: models.Student = Depends(get_current_student)):
+async def get_me(current_student: models.Student = Depends(get_current_student_record)):
     return {
         "id": str(current_student.id),
         "full_name": current_student.full_name,
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
 from .. import schemas, auth, models
 from ..database import get_db
+from ..services import timetable as timetable_service
 
 router = APIRouter(prefix="/timetable", tags=["timetable"])
 
@@ -48,6 +49,7 @@ def bulk_create_timetable_slots(
         new_slots.append(new_slot)
     
     db.commit()
+    timetable_service.invalidate(slot_data.stream_id for slot_data in payload.slots)
     for slot in new_slots:
         db.refresh(slot)
     
@@ -56,43 +58,18 @@ def bulk_create_timetable_slots(
 @router.get("/stream/{stream_id}", response_model=List[schemas.TimetableSlotResponse])
 def get_timetable_by_stream(
     stream_id: UUID,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
     """
     Fetch timetable slots for a specific stream with enriched data.
+    Served from the shared per-stream cache with an ETag.
     """
-    stream = db.query(models.Stream).filter(models.Stream.id == stream_id).first()
-    if not stream:
+    compiled = timetable_service.get_compiled_timetable(db, stream_id)
+    if compiled is None:
         raise HTTPException(status_code=404, detail="Stream not found")
-        
-    slots = db.query(models.TimetableSlot).filter(models.TimetableSlot.stream_id == stream_id).all()
-    
-    result = []
-    for s in slots:
-        teacher_name = None
-        if s.subject_id:
-            # Try to get teacher for this subject in the stream's class
-            assignment = db.query(models.TeacherSubjectAssignment).filter(
-                models.TeacherSubjectAssignment.subject_id == s.subject_id,
-                models.TeacherSubjectAssignment.class_id == stream.class_id
-            ).first()
-            if assignment and assignment.teacher:
-                teacher_name = assignment.teacher.full_name
-
-        result.append(schemas.TimetableSlotResponse(
-            id=s.id,
-            stream_id=s.stream_id,
-            subject_id=s.subject_id,
-            subject_name=s.subject.name if s.subject else "Free",
-            teacher_name=teacher_name or ("-" if s.type == 'lesson' else None),
-            start_time=s.start_time,
-            end_time=s.end_time,
-            day_of_week=s.day_of_week,
-            type=s.type
-        ))
-        
-    return result
+    return timetable_service.timetable_response(request, compiled)
 
 @router.get("/all", response_model=List[schemas.TimetableSlotResponse])
 def get_all_timetables(
@@ -131,6 +108,7 @@ def bulk_delete_timetable_slots(
         
     deleted_count = query.delete(synchronize_session=False)
     db.commit()
+    timetable_service.invalidate([payload.stream_id] if payload.stream_id else None)
     
     return {"status": "success", "message": f"Deleted {deleted_count} slots matching criteria."}
 
@@ -147,8 +125,10 @@ def delete_timetable_slot(
     if not slot:
         raise HTTPException(status_code=404, detail="Timetable slot not found")
         
+    stream_id = slot.stream_id
     db.delete(slot)
     db.commit()
+    timetable_service.invalidate([stream_id])
     return {"status": "success", "message": "Slot deleted successfully"}
 
 @router.patch("/bulk")
@@ -162,13 +142,16 @@ def bulk_update_timetable_slots(
     Currently only supports updating subject_id.
     """
     updated_count = 0
+    stream_ids = set()
     for update_item in payload.updates:
         slot = db.query(models.TimetableSlot).filter(models.TimetableSlot.id == update_item.id).first()
         if slot:
             slot.subject_id = update_item.subject_id
+            stream_ids.add(slot.stream_id)
             updated_count += 1
     
     db.commit()
+    timetable_service.invalidate(stream_ids)
     return {"status": "success", "message": f"Successfully updated {updated_count} slots."}
 
 @router.patch("/{slot_id}", response_model=schemas.TimetableSlotResponse)
@@ -191,4 +174,5 @@ def update_timetable_slot(
         
     db.commit()
     db.refresh(slot)
+    timetable_service.invalidate([slot.stream_id])
     return slot
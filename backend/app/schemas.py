@@ -406,6 +406,82 @@ class TermExamResponse(TermExamBase):
     class Config:
         from_attributes = True
 
+class HistogramBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+class ScoreStatistics(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    std_dev: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    q1: Optional[float] = None
+    q3: Optional[float] = None
+    histogram: List[HistogramBin]
+    levels: Dict[str, int]  # EE | ME | AE | BE -> number of students
+
+class GroupScoreStatistics(ScoreStatistics):
+    id: UUID
+    name: Optional[str] = None
+
+class ExamStatisticsResponse(BaseModel):
+    exam_id: UUID
+    exam_name: Optional[str] = None
+    subject_id: UUID
+    subject_name: Optional[str] = None
+    term: Optional[str] = None
+    year: Optional[int] = None
+    overall: ScoreStatistics
+    classes: List[GroupScoreStatistics]
+    streams: List[GroupScoreStatistics]
+
+class RankingComputeRequest(BaseModel):
+    term: str
+    year: int
+    tie_method: Optional[str] = None  # standard | dense | ordinal
+
+class RankingEntryResponse(BaseModel):
+    student_id: UUID
+    full_name: Optional[str] = None
+    admission_number: Optional[str] = None
+    score: Optional[float] = None
+    position: int
+    out_of: int
+
+class RecalculationJobCreate(BaseModel):
+    term: str
+    year: int
+
+class RecalculationJobItemResponse(BaseModel):
+    subject_id: UUID
+    subject_name: Optional[str] = None
+    status: str
+    summaries_count: Optional[int] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    class Config:
+        from_attributes = True
+
+class RecalculationJobResponse(BaseModel):
+    id: UUID
+    term: str
+    year: int
+    status: str
+    total_subjects: int
+    completed_subjects: int
+    failed_subjects: int
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    heartbeat_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    items: List[RecalculationJobItemResponse] = []
+    class Config:
+        from_attributes = True
+
 class ExamBase(BaseModel):
     name: str
     term: str
@@ -509,6 +585,17 @@ class ClassScoreSheetResponse(BaseModel):
     term: str
     year: int
 
+class ClassScoreSheetColumnarResponse(BaseModel):
+    """Score sheet as parallel arrays: levels[i][j] is student i's level in subject j."""
+    term: Optional[str] = None
+    year: Optional[int] = None
+    student_ids: List[UUID]
+    student_names: List[str]
+    admission_numbers: List[Optional[str]]
+    subject_ids: List[UUID]
+    subject_names: List[str]
+    levels: List[List[Optional[str]]]
+
 # Fee schemas
 class FeeRecordBase(BaseModel):
     student_id: UUID
@@ -526,6 +613,52 @@ class FeeRecordResponse(FeeRecordBase):
     class Config:
         from_attributes = True
 
+class FeeLedgerEntry(BaseModel):
+    id: UUID
+    amount: float
+    type: str
+    date: datetime.datetime
+    description: Optional[str] = None
+    recorded_by_id: Optional[UUID] = None
+    running_balance: float
+
+class FeeLedgerResponse(BaseModel):
+    student_id: UUID
+    total_charged: float
+    total_paid: float
+    balance: float
+    history: List[FeeLedgerEntry]
+    next_cursor: Optional[str] = None
+
+class StudentFeeBalanceResponse(BaseModel):
+    student_id: UUID
+    full_name: str
+    admission_number: Optional[str] = None
+    class_id: Optional[UUID] = None
+    stream_id: Optional[UUID] = None
+    total_charged: float
+    total_paid: float
+    balance: float
+
+class ArrearsBuckets(BaseModel):
+    students_in_arrears: int
+    days_0_30: float
+    days_31_60: float
+    days_61_90: float
+    days_90_plus: float
+    total: float
+
+class ArrearsGroup(ArrearsBuckets):
+    class_id: Optional[UUID] = None
+    class_name: Optional[str] = None
+    stream_id: Optional[UUID] = None
+    stream_name: Optional[str] = None
+
+class ArrearsReport(BaseModel):
+    as_of: datetime.datetime
+    groups: List[ArrearsGroup]
+    totals: ArrearsBuckets
+
 class FeeStructureBase(BaseModel):
     class_id: UUID
     title: str
@@ -536,6 +669,22 @@ class FeeStructureBase(BaseModel):
 class FeeStructureCreate(FeeStructureBase):
     pass
 
+class BulkFeeChargeRequest(BaseModel):
+    class_ids: List[UUID]
+    stream_ids: Optional[List[UUID]] = None # Only students in these streams
+    title: str
+    amount: float
+    term: str
+    year: int
+
+class FeeStructureChargeRequest(BaseModel):
+    stream_ids: Optional[List[UUID]] = None
+
+class BulkFeeChargeResult(BaseModel):
+    message: str
+    charged: int
+    structure_ids: List[UUID]
+
 class FeeStructureResponse(FeeStructureBase):
     id: UUID
     class Config:
@@ -589,6 +738,15 @@ class TermReportCreate(BaseModel):
     head_teacher_comment: Optional[str] = None
     entries: Optional[List[TermReportEntryCreate]] = []
 
+class TermReportBulkCreate(BaseModel):
+    reports: List[TermReportCreate]
+
+class TermReportBulkResult(BaseModel):
+    reports: int
+    entries_inserted: int
+    entries_updated: int
+    entries_deleted: int
+
 class TermReportEntryResponse(BaseModel):
     id: UUID
     item_id: UUID
@@ -611,11 +769,14 @@ class TermReportResponse(BaseModel):
         from_attributes = True
 
 class FullReportCardResponse(BaseModel):
+    """A report card document as built by services/report_cards.build_cards"""
     student: Any
     term: str
     year: int
     subjects: List[Any]
-    term_report: Optional[TermReportResponse] = None
+    positions: Optional[Any] = None
+    term_report: Optional[Any] = None
+    htc_templates: Optional[Any] = None
 
 # Removed obsolete StudentSubjectSummary schemas in favor of SubjectTermResult
 
@@ -1,7 +1,21 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from ..cache import TTLCache
+from . import report_cards
 from uuid import UUID
+from typing import Optional, Tuple
 import uuid
+import os
+
+# Process-wide academic calendar: the (term, year) of the current term exam,
+# which CBC reads fall back to when term/year are omitted. Every term_exams
+# write below drops it; the TTL bounds staleness for writes made by another
+# worker process.
+calendar_cache = TTLCache(
+    maxsize=1,
+    ttl=float(os.getenv("ACADEMIC_CALENDAR_CACHE_TTL_SECONDS", "60")),
+)
+CURRENT_TERM_KEY = "current_term"
 
 def get_term_exams(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.TermExam).order_by(
@@ -15,7 +29,10 @@ def get_term_exam(db: Session, term_exam_id: UUID):
 def create_term_exam(db: Session, term_exam_data: schemas.TermExamCreate):
     db_term_exam = models.TermExam(**term_exam_data.model_dump())
     db.add(db_term_exam)
+    db.flush()
+    report_cards.sync_term_snapshots(db, db_term_exam.term, db_term_exam.year)
     db.commit()
+    calendar_cache.invalidate(CURRENT_TERM_KEY)
     db.refresh(db_term_exam)
     return db_term_exam
 
@@ -23,9 +40,14 @@ def update_term_exam(db: Session, term_exam_id: UUID, term_exam_data: schemas.Te
     db_term_exam = get_term_exam(db, term_exam_id)
     if not db_term_exam:
         return None
+    previous = (db_term_exam.term, db_term_exam.year)
     for key, value in term_exam_data.model_dump().items():
         setattr(db_term_exam, key, value)
+    db.flush()
+    for term, year in {previous, (db_term_exam.term, db_term_exam.year)}:
+        report_cards.sync_term_snapshots(db, term, year)
     db.commit()
+    calendar_cache.invalidate(CURRENT_TERM_KEY)
     db.refresh(db_term_exam)
     return db_term_exam
 
@@ -36,7 +58,11 @@ def batch_update_term_exams(db: Session, batch_data: schemas.TermExamBatchUpdate
     ).all()
     for exam in exams:
         exam.edit_status = batch_data.edit_status
+    db.flush()
+    # Completing a term freezes its report cards; reopening it drops them
+    report_cards.sync_term_snapshots(db, batch_data.term, batch_data.year)
     db.commit()
+    calendar_cache.invalidate(CURRENT_TERM_KEY)
     return exams
 
 def delete_term_exam(db: Session, term_exam_id: UUID):
@@ -44,7 +70,10 @@ def delete_term_exam(db: Session, term_exam_id: UUID):
     if not db_term_exam:
         return False
     db.delete(db_term_exam)
+    db.flush()
+    report_cards.sync_term_snapshots(db, db_term_exam.term, db_term_exam.year)
     db.commit()
+    calendar_cache.invalidate(CURRENT_TERM_KEY)
     return True
 
 def get_current_term_exam(db: Session):
@@ -61,3 +90,13 @@ def get_current_term_exam(db: Session):
         models.TermExam.year.desc(), 
         models.TermExam.term.desc()
     ).first()
+
+def get_current_term(db: Session) -> Optional[Tuple[str, int]]:
+    """(term, year) of the current term exam, served from calendar_cache. None if no term exists."""
+    current = calendar_cache.get(CURRENT_TERM_KEY)
+    if current is None:
+        term_exam = get_current_term_exam(db)
+        # An empty tuple caches "no term exams yet" as well
+        current = (term_exam.term, term_exam.year) if term_exam else ()
+        calendar_cache.set(CURRENT_TERM_KEY, current)
+    return current or None
@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select
 from .. import models
+from . import counters
 import datetime
 
 def get_analytics(db: Session, current_user: dict):
@@ -7,7 +9,6 @@ def get_analytics(db: Session, current_user: dict):
     user_id = current_user.get("id")
 
     if role == "teacher":
-        from sqlalchemy import func
         # Teacher specific stats
         teacher_user = db.query(models.User).filter(models.User.id == user_id).first()
         
@@ -71,21 +72,21 @@ def get_analytics(db: Session, current_user: dict):
         }
 
     # Default for Librarian, Admin, Super Admin
-    total_books = db.query(models.Book).count()
-    total_students = db.query(models.Student).count()
-    active_borrows = db.query(models.BorrowRecord).filter(models.BorrowRecord.status == "borrowed").count()
-    overdue_count = db.query(models.BorrowRecord).filter(
-        models.BorrowRecord.status == "borrowed",
-        models.BorrowRecord.due_date < datetime.datetime.utcnow()
-    ).count()
+    # Headline totals are read from the maintained dashboard_counters rollup
+    now = datetime.datetime.utcnow()
+    is_admin = role in ["admin", "SUPER_ADMIN"]
+    totals = counters.get_counters(db)
+
+    total_books = totals["total_books"]
+    total_students = totals["total_students"]
+    active_borrows = totals["active_borrows"]
+    overdue_count = totals["overdue_count"]
 
     # Category distribution
-    categories = db.query(models.Book.category).distinct().all()
-    cat_dist = []
-    for cat in categories:
-        if cat[0]:
-            count = db.query(models.Book).filter(models.Book.category == cat[0]).count()
-            cat_dist.append({"name": cat[0], "value": count})
+    categories = db.query(
+        models.Book.category, func.count(models.Book.id)
+    ).filter(models.Book.category.is_not(None), models.Book.category != "").group_by(models.Book.category).all()
+    cat_dist = [{"name": cat, "value": count} for cat, count in categories]
 
     # Enhanced stats for Admin/Super Admin
     total_staff = 0
@@ -95,47 +96,59 @@ def get_analytics(db: Session, current_user: dict):
     trends = []
     sys_stats = {}
 
-    if role in ["admin", "SUPER_ADMIN"]:
-        total_teachers = db.query(models.User).filter(models.User.role == "teacher").count()
-        total_librarians = db.query(models.User).filter(models.User.role == "librarian").count()
-        total_staff = db.query(models.User).filter(
-            models.User.role.is_not(None),
-            models.User.role != "none"
-        ).count()
+    if is_admin:
+        total_teachers = totals["total_teachers"]
+        total_librarians = totals["total_librarians"]
+        total_staff = totals["total_staff"]
+
+        # Small tables: counted directly, in one statement
+        def count_of(model, *criteria):
+            return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+        extra = db.execute(select(
+            count_of(models.Assignment).label("total_assignments"),
+            count_of(models.Subject).label("total_subjects"),
+            count_of(
+                models.SystemLog,
+                models.SystemLog.level.in_(["critical", "error"]),
+                models.SystemLog.timestamp >= now - datetime.timedelta(hours=24)
+            ).label("critical_logs_count"),
+        )).mappings().one()
 
         # Top borrowed books
-        from sqlalchemy import func
         top_books_query = db.query(
             models.Book.title, 
             func.count(models.BorrowRecord.id).label('borrow_count')
         ).join(models.BorrowRecord).group_by(models.Book.id).order_by(func.count(models.BorrowRecord.id).desc()).limit(5).all()
         top_books = [{"title": b[0], "count": b[1]} for b in top_books_query]
 
-        # Borrowing trends (Last 7 days)
+        # Borrowing trends (Last 7 days), bucketed by day in one query
+        today = now.date()
+        first_day = today - datetime.timedelta(days=6)
+        borrow_day = func.date(models.BorrowRecord.borrow_date)
+        daily_counts = db.query(borrow_day, func.count(models.BorrowRecord.id)).filter(
+            models.BorrowRecord.borrow_date >= datetime.datetime.combine(first_day, datetime.time.min)
+        ).group_by(borrow_day).all()
+        # Postgres returns dates, sqlite returns ISO strings
+        counts_by_day = {str(day): count for day, count in daily_counts}
         for i in range(6, -1, -1):
-            target_date = datetime.datetime.utcnow().date() - datetime.timedelta(days=i)
-            count = db.query(models.BorrowRecord).filter(
-                func.date(models.BorrowRecord.borrow_date) == target_date
-            ).count()
+            target_date = (today - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
             trends.append({
-                "date": target_date.strftime("%Y-%m-%d"),
-                "count": count
+                "date": target_date,
+                "count": counts_by_day.get(target_date, 0)
             })
 
         sys_stats = {
-            "total_assignments": db.query(models.Assignment).count(),
-            "total_subjects": db.query(models.Subject).count()
+            "total_assignments": extra["total_assignments"],
+            "total_subjects": extra["total_subjects"]
         }
 
         # Extra stats for SUPER_ADMIN only
         if role == "SUPER_ADMIN":
-            pending_registrations = db.query(models.User).filter(models.User.role == "none").count()
+            pending_registrations = totals["pending_registrations"]
             
             # Security logs in last 24h
-            critical_logs_count = db.query(models.SystemLog).filter(
-                models.SystemLog.level.in_(["critical", "error"]),
-                models.SystemLog.timestamp >= datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-            ).count()
+            critical_logs_count = extra["critical_logs_count"]
 
             # Recent security events (formatted for frontend)
             security_events = db.query(models.SystemLog).filter(
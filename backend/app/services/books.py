@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from ..services import counters
 from typing import Optional
 
 def get_books(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None):
@@ -42,6 +43,7 @@ def create_book(db: Session, book_in: schemas.BookCreate, performer_email: str):
     
     db_book = models.Book(**book_in.dict())
     db.add(db_book)
+    counters.bump(db, total_books=1)
     db.commit()
     db.refresh(db_book)
     log_action(db, "info", "book creation", performer_email, f"Added new book: {db_book.title}", target_user=db_book.book_id)
@@ -68,7 +70,10 @@ def delete_book(db: Session, book_uuid: str, performer_email: str):
     
     title = db_book.title
     bid = db_book.book_id
+    # The book's borrow records are kept with the link cleared; open loans stop counting
+    open_loans = counters.open_loan_count(db, models.BorrowRecord.book_id == db_book.id)
     db.delete(db_book)
+    counters.bump(db, total_books=-1, active_borrows=-open_loans)
     db.commit()
     log_action(db, "warning", "book deletion", performer_email, f"Deleted book: {title}", target_user=bid)
     return {"message": "Book deleted successfully"}
@@ -0,0 +1,183 @@
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from typing import Dict, List, Sequence
+import uuid
+
+# Rows per INSERT statement. Keeps Postgres well under its 65535 bind
+# parameter limit while a whole class still fits in one statement.
+UPSERT_BATCH_SIZE = 1000
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Bulk upsert is not supported on {dialect}")
+    return insert
+
+def new_uuid(db: Session):
+    """SQL expression generating a fresh UUID per row, for INSERT ... SELECT statements."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.gen_random_uuid()
+    if dialect == "sqlite":
+        # Same 32-hex-digit form SQLAlchemy stores UUIDs in on SQLite
+        return func.lower(func.hex(func.randomblob(16)))
+    raise NotImplementedError(f"SQL-side UUIDs are not supported on {dialect}")
+
+def _existing_null_key_ids(db: Session, model, keyed_rows: Dict, index_elements: List[str]):
+    """
+    Ids of the stored rows matching natural keys that contain a NULL, keyed
+    like `keyed_rows`. Needed where unique indexes treat NULLs as distinct
+    (SQLite), so ON CONFLICT never fires for such keys. One SELECT per
+    pattern of NULL columns.
+    """
+    by_pattern = {}
+    for key in keyed_rows:
+        nulls = tuple(value is None for value in key)
+        if any(nulls):
+            by_pattern.setdefault(nulls, []).append(key)
+
+    existing = {}
+    for nulls, keys in by_pattern.items():
+        null_cols = [getattr(model, col) for col, is_null in zip(index_elements, nulls) if is_null]
+        value_cols = [getattr(model, col) for col, is_null in zip(index_elements, nulls) if not is_null]
+        value_keys = [tuple(v for v, is_null in zip(key, nulls) if not is_null) for key in keys]
+        query = db.query(model.id, *[getattr(model, col) for col in index_elements]).filter(
+            *[col.is_(None) for col in null_cols]
+        )
+        for start in range(0, len(value_keys), UPSERT_BATCH_SIZE):
+            chunk = value_keys[start:start + UPSERT_BATCH_SIZE]
+            for row in query.filter(tuple_(*value_cols).in_(chunk)):
+                existing[tuple(row[1:])] = row[0]
+    return existing
+
+def upsert_rows(
+    db: Session,
+    model,
+    rows: Sequence[Dict],
+    index_elements: List[str],
+    update_columns: List[str],
+):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE for a batch of plain
+    dicts, returning the affected ORM objects in input order. `index_elements`
+    must match a unique constraint on the table. Rows repeating a key within
+    the batch collapse to the last one (Postgres refuses to update the same
+    row twice in one statement). Does not commit.
+
+    Keys containing NULLs are matched NULL-safely on every dialect: Postgres
+    declares the constraints NULLS NOT DISTINCT, elsewhere the existing ids
+    are looked up first and those rows are upserted on their primary key.
+    """
+    if not rows:
+        return []
+
+    deduped = {}
+    for row in rows:
+        key = tuple(row.get(col) for col in index_elements)
+        deduped[key] = {"id": uuid.uuid4(), **row}
+
+    existing = {}
+    if db.get_bind().dialect.name != "postgresql":
+        existing = _existing_null_key_ids(db, model, deduped, index_elements)
+    by_id = [{**row, "id": existing[key]} for key, row in deduped.items() if key in existing]
+    by_natural_key = [row for key, row in deduped.items() if key not in existing]
+
+    insert = _dialect_insert(db)
+    by_key = {}
+    for values, conflict_target in [(by_natural_key, index_elements), (by_id, ["id"])]:
+        for start in range(0, len(values), UPSERT_BATCH_SIZE):
+            stmt = insert(model).values(values[start:start + UPSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_target,
+                set_={col: stmt.excluded[col] for col in update_columns},
+            ).returning(model)
+            for obj in db.scalars(stmt, execution_options={"populate_existing": True}):
+                by_key[tuple(getattr(obj, col) for col in index_elements)] = obj
+
+    return [by_key[key] for key in deduped if key in by_key]
+
+def insert_missing(db: Session, model, rows: Sequence[Dict], index_elements: List[str]):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO NOTHING: creates the rows whose
+    natural key does not exist yet and leaves existing ones untouched, so
+    concurrent callers never create a key twice. Does not commit.
+    """
+    if not rows:
+        return
+    insert = _dialect_insert(db)
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(model).values(list(rows[start:start + UPSERT_BATCH_SIZE]))
+        db.execute(stmt.on_conflict_do_nothing(index_elements=index_elements))
+
+def increment_rows(
+    db: Session,
+    model,
+    rows: Sequence[Dict],
+    index_elements: List[str],
+    increment_columns: List[str],
+    update_columns: Sequence[str] = (),
+):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE SET col = col + excluded.col
+    for each increment column (update_columns are overwritten instead). New keys
+    are inserted with the row's values. Rows repeating a key within the batch
+    are summed first. Does not commit.
+    """
+    merged = {}
+    for row in rows:
+        key = tuple(row.get(col) for col in index_elements)
+        if key in merged:
+            for col in increment_columns:
+                merged[key][col] += row[col]
+            for col in update_columns:
+                merged[key][col] = row[col]
+        else:
+            merged[key] = dict(row)
+    values = list(merged.values())
+
+    insert = _dialect_insert(db)
+    table = model.__table__
+    for start in range(0, len(values), UPSERT_BATCH_SIZE):
+        stmt = insert(model).values(values[start:start + UPSERT_BATCH_SIZE])
+        set_ = {col: table.c[col] + stmt.excluded[col] for col in increment_columns}
+        set_.update({col: stmt.excluded[col] for col in update_columns})
+        db.execute(stmt.on_conflict_do_update(index_elements=index_elements, set_=set_))
+
+def increment_from_select(
+    db: Session,
+    model,
+    columns: List[str],
+    select_stmt,
+    index_elements: List[str],
+    increment_columns: List[str],
+    update_columns: Sequence[str] = (),
+):
+    """
+    Set-based increment_rows: INSERT INTO model (columns) <select_stmt> ON
+    CONFLICT DO UPDATE SET col = col + excluded.col. The select must not yield
+    a key twice (group by the index elements). Does not commit.
+    """
+    insert = _dialect_insert(db)
+    table = model.__table__
+    stmt = insert(model).from_select(columns, select_stmt)
+    set_ = {col: table.c[col] + stmt.excluded[col] for col in increment_columns}
+    set_.update({col: stmt.excluded[col] for col in update_columns})
+    return db.execute(stmt.on_conflict_do_update(index_elements=index_elements, set_=set_))
+
+def reload(db: Session, model, ids: Sequence):
+    """
+    Loads rows by primary key in one SELECT, in the order given. Use after a
+    commit instead of touching each expired object (one SELECT per object).
+    """
+    if not ids:
+        return []
+    rows = {}
+    for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+        chunk = ids[start:start + UPSERT_BATCH_SIZE]
+        for obj in db.query(model).filter(model.id.in_(chunk)).populate_existing():
+            rows[obj.id] = obj
+    return [rows[i] for i in ids if i in rows]
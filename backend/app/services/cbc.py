@@ -1,10 +1,19 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, case, cast, type_coerce, Numeric, Float
 from .. import models, schemas
+from . import bulk, summary_refresh, score_sheet, exam_statistics
 from uuid import UUID
 import uuid
 import datetime
 from typing import List, Optional
 
+# Natural keys backing the unique constraints used by the bulk upserts
+EXAM_RESULT_KEY = ["student_id", "exam_id", "subject_id", "term", "year"]
+TERM_RESULT_KEY = ["student_id", "subject_id", "term", "year"]
+ASSESSMENT_KEY = ["student_id", "subject_id", "competency_id", "exam_id", "term", "year"]
+TERM_REPORT_KEY = ["student_id", "term", "year"]
+REPORT_ENTRY_KEY = ["report_id", "item_id"]
+
 def get_competencies(db: Session):
     return db.query(models.Competency).all()
 
@@ -43,37 +52,49 @@ def create_competency_with_rubrics(db: Session, comp_data: schemas.CompetencyWit
     return db_comp
 
 def create_competency_assessment(db: Session, assessment_data: schemas.StudentCompetencyAssessmentCreate, assessor_id: UUID):
-    db_assessment = models.StudentCompetencyAssessment(
-        **assessment_data.model_dump(),
-        assessed_by=assessor_id
+    row = {**assessment_data.model_dump(), "assessed_by": UUID(str(assessor_id)) if assessor_id else None}
+    [db_assessment] = bulk.upsert_rows(
+        db, models.StudentCompetencyAssessment, [row],
+        index_elements=ASSESSMENT_KEY,
+        update_columns=["performance_level", "remarks", "assessed_by"]
     )
-    db.add(db_assessment)
     db.commit()
     db.refresh(db_assessment)
     return db_assessment
 
-def get_student_assessments(db: Session, student_id: str, subject_id: Optional[str] = None):
-    query = db.query(models.StudentCompetencyAssessment).filter(models.StudentCompetencyAssessment.student_id == student_id)
+def _assessment_rows(db: Session, *criteria, skip: int = 0, limit: Optional[int] = None):
+    """
+    Assessments as flat column rows joined to their competency name, in one
+    query. No ORM objects are built, so nothing lazy-loads per row and the
+    response schema validates plain mappings.
+    """
+    a = models.StudentCompetencyAssessment
+    query = db.query(
+        a.id, a.student_id, a.subject_id, a.competency_id, a.exam_id,
+        a.term, a.year, a.performance_level, a.remarks, a.assessed_by, a.assessed_at,
+        func.coalesce(models.Competency.name, "Unknown").label("competency_name")
+    ).outerjoin(models.Competency, models.Competency.id == a.competency_id).filter(
+        *criteria
+    ).order_by(a.student_id, a.competency_id, a.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [row._asdict() for row in query]
+
+def get_student_assessments(db: Session, student_id: str, subject_id: Optional[str] = None, skip: int = 0, limit: Optional[int] = None):
+    a = models.StudentCompetencyAssessment
+    criteria = [a.student_id == student_id]
     if subject_id:
-        query = query.filter(models.StudentCompetencyAssessment.subject_id == subject_id)
-    
-    assessments = query.all()
-    # Add competency name for convenience
-    for a in assessments:
-        a.competency_name = a.competency.name if a.competency else "Unknown"
-    return assessments
-
-def get_subject_assessments(db: Session, subject_id: str, term: Optional[str] = None, year: Optional[int] = None):
-    query = db.query(models.StudentCompetencyAssessment).filter(models.StudentCompetencyAssessment.subject_id == subject_id)
+        criteria.append(a.subject_id == subject_id)
+    return _assessment_rows(db, *criteria, skip=skip, limit=limit)
+
+def get_subject_assessments(db: Session, subject_id: str, term: Optional[str] = None, year: Optional[int] = None, skip: int = 0, limit: Optional[int] = None):
+    a = models.StudentCompetencyAssessment
+    criteria = [a.subject_id == subject_id]
     if term:
-        query = query.filter(models.StudentCompetencyAssessment.term == term)
+        criteria.append(a.term == term)
     if year:
-        query = query.filter(models.StudentCompetencyAssessment.year == year)
-    
-    assessments = query.all()
-    for a in assessments:
-        a.competency_name = a.competency.name if a.competency else "Unknown"
-    return assessments
+        criteria.append(a.year == year)
+    return _assessment_rows(db, *criteria, skip=skip, limit=limit)
 
 def bulk_create_rubrics(db: Session, rubrics_data: List[schemas.RubricCreate]):
     created = []
@@ -106,25 +127,16 @@ def get_rubric(db: Session, rubric_id: str):
     return db.query(models.Rubric).filter(models.Rubric.id == rubric_id).first()
 
 def create_or_update_subject_term_result(db: Session, summary_data: schemas.SubjectTermResultCreate):
-    existing = db.query(models.SubjectTermResult).filter(
-        models.SubjectTermResult.student_id == summary_data.student_id,
-        models.SubjectTermResult.subject_id == summary_data.subject_id,
-        models.SubjectTermResult.term == summary_data.term,
-        models.SubjectTermResult.year == summary_data.year
-    ).first()
-    
-    if existing:
-        for key, value in summary_data.model_dump().items():
-            setattr(existing, key, value)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    else:
-        db_summary = models.SubjectTermResult(**summary_data.model_dump())
-        db.add(db_summary)
-        db.commit()
-        db.refresh(db_summary)
-        return db_summary
+    row = summary_data.model_dump()
+    [db_summary] = bulk.upsert_rows(
+        db, models.SubjectTermResult, [row],
+        index_elements=TERM_RESULT_KEY,
+        update_columns=[c for c in row if c not in TERM_RESULT_KEY]
+    )
+    db.commit()
+    score_sheet.invalidate_subjects([summary_data.subject_id], summary_data.term, summary_data.year)
+    db.refresh(db_summary)
+    return db_summary
 
 def get_student_term_summaries(db: Session, student_id: str):
     return db.query(models.SubjectTermResult).filter(models.SubjectTermResult.student_id == student_id).all()
@@ -137,82 +149,72 @@ def get_subject_term_results(db: Session, subject_id: str, term: str, year: int)
     ).all()
 
 # Exam Result Logic
+def summary_key(row):
+    """The (subject_id, term, year, student_id) SubjectTermResult key a result feeds into."""
+    return (UUID(str(row.subject_id)), row.term, row.year, UUID(str(row.student_id)))
+
 def create_exam_result(db: Session, result_data: schemas.ExamResultCreate):
-    db_result = models.ExamResult(**result_data.model_dump())
-    db.add(db_result)
+    [db_result] = bulk.upsert_rows(
+        db, models.ExamResult, [result_data.model_dump()],
+        index_elements=EXAM_RESULT_KEY,
+        update_columns=["marks", "max_score", "weight"]
+    )
     db.commit()
+    summary_refresh.mark_dirty(db, [summary_key(db_result)])
     db.refresh(db_result)
+    exam_statistics.invalidate([db_result.exam_id])
     return db_result
 
 def bulk_upsert_exam_results(db: Session, bulk_data: schemas.BulkExamResultCreate, teacher_id: Optional[UUID] = None):
-    results = []
+    """
+    Saves a grading sheet with one INSERT ... ON CONFLICT DO UPDATE per table
+    (per batch), keyed on each table's natural-key unique constraint.
+    """
     # 1. Exam Results
-    for result_data in bulk_data.results:
-        # Check if already exists for student/exam
-        existing = db.query(models.ExamResult).filter(
-            models.ExamResult.student_id == result_data.student_id,
-            models.ExamResult.exam_id == result_data.exam_id,
-            models.ExamResult.subject_id == result_data.subject_id,
-            models.ExamResult.term == result_data.term,
-            models.ExamResult.year == result_data.year
-        ).first()
-
-        if existing:
-            # Update existing
-            for key, value in result_data.model_dump().items():
-                setattr(existing, key, value)
-            results.append(existing)
-        else:
-            # Create new
-            db_result = models.ExamResult(**result_data.model_dump())
-            db.add(db_result)
-            results.append(db_result)
+    result_rows = [r.model_dump() for r in bulk_data.results]
+    results = bulk.upsert_rows(
+        db, models.ExamResult, result_rows,
+        index_elements=EXAM_RESULT_KEY,
+        update_columns=["marks", "max_score", "weight"]
+    )
 
     # 2. Term Summaries
-    summaries = []
+    # Summaries sent explicitly with the sheet win over the recomputed ones
+    explicit_keys = {summary_key(s) for s in bulk_data.summaries or []}
     if bulk_data.summaries:
-        for summary_data in bulk_data.summaries:
-            existing_s = db.query(models.SubjectTermResult).filter(
-                models.SubjectTermResult.student_id == summary_data.student_id,
-                models.SubjectTermResult.subject_id == summary_data.subject_id,
-                models.SubjectTermResult.term == summary_data.term,
-                models.SubjectTermResult.year == summary_data.year
-            ).first()
-
-            if existing_s:
-                for key, value in summary_data.model_dump().items():
-                    setattr(existing_s, key, value)
-                summaries.append(existing_s)
-            else:
-                db_s = models.SubjectTermResult(**summary_data.model_dump())
-                db.add(db_s)
-                summaries.append(db_s)
+        summary_rows = [s.model_dump() for s in bulk_data.summaries]
+        bulk.upsert_rows(
+            db, models.SubjectTermResult, summary_rows,
+            index_elements=TERM_RESULT_KEY,
+            update_columns=[c for c in summary_rows[0] if c not in TERM_RESULT_KEY]
+        )
 
     # 3. Competency Assessments
     if bulk_data.assessments:
+        assessment_rows = []
         for assess_data in bulk_data.assessments:
-            existing_a = db.query(models.StudentCompetencyAssessment).filter(
-                models.StudentCompetencyAssessment.student_id == assess_data.student_id,
-                models.StudentCompetencyAssessment.subject_id == assess_data.subject_id,
-                models.StudentCompetencyAssessment.competency_id == assess_data.competency_id,
-                models.StudentCompetencyAssessment.term == assess_data.term,
-                models.StudentCompetencyAssessment.year == assess_data.year,
-                models.StudentCompetencyAssessment.exam_id == assess_data.exam_id
-            ).first()
-
-            if existing_a:
-                for key, value in assess_data.model_dump().items():
-                    setattr(existing_a, key, value)
-                if teacher_id:
-                    existing_a.assessed_by = teacher_id
-            else:
-                db_a = models.StudentCompetencyAssessment(**assess_data.model_dump())
-                if teacher_id:
-                    db_a.assessed_by = teacher_id
-                db.add(db_a)
+            row = assess_data.model_dump()
+            if teacher_id:
+                row["assessed_by"] = UUID(str(teacher_id))
+            assessment_rows.append(row)
+        update_columns = ["performance_level", "remarks"]
+        if teacher_id:
+            update_columns.append("assessed_by")
+        bulk.upsert_rows(
+            db, models.StudentCompetencyAssessment, assessment_rows,
+            index_elements=ASSESSMENT_KEY,
+            update_columns=update_columns
+        )
 
+    result_ids = [r.id for r in results]
+    dirty_keys = {summary_key(r) for r in results} - explicit_keys
+    exam_ids = {r.exam_id for r in results}
     db.commit()
-    return results
+    summary_refresh.mark_dirty(db, dirty_keys)
+    exam_statistics.invalidate(exam_ids)
+    for subject_id, term, year in {key[:3] for key in explicit_keys}:
+        score_sheet.invalidate_subjects([subject_id], term, year)
+    return bulk.reload(db, models.ExamResult, result_ids)
 
 def get_exam_results(db: Session, student_id: Optional[str] = None, subject_id: Optional[str] = None, term: Optional[str] = None, year: Optional[int] = None):
     query = db.query(models.ExamResult)
@@ -254,12 +256,19 @@ def get_subject_exams(db: Session, subject_id: str, term: Optional[str] = None,
 def delete_exam(db: Session, exam_id: UUID):
     db_exam = db.query(models.Exam).filter(models.Exam.id == exam_id).first()
     if db_exam:
-        # Cascades handle assessments and results if defined in models, 
-        # but let's be explicit if needed or just rely on SQLAlchemy cascades.
-        # Based on models.py, Exam has assessments with cascade="all, delete-orphan"
-        # and exam_results is also linked to exam_id.
+        # Assessments go through the ORM cascade; the exam's results are
+        # deleted here (the FK cascade is not relied on) after noting which
+        # term summaries they fed, so those are recomputed or removed
+        r = models.ExamResult
+        results = db.query(r).filter(r.exam_id == exam_id)
+        dirty_keys = {summary_key(row) for row in results.with_entities(r.subject_id, r.term, r.year, r.student_id).distinct()}
+        results.delete(synchronize_session=False)
         db.delete(db_exam)
         db.commit()
+        summary_refresh.mark_dirty(db, dirty_keys)
+        for subject_id, term, year in {key[:3] for key in dirty_keys}:
+            score_sheet.invalidate_subjects([subject_id], term, year)
+        exam_statistics.invalidate([exam_id])
         return True
     return False
 
@@ -274,83 +283,129 @@ def update_exam_competencies(db: Session, exam_id: UUID, competency_ids: List[UU
     db.refresh(db_exam)
     return db_exam
 
-def calculate_subject_term_summaries(db: Session, subject_id: UUID, term: str, year: int):
+def calculate_subject_term_summaries(db: Session, subject_id: UUID, term: str, year: int, student_ids=None):
     """
     Automates SubjectTermResult generation by averaging exam marks for each student.
     Handles weighted averages if weights are defined in ExamResults.
+    Pass `student_ids` to recompute only those students (used by summary_refresh).
+
+    Scores and CBC levels are computed in a single grouped query and written
+    with one bulk upsert that only touches total_score / performance_level,
+    so remarks and grades entered by teachers are kept.
     """
-    # 1. Fetch all unique student IDs who have exam results for this subject/term/year
-    student_ids = db.query(models.ExamResult.student_id).filter(
-        models.ExamResult.subject_id == subject_id,
-        models.ExamResult.term == term,
-        models.ExamResult.year == year
-    ).distinct().all()
-    
-    student_ids = [s[0] for s in student_ids]
-    
-    summaries = []
-    for student_id in student_ids:
-        results = db.query(models.ExamResult).filter(
-            models.ExamResult.student_id == student_id,
-            models.ExamResult.subject_id == subject_id,
-            models.ExamResult.term == term,
-            models.ExamResult.year == year
-        ).all()
-        
-        if not results:
-            continue
-            
-        total_weighted_score = 0
-        total_weight = 0
-        standard_sum = 0
-        count = 0
-        
-        has_weights = any(r.weight is not None for r in results)
-        
-        if has_weights:
-            for r in results:
-                w = r.weight if r.weight is not None else 0
-                # If weight is defined, we assume 'marks' is already normalized 
-                # or we use (marks/max_score)*weight. 
-                # Standard practice: if weight is 30%, mark is 25/50 -> (25/50)*30%
-                if r.max_score and r.max_score > 0:
-                    total_weighted_score += (r.marks / r.max_score) * w
-                else:
-                    total_weighted_score += r.marks # fallback
-                total_weight += w
-            
-            # If weights sum to something > 0, we can use it. 
-            # If total_weight is e.g. 100, average is just total_weighted_score.
-            # If it's less, we might want to normalize to 100.
-            final_score = total_weighted_score
-        else:
-            # Standard average
-            for r in results:
-                if r.max_score and r.max_score > 0:
-                    standard_sum += (r.marks / r.max_score) * 100
+    r = models.ExamResult
+    has_max = r.max_score > 0
+
+    # If any of a student's results carries a weight, the score is the sum of
+    # (marks/max_score)*weight (30% of 25/50 -> 15); otherwise it is the plain
+    # average of percentages. Rows without a max_score contribute raw marks.
+    weighted_sum = func.sum(case((has_max, r.marks / r.max_score * func.coalesce(r.weight, 0)), else_=r.marks))
+    plain_average = func.avg(case((has_max, r.marks / r.max_score * 100), else_=r.marks))
+    raw_score = case((func.count(r.weight) > 0, weighted_sum), else_=plain_average)
+    score = type_coerce(func.round(cast(raw_score, Numeric(12, 4)), 1), Float)
+
+    # Map to performance level (CBC Standards)
+    level = case(
+        (score >= 80, "EE"),
+        (score >= 60, "ME"),
+        (score >= 40, "AE"),
+        else_="BE"
+    )
+
+    query = db.query(r.student_id, score.label("score"), level.label("level")).filter(
+        r.subject_id == subject_id,
+        r.term == term,
+        r.year == year
+    )
+    if student_ids is not None:
+        query = query.filter(r.student_id.in_(list(student_ids)))
+    rows = query.group_by(r.student_id).order_by(r.student_id).all()
+
+    summaries = bulk.upsert_rows(
+        db, models.SubjectTermResult,
+        [
+            {
+                "student_id": row.student_id,
+                "subject_id": subject_id,
+                "term": term,
+                "year": year,
+                "total_score": row.score,
+                "performance_level": row.level,
+            }
+            for row in rows
+        ],
+        index_elements=TERM_RESULT_KEY,
+        update_columns=["total_score", "performance_level"]
+    )
+    if student_ids is not None:
+        # Requested students left without any results (e.g. their exam was
+        # deleted) no longer have a summary
+        emptied = {UUID(str(s)) for s in student_ids} - {row.student_id for row in rows}
+        if emptied:
+            db.query(models.SubjectTermResult).filter(
+                models.SubjectTermResult.subject_id == subject_id,
+                models.SubjectTermResult.term == term,
+                models.SubjectTermResult.year == year,
+                models.SubjectTermResult.student_id.in_(list(emptied))
+            ).delete(synchronize_session=False)
+    summary_ids = [summary.id for summary in summaries]
+    db.commit()
+    score_sheet.invalidate_subjects([subject_id], term, year)
+    return bulk.reload(db, models.SubjectTermResult, summary_ids)
+
+def upsert_term_reports(db: Session, reports: List[schemas.TermReportCreate]):
+    """
+    Saves term report headers and their entry levels for many students at
+    once. Headers are upserted on unique_student_term_report; for reports
+    that carry entries, the stored entries are diffed against the submitted
+    ones so only changed levels are upserted (on unique_report_item_entry)
+    and only dropped items are deleted. Reports sent without entries keep
+    their existing ones. Returns counts of what was written.
+    """
+    header_rows = [r.model_dump(exclude={"entries"}) for r in reports]
+    headers = bulk.upsert_rows(
+        db, models.TermReport, header_rows,
+        index_elements=TERM_REPORT_KEY,
+        update_columns=["total_days", "present_days", "teacher_comment", "head_teacher_comment"]
+    )
+    report_ids = {(h.student_id, h.term, h.year): h.id for h in headers}
+
+    # Submitted levels per report, for the reports whose entries are replaced
+    wanted = {}
+    for r in reports:
+        if r.entries:
+            report_id = report_ids[(r.student_id, r.term, r.year)]
+            wanted[report_id] = {e.item_id: e.level for e in r.entries}
+
+    stats = {"reports": len(headers), "entries_inserted": 0, "entries_updated": 0, "entries_deleted": 0}
+    if wanted:
+        e = models.TermReportEntry
+        existing = {}
+        for report_id, item_id, level, entry_id in db.query(e.report_id, e.item_id, e.level, e.id).filter(
+            e.report_id.in_(list(wanted))
+        ):
+            existing[(report_id, item_id)] = (level, entry_id)
+
+        changed = []
+        for report_id, levels in wanted.items():
+            for item_id, level in levels.items():
+                current = existing.get((report_id, item_id))
+                if current is None:
+                    stats["entries_inserted"] += 1
+                elif current[0] != level:
+                    stats["entries_updated"] += 1
                 else:
-                    standard_sum += r.marks
-                count += 1
-            final_score = standard_sum / count if count > 0 else 0
-            
-        final_score = round(final_score, 1)
-        
-        # Map to performance level (CBC Standards)
-        level = "BE"
-        if final_score >= 80: level = "EE"
-        elif final_score >= 60: level = "ME"
-        elif final_score >= 40: level = "AE"
-        
-        # Upsert summary
-        summary_data = schemas.SubjectTermResultCreate(
-            student_id=student_id,
-            subject_id=subject_id,
-            term=term,
-            year=year,
-            total_score=final_score,
-            performance_level=level
-        )
-        summary = create_or_update_subject_term_result(db, summary_data)
-        summaries.append(summary)
-        
-    return summaries
+                    continue
+                changed.append({"report_id": report_id, "item_id": item_id, "level": level})
+        stale_ids = [
+            entry_id for (report_id, item_id), (_, entry_id) in existing.items()
+            if item_id not in wanted[report_id]
+        ]
+
+        bulk.upsert_rows(db, models.TermReportEntry, changed, index_elements=REPORT_ENTRY_KEY, update_columns=["level"])
+        for start in range(0, len(stale_ids), bulk.UPSERT_BATCH_SIZE):
+            db.query(e).filter(e.id.in_(stale_ids[start:start + bulk.UPSERT_BATCH_SIZE])).delete(synchronize_session=False)
+        stats["entries_deleted"] = len(stale_ids)
+
+    db.commit()
+    return stats
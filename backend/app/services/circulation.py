@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from ..services import counters
 import datetime
 from typing import Optional
 
@@ -68,6 +69,7 @@ def borrow_book(db: Session, book_id: str, student_id: str, performer_email: str
         book.borrowed_copies += 1
         
         db.add(new_record)
+        counters.bump(db, active_borrows=1)
         db.commit()
         log_action(db, "info", "book borrow", performer_email, f"Issued '{book.title}' to {student.full_name}", target_user=student.admission_number)
         return {"message": "Circulation protocol executed successfully"}
@@ -91,8 +93,12 @@ def return_book(db: Session, transaction_uuid: str, performer_email: str, book_n
              raise HTTPException(status_code=400, detail=f"Book verification failed: ID mismatch. Expected '{record.book_number}', got '{book_number}'.")
     
     try:
+        now = datetime.datetime.utcnow()
+        if record.status == "borrowed" and record.book_id and record.student_id:
+            counters.bump(db, active_borrows=-1)
+
         record.status = "returned"
-        record.return_date = datetime.datetime.utcnow()
+        record.return_date = now
         
         # Update book availability
         book = db.query(models.Book).filter(models.Book.id == record.book_id).first()
@@ -0,0 +1,171 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, and_, true
+from fastapi.concurrency import run_in_threadpool
+from .. import models
+from ..database import SessionLocal
+import asyncio
+import datetime
+import os
+
+# Dashboard rollups kept in the dashboard_counters table. Write paths bump
+# them in their own transaction; reconcile() recomputes them from the source
+# tables to correct drift. overdue_count is not stored: a loan becomes overdue
+# without any write, so it is counted live (see overdue_count_query).
+# Deleting a book or student keeps its borrow records with the link cleared;
+# loans detached that way no longer count as active or overdue.
+COUNTER_NAMES = [
+    "total_books",
+    "total_students",
+    "active_borrows",
+    "total_teachers",
+    "total_librarians",
+    "total_staff",
+    "pending_registrations",
+]
+
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", "300"))
+
+def bump(db: Session, **deltas):
+    """
+    Adds the given deltas to the counters as part of the caller's transaction,
+    e.g. bump(db, active_borrows=1). Uses `value = value + delta` so concurrent
+    writers never lose an increment. Counters not seeded yet are skipped; the
+    next reconciliation creates them with correct values.
+    """
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        db.query(models.DashboardCounter).filter(models.DashboardCounter.name == name).update(
+            {models.DashboardCounter.value: models.DashboardCounter.value + delta},
+            synchronize_session=False
+        )
+
+def role_deltas(old_role, new_role):
+    """Counter deltas for a user moving from old_role to new_role (None = no user)."""
+    deltas = {}
+
+    def apply(role, sign):
+        if role is None:
+            return
+        if role == "none":
+            deltas["pending_registrations"] = deltas.get("pending_registrations", 0) + sign
+            return
+        deltas["total_staff"] = deltas.get("total_staff", 0) + sign
+        if role == "teacher":
+            deltas["total_teachers"] = deltas.get("total_teachers", 0) + sign
+        elif role == "librarian":
+            deltas["total_librarians"] = deltas.get("total_librarians", 0) + sign
+
+    apply(old_role, -1)
+    apply(new_role, 1)
+    return deltas
+
+def open_loan_criteria():
+    """Loans still out whose book and student both exist."""
+    return and_(
+        models.BorrowRecord.status == "borrowed",
+        models.BorrowRecord.book_id.is_not(None),
+        models.BorrowRecord.student_id.is_not(None)
+    )
+
+def overdue_count_query():
+    """Open loans past their due date; served by ix_borrow_records_status_due_date."""
+    now = datetime.datetime.utcnow()
+    return select(func.count(models.BorrowRecord.id)).where(
+        open_loan_criteria(),
+        models.BorrowRecord.due_date < now
+    ).scalar_subquery()
+
+def compute_counters(db: Session):
+    """Recomputes every stored counter from the source tables in a single statement."""
+    def count_of(model):
+        return select(func.count()).select_from(model).scalar_subquery()
+
+    def count_if(*criteria):
+        return func.coalesce(func.sum(case((and_(*criteria), 1), else_=0)), 0)
+
+    borrow_counts = select(
+        count_if(open_loan_criteria()).label("active_borrows"),
+    ).subquery()
+    role_counts = select(
+        count_if(models.User.role == "teacher").label("total_teachers"),
+        count_if(models.User.role == "librarian").label("total_librarians"),
+        count_if(models.User.role.is_not(None), models.User.role != "none").label("total_staff"),
+        count_if(models.User.role == "none").label("pending_registrations"),
+    ).subquery()
+
+    # Both derived tables are single-row aggregates, so the join is 1 x 1
+    query = select(
+        count_of(models.Book).label("total_books"),
+        count_of(models.Student).label("total_students"),
+        *borrow_counts.c,
+        *role_counts.c,
+    ).select_from(borrow_counts).join(role_counts, true())
+    row = db.execute(query).mappings().one()
+    return {name: int(row[name]) for name in COUNTER_NAMES}
+
+def reconcile(db: Session):
+    """
+    Rewrites drifted counters with freshly computed values and returns the
+    corrections made. The counter rows are locked first so that concurrent
+    bumps either finish before the recount or apply on top of it.
+    """
+    stored = {
+        c.name: c for c in db.query(models.DashboardCounter).with_for_update().all()
+    }
+    actual = compute_counters(db)
+
+    drift = {}
+    for name, value in actual.items():
+        counter = stored.get(name)
+        if counter is None:
+            db.add(models.DashboardCounter(name=name, value=value))
+        elif counter.value != value:
+            drift[name] = value - counter.value
+            counter.value = value
+    db.commit()
+
+    if drift:
+        print(f"[COUNTERS] Corrected drift: {drift}")
+    return drift
+
+def get_counters(db: Session):
+    """
+    Reads the stored counters (one scan of a tiny table) together with the live
+    overdue_count in a single statement. Seeds the counters on first use.
+    """
+    def read():
+        rows = db.query(
+            models.DashboardCounter.name, models.DashboardCounter.value, overdue_count_query()
+        ).all()
+        return {name: value for name, value, _ in rows}, (rows[0][2] if rows else 0)
+
+    values, overdue = read()
+    if any(name not in values for name in COUNTER_NAMES):
+        reconcile(db)
+        values, overdue = read()
+    values = {name: values[name] for name in COUNTER_NAMES}
+    values["overdue_count"] = overdue
+    return values
+
+def open_loan_count(db: Session, *criteria):
+    """Open loans matching the criteria, for write paths that detach them in bulk (deletes)."""
+    return db.query(func.count(models.BorrowRecord.id)).filter(
+        open_loan_criteria(), *criteria
+    ).scalar() or 0
+
+def run_reconciliation():
+    db = SessionLocal()
+    try:
+        reconcile(db)
+    except Exception as e:
+        db.rollback()
+        print(f"[COUNTERS ERROR] Reconciliation failed: {str(e)}")
+    finally:
+        db.close()
+
+async def reconcile_periodically(interval: float = RECONCILE_INTERVAL_SECONDS):
+    """Background loop started with the app: reconciles now, then every `interval` seconds."""
+    while True:
+        await run_in_threadpool(run_reconciliation)
+        await asyncio.sleep(interval)
@@ -0,0 +1,136 @@
+from sqlalchemy.orm import Session
+from .. import models
+from ..cache import TTLCache
+from uuid import UUID
+from typing import Dict, Iterable, Optional
+import numpy as np
+import os
+
+# Per-exam score statistics (mean, median, spread, quartiles, histogram and
+# CBC level distribution) overall and per class / stream. The exam's results
+# are read in one query and summarized with NumPy. Entries are dropped by the
+# exam result write paths via invalidate(), and by the student write paths
+# that move or remove results (invalidate_students); the TTL only bounds memory.
+statistics_cache = TTLCache(
+    maxsize=int(os.getenv("EXAM_STATS_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("EXAM_STATS_CACHE_TTL_SECONDS", "3600")),
+)
+
+HISTOGRAM_BINS = 10
+LEVELS = ("EE", "ME", "AE", "BE")
+
+def _summarize(scores: np.ndarray) -> Dict:
+    """Statistics for an array of percentage scores."""
+    counts, edges = np.histogram(np.clip(scores, 0, 100), bins=HISTOGRAM_BINS, range=(0, 100))
+    histogram = [
+        {"lower": float(edges[i]), "upper": float(edges[i + 1]), "count": int(counts[i])}
+        for i in range(HISTOGRAM_BINS)
+    ]
+    # Same thresholds as calculate_subject_term_summaries
+    levels = np.select([scores >= 80, scores >= 60, scores >= 40], ["EE", "ME", "AE"], default="BE")
+    distribution = {level: int(np.count_nonzero(levels == level)) for level in LEVELS}
+
+    if scores.size == 0:
+        return {
+            "count": 0, "mean": None, "median": None, "std_dev": None, "min": None, "max": None,
+            "q1": None, "q3": None, "histogram": histogram, "levels": distribution,
+        }
+
+    q1, median, q3 = np.percentile(scores, [25, 50, 75])
+    return {
+        "count": int(scores.size),
+        "mean": round(float(scores.mean()), 2),
+        "median": round(float(median), 2),
+        "std_dev": round(float(scores.std()), 2),
+        "min": round(float(scores.min()), 2),
+        "max": round(float(scores.max()), 2),
+        "q1": round(float(q1), 2),
+        "q3": round(float(q3), 2),
+        "histogram": histogram,
+        "levels": distribution,
+    }
+
+def _grouped(scores: np.ndarray, keys: list, names: Dict) -> list:
+    """_summarize per distinct key (students without a class/stream are skipped)."""
+    groups = []
+    key_array = np.array([str(k) if k is not None else "" for k in keys])
+    for key in np.unique(key_array):
+        if not key:
+            continue
+        group_id = UUID(key)
+        groups.append({"id": group_id, "name": names.get(group_id), **_summarize(scores[key_array == key])})
+    return sorted(groups, key=lambda g: (g["name"] or "", str(g["id"])))
+
+def compute_exam_statistics(db: Session, exam_id) -> Optional[Dict]:
+    exam_id = UUID(str(exam_id))
+    exam = db.query(
+        models.Exam.id, models.Exam.name, models.Exam.term, models.Exam.year,
+        models.Exam.subject_id, models.Subject.name.label("subject_name")
+    ).outerjoin(models.Subject, models.Subject.id == models.Exam.subject_id).filter(
+        models.Exam.id == exam_id
+    ).first()
+    if exam is None:
+        return None
+
+    r = models.ExamResult
+    rows = db.query(
+        r.marks, r.max_score, models.Student.class_id, models.Student.stream_id,
+        models.Class.name, models.Stream.name
+    ).outerjoin(models.Student, models.Student.id == r.student_id).outerjoin(
+        models.Class, models.Class.id == models.Student.class_id
+    ).outerjoin(models.Stream, models.Stream.id == models.Student.stream_id).filter(
+        r.exam_id == exam_id,
+        r.marks.is_not(None)
+    ).all()
+
+    marks = np.array([row[0] for row in rows], dtype=float)
+    max_scores = np.array([row[1] or 0 for row in rows], dtype=float)
+    # Percentages like the term summaries; results without a max_score count as raw marks
+    scores = np.divide(marks * 100, max_scores, out=marks.copy(), where=max_scores > 0)
+
+    class_names = {row[2]: row[4] for row in rows if row[2] is not None}
+    stream_names = {row[3]: row[5] for row in rows if row[3] is not None}
+
+    return {
+        "exam_id": exam.id,
+        "exam_name": exam.name,
+        "subject_id": exam.subject_id,
+        "subject_name": exam.subject_name,
+        "term": exam.term,
+        "year": exam.year,
+        "overall": _summarize(scores),
+        "classes": _grouped(scores, [row[2] for row in rows], class_names),
+        "streams": _grouped(scores, [row[3] for row in rows], stream_names),
+    }
+
+def get_exam_statistics(db: Session, exam_id) -> Optional[Dict]:
+    """Cached compute_exam_statistics. Callers must treat the result as read-only."""
+    exam_id = UUID(str(exam_id))
+    stats = statistics_cache.get(exam_id)
+    if stats is None:
+        stats = compute_exam_statistics(db, exam_id)
+        if stats is not None:
+            statistics_cache.set(exam_id, stats)
+    return stats
+
+def invalidate(exam_ids: Optional[Iterable] = None):
+    """Drops the statistics of the given exams, or of every exam when none are given."""
+    if exam_ids is None:
+        statistics_cache.clear()
+        return
+    for exam_id in {UUID(str(e)) for e in exam_ids if e}:
+        statistics_cache.invalidate(exam_id)
+
+def exam_ids_for_students(db: Session, student_ids: Iterable):
+    """Exams the students have results in; read before a delete cascades them away."""
+    student_ids = list({UUID(str(s)) for s in student_ids if s})
+    if not student_ids:
+        return set()
+    return {exam_id for (exam_id,) in db.query(models.ExamResult.exam_id).filter(
+        models.ExamResult.student_id.in_(student_ids),
+        models.ExamResult.exam_id.is_not(None)
+    ).distinct()}
+
+def invalidate_students(db: Session, student_ids: Iterable):
+    """Drops the statistics of every exam the students have results in."""
+    invalidate(exam_ids_for_students(db, student_ids))
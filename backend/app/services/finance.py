@@ -1,40 +1,181 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, exists, insert, literal, cast, and_, distinct, String, DateTime
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from . import bulk
+from uuid import UUID
+from typing import Dict, Optional
 import uuid
 import datetime
+import csv
+import io
 
-def bulk_charge(db: Session, class_id: str, title: str, amount: float, term: str, year: int, performer_email: str):
-    # Find all students in this class
-    students = db.query(models.Student).filter(models.Student.class_id == class_id).all()
-    
-    # Create the fee structure record
-    fee_structure = models.FeeStructure(
-        id=uuid.uuid4(),
-        class_id=class_id,
-        title=title,
-        amount=amount,
-        term=term,
-        year=year
+# Ledger page size when the caller does not pass one
+LEDGER_PAGE_SIZE = 50
+
+BALANCE_KEY = ["student_id"]
+BALANCE_TOTALS = ["total_charged", "total_paid", "balance"]
+
+def apply_balance_deltas(db: Session, deltas: Dict):
+    """
+    Adds {student_id: (charged, paid)} to student_fee_balances as part of the
+    caller's transaction, creating missing rows. The increments happen in SQL
+    (total = total + delta), so concurrent charges and payments never lose an
+    update.
+    """
+    now = datetime.datetime.utcnow()
+    rows = [
+        {
+            "student_id": UUID(str(student_id)),
+            "total_charged": charged,
+            "total_paid": paid,
+            "balance": charged - paid,
+            "updated_at": now,
+        }
+        for student_id, (charged, paid) in deltas.items()
+    ]
+    bulk.increment_rows(
+        db, models.StudentFeeBalance, rows,
+        index_elements=BALANCE_KEY, increment_columns=BALANCE_TOTALS, update_columns=["updated_at"]
     )
-    db.add(fee_structure)
-    
-    # Create fee records for each student
-    for student in students:
-        fee_record = models.FeeRecord(
-            id=uuid.uuid4(),
-            student_id=student.id,
-            amount=amount,
-            type="charge",
-            description=f"{title} ({term} {year})",
-            date=datetime.datetime.utcnow()
+
+def rebuild_balances(db: Session):
+    """Recomputes every balance from fee_records with one INSERT ... SELECT (repairs drift)."""
+    fees = models.FeeRecord
+    charged = func.coalesce(func.sum(case((fees.type == "charge", fees.amount), else_=0)), 0)
+    paid = func.coalesce(func.sum(case((fees.type == "payment", fees.amount), else_=0)), 0)
+    totals = select(
+        fees.student_id, charged, paid, charged - paid, func.now()
+    ).group_by(fees.student_id)
+
+    db.query(models.StudentFeeBalance).delete(synchronize_session=False)
+    db.execute(models.StudentFeeBalance.__table__.insert().from_select(
+        ["student_id", "total_charged", "total_paid", "balance", "updated_at"], totals
+    ))
+    db.commit()
+
+def _pending_charges(columns, structure_ids, stream_ids=None):
+    """
+    SELECT columns for every (student, structure) pair the structures still
+    have to charge: students of the structure's class (optionally only the
+    given streams) without a fee record for that structure yet.
+    """
+    student = models.Student
+    structure = models.FeeStructure
+    charged = exists().where(
+        models.FeeRecord.fee_structure_id == structure.id,
+        models.FeeRecord.student_id == student.id
+    )
+    query = select(*columns).select_from(student).join(
+        structure, structure.class_id == student.class_id
+    ).where(structure.id.in_(structure_ids), ~charged)
+    if stream_ids:
+        query = query.where(student.stream_id.in_(stream_ids))
+    return query
+
+def charge_structures(db: Session, structure_ids, stream_ids=None) -> int:
+    """
+    Charges every student the given fee structures apply to, skipping students
+    a structure has already charged, so re-runs are safe. Balances and fee
+    records are written with one INSERT ... SELECT each, nothing is loaded
+    into the session. Returns the number of fee records created. Does not
+    commit.
+    """
+    structure_ids = [UUID(str(i)) for i in structure_ids]
+    stream_ids = [UUID(str(i)) for i in stream_ids or []]
+    if not structure_ids:
+        return 0
+    student = models.Student
+    structure = models.FeeStructure
+    now = datetime.datetime.utcnow()
+
+    # Concurrent runs of the same structures queue here, so the pending set
+    # below is never charged (or added to balances) twice
+    db.query(structure.id).filter(structure.id.in_(structure_ids)).with_for_update().all()
+
+    # Balances first: once the records exist the students are no longer pending
+    amount = func.sum(structure.amount)
+    bulk.increment_from_select(
+        db, models.StudentFeeBalance, ["student_id", *BALANCE_TOTALS, "updated_at"],
+        _pending_charges(
+            [student.id, amount, literal(0.0), amount, literal(now, DateTime)], structure_ids, stream_ids
+        ).group_by(student.id),
+        index_elements=BALANCE_KEY, increment_columns=BALANCE_TOTALS, update_columns=["updated_at"]
+    )
+
+    description = structure.title + " (" + structure.term + " " + cast(structure.year, String) + ")"
+    result = db.execute(insert(models.FeeRecord).from_select(
+        ["id", "student_id", "amount", "type", "description", "date", "fee_structure_id"],
+        _pending_charges(
+            [bulk.new_uuid(db), student.id, structure.amount, literal("charge"), description,
+             literal(now, DateTime), structure.id],
+            structure_ids, stream_ids
         )
-        db.add(fee_record)
-    
+    ))
+    return result.rowcount
+
+FEE_STRUCTURE_KEY = ["class_id", "title", "term", "year"]
+
+def get_or_create_fee_structures(db: Session, class_ids, title: str, amount: float, term: str, year: int):
+    """
+    Structures are identified by (class, title, term, year), so charging the
+    same fee again reuses the structure and only reaches students it missed.
+    Missing structures are created with one INSERT ... ON CONFLICT DO NOTHING
+    (concurrent charges of a new fee end up with the same structure), then
+    all of them are read back in one query, in class_ids order.
+    """
+    class_ids = [UUID(str(c)) for c in class_ids]
+    bulk.insert_missing(db, models.FeeStructure, [
+        {"id": uuid.uuid4(), "class_id": class_id, "title": title, "amount": amount, "term": term, "year": year}
+        for class_id in class_ids
+    ], index_elements=FEE_STRUCTURE_KEY)
+
+    structures = {s.class_id: s for s in db.query(models.FeeStructure).filter(
+        models.FeeStructure.class_id.in_(class_ids),
+        models.FeeStructure.title == title,
+        models.FeeStructure.term == term,
+        models.FeeStructure.year == year
+    )}
+    conflicting = [s for s in structures.values() if s.amount != amount]
+    if conflicting:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"'{title}' ({term} {year}) already charges {conflicting[0].amount} to this class"
+        )
+    return [structures[class_id] for class_id in class_ids]
+
+def bulk_charge_classes(db: Session, class_ids, stream_ids, title: str, amount: float, term: str, year: int, performer_email: str):
+    """Applies one fee to several classes (optionally only some streams) in a single transaction."""
+    class_ids = list(dict.fromkeys(UUID(str(c)) for c in class_ids))
+    structures = get_or_create_fee_structures(db, class_ids, title, amount, term, year)
+    structure_ids = [s.id for s in structures]
+    charged = charge_structures(db, structure_ids, stream_ids)
+    db.commit()
+    log_action(db, "info", "bulk fee charge", performer_email, f"Charged {charged} students: {title}")
+    return {
+        "message": f"Successfully charged {charged} students.",
+        "charged": charged,
+        "structure_ids": structure_ids,
+    }
+
+def bulk_charge(db: Session, class_id: str, title: str, amount: float, term: str, year: int, performer_email: str):
+    return bulk_charge_classes(db, [class_id], None, title, amount, term, year, performer_email)
+
+def charge_fee_structure(db: Session, structure_id, stream_ids, performer_email: str):
+    """Re-applies an existing structure, e.g. to students who joined the class after it was charged."""
+    structure = db.query(models.FeeStructure.title).filter(models.FeeStructure.id == structure_id).first()
+    if structure is None:
+        raise HTTPException(status_code=404, detail="Fee structure not found")
+    charged = charge_structures(db, [structure_id], stream_ids)
     db.commit()
-    log_action(db, "info", "bulk fee charge", performer_email, f"Charged {len(students)} students: {title}")
-    return {"message": f"Successfully charged {len(students)} students."}
+    log_action(db, "info", "bulk fee charge", performer_email, f"Charged {charged} students: {structure.title}")
+    return {
+        "message": f"Successfully charged {charged} students.",
+        "charged": charged,
+        "structure_ids": [UUID(str(structure_id))],
+    }
 
 def record_payment(db: Session, student_id: str, amount: float, description: str, performer_id: str, performer_email: str):
     fee_record = models.FeeRecord(
@@ -47,8 +188,177 @@ def record_payment(db: Session, student_id: str, amount: float, description: str
         date=datetime.datetime.utcnow()
     )
     db.add(fee_record)
+    apply_balance_deltas(db, {student_id: (0, amount)})
     db.commit()
     
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
     log_action(db, "info", "fee payment", performer_email, f"Recorded payment of {amount} for {student.full_name if student else student_id}", target_user=student.admission_number if student else None)
     return fee_record
+
+def get_balances(db: Session, class_id=None, stream_id=None, skip: int = 0, limit: Optional[int] = None):
+    """Every student's totals in one query; students without fee records show zeros."""
+    balance = models.StudentFeeBalance
+    query = db.query(
+        models.Student.id.label("student_id"),
+        models.Student.full_name,
+        models.Student.admission_number,
+        models.Student.class_id,
+        models.Student.stream_id,
+        func.coalesce(balance.total_charged, 0).label("total_charged"),
+        func.coalesce(balance.total_paid, 0).label("total_paid"),
+        func.coalesce(balance.balance, 0).label("balance"),
+    ).outerjoin(balance, balance.student_id == models.Student.id)
+    if class_id:
+        query = query.filter(models.Student.class_id == class_id)
+    if stream_id:
+        query = query.filter(models.Student.stream_id == stream_id)
+    query = query.order_by(models.Student.admission_number, models.Student.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [dict(row._mapping) for row in query.all()]
+
+def _encode_cursor(date: datetime.datetime, record_id) -> str:
+    return f"{date.isoformat()}_{record_id}"
+
+def _decode_cursor(cursor: str):
+    try:
+        date, record_id = cursor.rsplit("_", 1)
+        return datetime.datetime.fromisoformat(date), UUID(record_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ledger cursor")
+
+def get_ledger(db: Session, student_id, cursor: Optional[str] = None, limit: int = LEDGER_PAGE_SIZE):
+    """
+    A page of a student's fee records, newest first, each with the balance
+    owed after it. The running balance is a window sum over the student's
+    whole history ordered by (date, id); pages are keyset-paginated on the
+    same pair, so `next_cursor` stays valid while new records arrive.
+    """
+    student_id = UUID(str(student_id))
+    limit = max(limit, 1)
+    fees = models.FeeRecord
+    signed = case((fees.type == "charge", fees.amount), (fees.type == "payment", -fees.amount), else_=0)
+    ledger = select(
+        fees.id, fees.amount, fees.type, fees.date, fees.description, fees.recorded_by_id,
+        func.sum(signed).over(order_by=(fees.date, fees.id), rows=(None, 0)).label("running_balance")
+    ).where(fees.student_id == student_id).subquery()
+
+    query = select(ledger).order_by(ledger.c.date.desc(), ledger.c.id.desc()).limit(limit + 1)
+    if cursor:
+        date, record_id = _decode_cursor(cursor)
+        query = query.where(
+            (ledger.c.date < date) | ((ledger.c.date == date) & (ledger.c.id < record_id))
+        )
+    rows = db.execute(query).all()
+
+    totals = db.query(
+        models.StudentFeeBalance.total_charged, models.StudentFeeBalance.total_paid, models.StudentFeeBalance.balance
+    ).filter(models.StudentFeeBalance.student_id == student_id).first()
+
+    history = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = history[-1]
+        next_cursor = _encode_cursor(last["date"], last["id"])
+    return {
+        "student_id": student_id,
+        "total_charged": totals.total_charged if totals else 0.0,
+        "total_paid": totals.total_paid if totals else 0.0,
+        "balance": totals.balance if totals else 0.0,
+        "history": history,
+        "next_cursor": next_cursor,
+    }
+
+# ─── Arrears aging ───────────────────────────────────────────────────────────
+# Payments settle a student's oldest charges first (FIFO), so whatever is
+# still owed sits on the newest charges. Each charge's unpaid part is aged
+# from its date into these buckets: (key, CSV label, newest age in days).
+ARREARS_BUCKETS = [
+    ("days_0_30", "0-30 days", 30),
+    ("days_31_60", "31-60 days", 60),
+    ("days_61_90", "61-90 days", 90),
+    ("days_90_plus", "90+ days", None),
+]
+
+def get_arrears(db: Session, class_id=None, stream_id=None, as_of: Optional[datetime.datetime] = None):
+    """
+    Outstanding balances per class and stream, split into age buckets, in one
+    grouped query over the charges. A charge's unpaid part is
+    clamp(cumulative charges up to it - total paid, 0, amount), with the
+    running total from a window over the student's charges by (date, id) and
+    total paid from student_fee_balances.
+    """
+    as_of = as_of or datetime.datetime.utcnow()
+    fees = models.FeeRecord
+    charges = select(
+        fees.student_id, fees.amount, fees.date,
+        func.sum(fees.amount).over(partition_by=fees.student_id, order_by=(fees.date, fees.id)).label("cumulative")
+    ).where(fees.type == "charge").subquery()
+
+    paid = func.coalesce(models.StudentFeeBalance.total_paid, 0)
+    unpaid = charges.c.cumulative - paid
+    outstanding = case(
+        (unpaid <= 0, 0),
+        (unpaid >= charges.c.amount, charges.c.amount),
+        else_=unpaid
+    )
+
+    columns = []
+    newer_than = None
+    for key, _, max_age in ARREARS_BUCKETS:
+        in_bucket = []
+        if max_age is not None:
+            in_bucket.append(charges.c.date >= as_of - datetime.timedelta(days=max_age))
+        if newer_than is not None:
+            in_bucket.append(charges.c.date < newer_than)
+        columns.append(func.coalesce(func.sum(case((and_(*in_bucket), outstanding), else_=0)), 0).label(key))
+        if max_age is not None:
+            newer_than = as_of - datetime.timedelta(days=max_age)
+
+    query = db.query(
+        models.Student.class_id,
+        models.Class.name.label("class_name"),
+        models.Student.stream_id,
+        models.Stream.name.label("stream_name"),
+        func.count(distinct(case((outstanding > 0, models.Student.id)))).label("students_in_arrears"),
+        *columns,
+        func.coalesce(func.sum(outstanding), 0).label("total"),
+    ).select_from(charges).join(
+        models.Student, models.Student.id == charges.c.student_id
+    ).outerjoin(
+        models.StudentFeeBalance, models.StudentFeeBalance.student_id == charges.c.student_id
+    ).outerjoin(models.Class, models.Class.id == models.Student.class_id).outerjoin(
+        models.Stream, models.Stream.id == models.Student.stream_id
+    ).filter(charges.c.date <= as_of)
+    if class_id:
+        query = query.filter(models.Student.class_id == class_id)
+    if stream_id:
+        query = query.filter(models.Student.stream_id == stream_id)
+    rows = query.group_by(
+        models.Student.class_id, models.Class.name, models.Student.stream_id, models.Stream.name
+    ).order_by(models.Class.name, models.Stream.name).all()
+
+    groups = [dict(row._mapping) for row in rows if row.total > 0]
+    totals = {key: sum(g[key] for g in groups) for key, _, _ in ARREARS_BUCKETS}
+    totals["total"] = sum(g["total"] for g in groups)
+    totals["students_in_arrears"] = sum(g["students_in_arrears"] for g in groups)
+    return {"as_of": as_of, "groups": groups, "totals": totals}
+
+def iter_arrears_csv(report):
+    """Yields the arrears report as CSV text: one row per class/stream, then the totals."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Class", "Stream", "Students in arrears", *[label for _, label, _ in ARREARS_BUCKETS], "Total"])
+    for group in report["groups"]:
+        writer.writerow([
+            group["class_name"] or "", group["stream_name"] or "", group["students_in_arrears"],
+            *[group[key] for key, _, _ in ARREARS_BUCKETS], group["total"]
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    totals = report["totals"]
+    writer.writerow([
+        "All", "", totals["students_in_arrears"], *[totals[key] for key, _, _ in ARREARS_BUCKETS], totals["total"]
+    ])
+    yield buffer.getvalue()
@@ -0,0 +1,148 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, insert, literal, String, Integer
+from fastapi import HTTPException
+from .. import models
+from typing import Dict, List, Optional
+import os
+
+# Term positions computed with SQL window functions and materialized into
+# student_rankings, so report cards and the portal read them with one indexed
+# lookup. Each scope is one INSERT ... SELECT:
+#   class / stream: mean of the student's SubjectTermResult scores, ranked
+#                   within the class (or class stream)
+#   subject:        SubjectTermResult.total_score ranked within the subject
+#   exam:           ExamResult percentage ranked within the exam
+SCOPES = ("class", "stream", "subject", "exam")
+
+# How ties are numbered: standard (1, 1, 3), dense (1, 1, 2) or ordinal
+# (1, 2, 3, ties broken by student id)
+TIE_METHODS = ("standard", "dense", "ordinal")
+DEFAULT_TIE_METHOD = os.getenv("RANKING_TIE_METHOD", "standard")
+
+def _position(tie_method: str, partition_by, score):
+    if tie_method == "dense":
+        return func.dense_rank().over(partition_by=partition_by, order_by=score.desc())
+    if tie_method == "ordinal":
+        return func.row_number().over(partition_by=partition_by, order_by=(score.desc(), models.Student.id))
+    return func.rank().over(partition_by=partition_by, order_by=score.desc())
+
+def _ranked(term: str, year: int, scope: str, ref_id, score, tie_method: str):
+    """Columns in StudentRanking order for one scope; the caller adds FROM/WHERE."""
+    return [
+        literal(term, String).label("term"),
+        literal(year, Integer).label("year"),
+        literal(scope, String).label("scope"),
+        ref_id.label("ref_id"),
+        models.Student.id.label("student_id"),
+        score.label("score"),
+        _position(tie_method, ref_id, score).label("position"),
+        func.count().over(partition_by=ref_id).label("out_of"),
+    ]
+
+def _scope_queries(term: str, year: int, tie_method: str, class_ids=None):
+    r = models.SubjectTermResult
+    means = select(
+        r.student_id.label("student_id"),
+        func.avg(r.total_score).label("score")
+    ).where(
+        r.term == term, r.year == year, r.total_score.is_not(None)
+    ).group_by(r.student_id).subquery()
+
+    overall = lambda scope, ref_id: select(*_ranked(term, year, scope, ref_id, means.c.score, tie_method)).select_from(
+        means
+    ).join(models.Student, models.Student.id == means.c.student_id).where(ref_id.is_not(None))
+
+    subject = select(*_ranked(term, year, "subject", r.subject_id, r.total_score, tie_method)).select_from(r).join(
+        models.Student, models.Student.id == r.student_id
+    ).where(r.term == term, r.year == year, r.total_score.is_not(None))
+
+    e = models.ExamResult
+    percentage = case((e.max_score > 0, e.marks / e.max_score * 100), else_=e.marks)
+    exam = select(*_ranked(term, year, "exam", e.exam_id, percentage, tie_method)).select_from(e).join(
+        models.Student, models.Student.id == e.student_id
+    ).where(e.term == term, e.year == year, e.exam_id.is_not(None), e.marks.is_not(None))
+
+    queries = {
+        "class": overall("class", models.Student.class_id),
+        "stream": overall("stream", models.Student.stream_id),
+        "subject": subject,
+        "exam": exam,
+    }
+    if class_ids is not None:
+        # Every partition (class, stream, subject, exam) lies within one class
+        queries = {scope: query.where(models.Student.class_id.in_(class_ids)) for scope, query in queries.items()}
+    return queries
+
+def compute_term_rankings(db: Session, term: str, year: int, tie_method: Optional[str] = None, commit: bool = True, class_ids=None) -> Dict[str, int]:
+    """
+    Recomputes and stores every position for the term: one DELETE plus one
+    INSERT ... SELECT per scope. Pass `class_ids` to recompute only those
+    classes. Returns the number of rows per scope.
+    """
+    tie_method = tie_method or DEFAULT_TIE_METHOD
+    if tie_method not in TIE_METHODS:
+        raise HTTPException(status_code=400, detail=f"tie_method must be one of {', '.join(TIE_METHODS)}")
+    if class_ids is not None:
+        class_ids = list(class_ids)
+
+    columns = ["term", "year", "scope", "ref_id", "student_id", "score", "position", "out_of"]
+    stale = db.query(models.StudentRanking).filter(
+        models.StudentRanking.term == term,
+        models.StudentRanking.year == year
+    )
+    if class_ids is not None:
+        stale = stale.filter(models.StudentRanking.student_id.in_(
+            select(models.Student.id).where(models.Student.class_id.in_(class_ids))
+        ))
+    stale.delete(synchronize_session=False)
+
+    counts = {}
+    for scope, query in _scope_queries(term, year, tie_method, class_ids).items():
+        result = db.execute(insert(models.StudentRanking).from_select(columns, query))
+        counts[scope] = result.rowcount
+    if commit:
+        db.commit()
+    print(f"[RANKINGS] {term} {year} ({tie_method}): {counts}")
+    return counts
+
+def get_student_positions(db: Session, student_ids: List, term: Optional[str] = None, year: Optional[int] = None):
+    """
+    Positions for the students, keyed by (student_id, term, year):
+    {"class": {...}, "stream": {...}, "subjects": {subject_id: {...}}, "exams": {exam_id: {...}}}
+    """
+    query = db.query(models.StudentRanking).filter(models.StudentRanking.student_id.in_(list(student_ids)))
+    if term:
+        query = query.filter(models.StudentRanking.term == term)
+    if year:
+        query = query.filter(models.StudentRanking.year == year)
+
+    positions = {}
+    for row in query:
+        entry = positions.setdefault((row.student_id, row.term, row.year), {
+            "class": None, "stream": None, "subjects": {}, "exams": {}
+        })
+        value = {"position": row.position, "out_of": row.out_of, "score": row.score}
+        if row.scope in ("class", "stream"):
+            entry[row.scope] = value
+        elif row.scope == "subject":
+            entry["subjects"][row.ref_id] = value
+        elif row.scope == "exam":
+            entry["exams"][row.ref_id] = value
+    return positions
+
+def get_rankings(db: Session, term: str, year: int, scope: str, ref_id, skip: int = 0, limit: Optional[int] = None):
+    """A ranked list for one class, stream, subject or exam, best first."""
+    if scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {', '.join(SCOPES)}")
+    query = db.query(
+        models.StudentRanking.student_id, models.Student.full_name, models.Student.admission_number,
+        models.StudentRanking.score, models.StudentRanking.position, models.StudentRanking.out_of
+    ).join(models.Student, models.Student.id == models.StudentRanking.student_id).filter(
+        models.StudentRanking.term == term,
+        models.StudentRanking.year == year,
+        models.StudentRanking.scope == scope,
+        models.StudentRanking.ref_id == ref_id
+    ).order_by(models.StudentRanking.position, models.Student.full_name).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [row._asdict() for row in query]
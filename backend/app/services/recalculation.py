@@ -0,0 +1,205 @@
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy import func
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor, wait
+from uuid import UUID
+from .. import models
+from ..database import SessionLocal
+from . import cbc, rankings
+import asyncio
+import datetime
+import os
+
+# Term-wide SubjectTermResult recalculation. Subjects are split into chunks
+# and each chunk runs on the worker pool with its own session; items move to
+# "running" when their chunk starts and per-subject outcomes are recorded on
+# RecalculationJobItem rows as they finish. While a job runs, the process
+# running it refreshes heartbeat_at; jobs whose heartbeat goes stale (their
+# process stopped) are failed by a periodic check (fail_interrupted_jobs), so
+# other workers and rolling deploys never fail a job that is still running.
+RECALC_WORKERS = int(os.getenv("RECALC_WORKERS", "4"))
+RECALC_CHUNK_SIZE = int(os.getenv("RECALC_CHUNK_SIZE", "10"))
+RECALC_HEARTBEAT_SECONDS = float(os.getenv("RECALC_HEARTBEAT_SECONDS", "15"))
+RECALC_STALE_SECONDS = float(os.getenv("RECALC_STALE_SECONDS", "120"))
+
+executor = ThreadPoolExecutor(max_workers=RECALC_WORKERS, thread_name_prefix="recalc")
+
+def create_job(db: Session, term: str, year: int, created_by=None):
+    """Registers a job with one pending item per subject that has results for the term."""
+    term_exam = db.query(models.TermExam).filter(
+        models.TermExam.term == term,
+        models.TermExam.year == year
+    ).first()
+    if not term_exam:
+        raise HTTPException(status_code=404, detail=f"No term exam found for {term} {year}")
+
+    subject_ids = [row[0] for row in db.query(models.ExamResult.subject_id).filter(
+        models.ExamResult.term == term,
+        models.ExamResult.year == year
+    ).distinct().all()]
+
+    job = models.RecalculationJob(
+        term=term,
+        year=year,
+        total_subjects=len(subject_ids),
+        created_by=UUID(str(created_by)) if created_by else None
+    )
+    job.items = [models.RecalculationJobItem(subject_id=subject_id) for subject_id in subject_ids]
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: UUID):
+    return db.query(models.RecalculationJob).options(
+        selectinload(models.RecalculationJob.items).joinedload(models.RecalculationJobItem.subject)
+    ).filter(models.RecalculationJob.id == job_id).first()
+
+def _record_item(db: Session, job_id, item_id, status: str, summaries_count=None, error=None):
+    db.query(models.RecalculationJobItem).filter(models.RecalculationJobItem.id == item_id).update({
+        models.RecalculationJobItem.status: status,
+        models.RecalculationJobItem.summaries_count: summaries_count,
+        models.RecalculationJobItem.error: error,
+        models.RecalculationJobItem.finished_at: datetime.datetime.utcnow(),
+    }, synchronize_session=False)
+    counter = models.RecalculationJob.completed_subjects if status == "completed" else models.RecalculationJob.failed_subjects
+    db.query(models.RecalculationJob).filter(models.RecalculationJob.id == job_id).update(
+        {counter: counter + 1}, synchronize_session=False
+    )
+    db.commit()
+
+def run_chunk(job_id, term: str, year: int, items):
+    """Recalculates one chunk of (item_id, subject_id) pairs on its own session."""
+    db = SessionLocal()
+    try:
+        db.query(models.RecalculationJobItem).filter(
+            models.RecalculationJobItem.id.in_([item_id for item_id, _ in items])
+        ).update({
+            models.RecalculationJobItem.status: "running",
+            models.RecalculationJobItem.started_at: datetime.datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+
+        for item_id, subject_id in items:
+            try:
+                summaries = cbc.calculate_subject_term_summaries(db, subject_id, term, year)
+                _record_item(db, job_id, item_id, "completed", summaries_count=len(summaries))
+            except Exception as e:
+                db.rollback()
+                print(f"[RECALC ERROR] Subject {subject_id} failed: {str(e)}")
+                _record_item(db, job_id, item_id, "failed", error=str(e))
+    finally:
+        db.close()
+
+def _heartbeat(db: Session, job_id):
+    db.query(models.RecalculationJob).filter(models.RecalculationJob.id == job_id).update(
+        {models.RecalculationJob.heartbeat_at: datetime.datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+
+def run_job(job_id: UUID):
+    """
+    Background entry point: fans the job's pending subjects out across the
+    worker pool in chunks and waits for them, then closes the job.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(models.RecalculationJob).filter(models.RecalculationJob.id == job_id).first()
+        if not job:
+            return
+        job.status = "running"
+        job.started_at = job.heartbeat_at = datetime.datetime.utcnow()
+        db.commit()
+
+        pending = [(item.id, item.subject_id) for item in job.items if item.status == "pending"]
+        chunks = [pending[i:i + RECALC_CHUNK_SIZE] for i in range(0, len(pending), RECALC_CHUNK_SIZE)]
+        print(f"[RECALC] Job {job_id}: {len(pending)} subjects in {len(chunks)} chunks")
+
+        futures = [executor.submit(run_chunk, job.id, job.term, job.year, chunk) for chunk in chunks]
+        # Heartbeat while the chunks run so the job is never taken for abandoned
+        while wait(futures, timeout=RECALC_HEARTBEAT_SECONDS).not_done:
+            _heartbeat(db, job.id)
+        for future in futures:
+            future.result()
+
+        db.refresh(job)
+        job.status = "completed_with_errors" if job.failed_subjects else "completed"
+        job.finished_at = datetime.datetime.utcnow()
+        db.commit()
+        print(f"[RECALC] Job {job_id} {job.status}: {job.completed_subjects} ok, {job.failed_subjects} failed")
+
+        # Refresh the term's positions from the new summaries
+        try:
+            rankings.compute_term_rankings(db, job.term, job.year)
+        except Exception as e:
+            db.rollback()
+            print(f"[RECALC ERROR] Rankings for {job.term} {job.year} not refreshed: {str(e)}")
+    except Exception as e:
+        db.rollback()
+        print(f"[RECALC ERROR] Job {job_id} aborted: {str(e)}")
+        db.query(models.RecalculationJob).filter(models.RecalculationJob.id == job_id).update({
+            models.RecalculationJob.status: "failed",
+            models.RecalculationJob.finished_at: datetime.datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+INTERRUPTED_ERROR = "Interrupted: the server running the job stopped"
+
+def fail_interrupted_jobs(db: Session, stale_seconds: float = RECALC_STALE_SECONDS) -> int:
+    """
+    Fails jobs still pending or running whose heartbeat (or creation time, if
+    never started) is older than `stale_seconds`, together with their
+    unfinished items. Such jobs lost the process running them and would
+    otherwise stay "running" forever. Returns the number of jobs failed.
+    """
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(seconds=stale_seconds)
+    job = models.RecalculationJob
+    job_ids = [row[0] for row in db.query(job.id).filter(
+        job.status.in_(["pending", "running"]),
+        func.coalesce(job.heartbeat_at, job.created_at) < cutoff
+    )]
+    if not job_ids:
+        return 0
+
+    item = models.RecalculationJobItem
+    unfinished = dict(db.query(item.job_id, func.count(item.id)).filter(
+        item.job_id.in_(job_ids),
+        item.status.in_(["pending", "running"])
+    ).group_by(item.job_id).all())
+    db.query(item).filter(
+        item.job_id.in_(job_ids),
+        item.status.in_(["pending", "running"])
+    ).update({
+        item.status: "failed",
+        item.error: INTERRUPTED_ERROR,
+        item.finished_at: now,
+    }, synchronize_session=False)
+    for job_id in job_ids:
+        db.query(job).filter(job.id == job_id).update({
+            job.status: "failed",
+            job.failed_subjects: job.failed_subjects + unfinished.get(job_id, 0),
+            job.finished_at: now,
+        }, synchronize_session=False)
+    db.commit()
+    print(f"[RECALC] Failed {len(job_ids)} job(s) whose heartbeat went stale")
+    return len(job_ids)
+
+def run_interrupted_job_check():
+    db = SessionLocal()
+    try:
+        fail_interrupted_jobs(db)
+    except Exception as e:
+        db.rollback()
+        print(f"[RECALC ERROR] Could not fail interrupted jobs: {str(e)}")
+    finally:
+        db.close()
+
+async def fail_interrupted_jobs_periodically(interval: float = RECALC_STALE_SECONDS):
+    """Background loop started with the app: checks now, then every `interval` seconds."""
+    while True:
+        await run_in_threadpool(run_interrupted_job_check)
+        await asyncio.sleep(interval)
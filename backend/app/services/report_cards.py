@@ -0,0 +1,364 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import exists, insert, or_
+from concurrent.futures import ProcessPoolExecutor
+from .. import models
+from . import rankings
+from uuid import UUID
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+import zipfile
+
+# Class-wide report card generation. All cards for a class are loaded with a
+# fixed number of set-based queries, rendered in a process pool (HTML, or PDF
+# when weasyprint is installed) and streamed back as a ZIP.
+REPORT_CARD_WORKERS = int(os.getenv("REPORT_CARD_WORKERS", str(os.cpu_count() or 1)))
+RENDER_CHUNK_SIZE = 16
+SNAPSHOT_BATCH_SIZE = 500
+
+FORMATS = ("html", "pdf")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def student_query(db: Session):
+    return db.query(
+        models.Student.id, models.Student.full_name, models.Student.admission_number,
+        models.Student.class_id, models.Class.name.label("grade"), models.Stream.name.label("stream")
+    ).outerjoin(models.Class, models.Class.id == models.Student.class_id).outerjoin(
+        models.Stream, models.Stream.id == models.Student.stream_id
+    )
+
+def position_summary(ranking: Optional[Dict]):
+    return {"position": ranking["position"], "out_of": ranking["out_of"]} if ranking else None
+
+def build_cards(db: Session, students, term: str, year: int) -> List[Dict]:
+    """
+    Report card documents for the given student rows (from _student_query),
+    in the same shape as the student portal's report card. Six queries
+    regardless of the number of students.
+    """
+    if not students:
+        return []
+    student_ids = [s.id for s in students]
+    class_ids = {s.class_id for s in students if s.class_id}
+
+    # 1. Class teachers (first assigned teacher per class)
+    class_teachers = {}
+    if class_ids:
+        for class_id, full_name in db.query(models.User.assigned_class_id, models.User.full_name).filter(
+            models.User.assigned_class_id.in_(class_ids)
+        ):
+            class_teachers.setdefault(class_id, full_name)
+
+    # 2. Term report headers
+    reports = {
+        r.student_id: r for r in db.query(
+            models.TermReport.id, models.TermReport.student_id,
+            models.TermReport.total_days, models.TermReport.present_days,
+            models.TermReport.teacher_comment, models.TermReport.head_teacher_comment
+        ).filter(
+            models.TermReport.student_id.in_(student_ids),
+            models.TermReport.term == term,
+            models.TermReport.year == year
+        )
+    }
+
+    # 3. Report entries with their items
+    entries = {}
+    if reports:
+        entry_rows = db.query(
+            models.TermReportEntry.report_id, models.TermReportEntry.item_id, models.TermReportEntry.level,
+            models.ReportItem.name, models.ReportItem.type
+        ).outerjoin(models.ReportItem, models.ReportItem.id == models.TermReportEntry.item_id).filter(
+            models.TermReportEntry.report_id.in_([r.id for r in reports.values()])
+        ).order_by(models.ReportItem.order, models.ReportItem.name)
+        for e in entry_rows:
+            entries.setdefault(e.report_id, []).append({
+                "item_id": str(e.item_id),
+                "level": e.level,
+                "item": {"name": e.name, "type": e.type} if e.name is not None else None
+            })
+
+    # 4. Materialized positions (see services/rankings.py)
+    positions = rankings.get_student_positions(db, student_ids, term, year)
+
+    # 5. Subject results with subject names
+    subjects = {}
+    result_rows = db.query(
+        models.SubjectTermResult.id, models.SubjectTermResult.student_id, models.SubjectTermResult.subject_id, models.Subject.name,
+        models.SubjectTermResult.performance_level, models.SubjectTermResult.total_score,
+        models.SubjectTermResult.remarks
+    ).join(models.Subject, models.Subject.id == models.SubjectTermResult.subject_id).filter(
+        models.SubjectTermResult.student_id.in_(student_ids),
+        models.SubjectTermResult.term == term,
+        models.SubjectTermResult.year == year
+    ).order_by(models.Subject.name)
+    for r in result_rows:
+        subject_positions = positions.get((r.student_id, term, year), {}).get("subjects", {})
+        subjects.setdefault(r.student_id, []).append({
+            "id": str(r.id),
+            "subject_id": str(r.subject_id),
+            "subject_name": r.name,
+            "performance_level": r.performance_level,
+            "total_score": r.total_score,
+            "remarks": r.remarks,
+            "position": position_summary(subject_positions.get(r.subject_id))
+        })
+
+    # 6. Head teacher comment templates
+    htc_templates = {t.level: t.comment for t in db.query(
+        models.HeadTeacherCommentTemplate.level, models.HeadTeacherCommentTemplate.comment
+    )}
+
+    cards = []
+    for s in students:
+        report = reports.get(s.id)
+        term_report_data = None
+        if report:
+            term_report_data = {
+                "id": str(report.id),
+                "total_days": report.total_days,
+                "present_days": report.present_days,
+                "teacher_comment": report.teacher_comment,
+                "head_teacher_comment": report.head_teacher_comment,
+                "entries": entries.get(report.id, [])
+            }
+        ranked = positions.get((s.id, term, year), {})
+        cards.append({
+            "student": {
+                "full_name": s.full_name,
+                "admission_number": s.admission_number,
+                "grade": s.grade or "N/A",
+                "stream": s.stream or "N/A",
+                "class_teacher": class_teachers.get(s.class_id, "N/A"),
+            },
+            "term": term,
+            "year": year,
+            "subjects": subjects.get(s.id, []),
+            "positions": {"class": position_summary(ranked.get("class")), "stream": position_summary(ranked.get("stream"))},
+            "term_report": term_report_data,
+            "htc_templates": htc_templates,
+        })
+    return cards
+
+def load_class_report_cards(db: Session, class_id: UUID, stream_id: Optional[UUID], term: str, year: int) -> List[Dict]:
+    """Report cards for every student in the class (and stream). Seven queries in total."""
+    class_id = UUID(str(class_id))
+    stream_id = UUID(str(stream_id)) if stream_id else None
+
+    query = student_query(db).filter(models.Student.class_id == class_id)
+    if stream_id:
+        query = query.filter(models.Student.stream_id == stream_id)
+    students = query.order_by(models.Student.full_name, models.Student.id).all()
+    return build_cards(db, students, term, year)
+
+# ─── Snapshots ───────────────────────────────────────────────────────────────
+# Once every TermExam of a term is completed, report data for the term is
+# frozen: the cards are serialized once into report_card_snapshots and the
+# portal serves the stored JSON with its ETag. Reopening the term drops them.
+
+def serialize_card(card: Dict):
+    """Canonical JSON for a card and its strong ETag (sha256 of the JSON)."""
+    document = json.dumps(card, sort_keys=True, separators=(",", ":"), default=str)
+    return document, hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+def term_is_completed(db: Session, term: str, year: int) -> bool:
+    statuses = {status for (status,) in db.query(models.TermExam.edit_status).filter(
+        models.TermExam.term == term,
+        models.TermExam.year == year
+    ).distinct()}
+    return statuses == {"completed"}
+
+def materialize_term_snapshots(db: Session, term: str, year: int) -> int:
+    """
+    (Re)writes snapshots for every student with results or a term report in
+    the term, SNAPSHOT_BATCH_SIZE students at a time. Does not commit.
+    """
+    has_results = exists().where(
+        models.SubjectTermResult.student_id == models.Student.id,
+        models.SubjectTermResult.term == term,
+        models.SubjectTermResult.year == year
+    )
+    has_report = exists().where(
+        models.TermReport.student_id == models.Student.id,
+        models.TermReport.term == term,
+        models.TermReport.year == year
+    )
+    students = student_query(db).filter(or_(has_results, has_report)).order_by(models.Student.id).all()
+
+    delete_term_snapshots(db, term, year)
+    for start in range(0, len(students), SNAPSHOT_BATCH_SIZE):
+        chunk = students[start:start + SNAPSHOT_BATCH_SIZE]
+        rows = []
+        for student, card in zip(chunk, build_cards(db, chunk, term, year)):
+            document, etag = serialize_card(card)
+            rows.append({"student_id": student.id, "term": term, "year": year, "document": document, "etag": etag})
+        db.execute(insert(models.ReportCardSnapshot), rows)
+
+    print(f"[REPORT CARDS] Snapshotted {len(students)} report cards for {term} {year}")
+    return len(students)
+
+def delete_term_snapshots(db: Session, term: str, year: int) -> int:
+    return db.query(models.ReportCardSnapshot).filter(
+        models.ReportCardSnapshot.term == term,
+        models.ReportCardSnapshot.year == year
+    ).delete(synchronize_session=False)
+
+def sync_term_snapshots(db: Session, term: str, year: int):
+    """
+    Call after changing TermExam statuses for a term (before commit). A
+    completed term without snapshots gets them; a term that is no longer
+    completed loses them. Existing snapshots of a completed term are kept.
+    """
+    if term_is_completed(db, term, year):
+        exists_already = db.query(models.ReportCardSnapshot.id).filter(
+            models.ReportCardSnapshot.term == term,
+            models.ReportCardSnapshot.year == year
+        ).first() is not None
+        if not exists_already:
+            # Positions are frozen together with the cards
+            rankings.compute_term_rankings(db, term, year, commit=False)
+            materialize_term_snapshots(db, term, year)
+    elif delete_term_snapshots(db, term, year):
+        print(f"[REPORT CARDS] Term {term} {year} reopened, snapshots dropped")
+
+def get_snapshot(db: Session, student_id, term: str, year: int):
+    return db.query(models.ReportCardSnapshot.document, models.ReportCardSnapshot.etag).filter(
+        models.ReportCardSnapshot.student_id == student_id,
+        models.ReportCardSnapshot.term == term,
+        models.ReportCardSnapshot.year == year
+    ).first()
+
+def render_html(card: Dict) -> str:
+    """Renders one report card as a self-contained HTML page."""
+    e = lambda value: html.escape("" if value is None else str(value))
+    student = card["student"]
+    report = card["term_report"] or {}
+
+    head_teacher_comment = report.get("head_teacher_comment")
+    if not head_teacher_comment:
+        # Fall back to the template for the student's most frequent level
+        levels = [s["performance_level"] for s in card["subjects"] if s["performance_level"]]
+        if levels:
+            head_teacher_comment = card["htc_templates"].get(max(set(levels), key=levels.count))
+
+    def position(ranking):
+        return f"{ranking['position']} / {ranking['out_of']}" if ranking else ""
+
+    subject_rows = "".join(
+        f"<tr><td>{e(s['subject_name'])}</td><td>{e(s['total_score'])}</td>"
+        f"<td>{e(s['performance_level'])}</td><td>{e(position(s.get('position')))}</td><td>{e(s['remarks'])}</td></tr>"
+        for s in card["subjects"]
+    )
+    entry_rows = "".join(
+        f"<tr><td>{e(entry['item']['name'] if entry['item'] else '')}</td>"
+        f"<td>{e(entry['item']['type'] if entry['item'] else '')}</td><td>{e(entry['level'])}</td></tr>"
+        for entry in report.get("entries", [])
+    )
+    attendance = ""
+    if report.get("total_days") is not None:
+        attendance = f"<p>Attendance: {e(report.get('present_days'))} / {e(report.get('total_days'))} days</p>"
+    positions = card.get("positions") or {}
+    standing = ""
+    if positions.get("class") or positions.get("stream"):
+        standing = (
+            f"<p>Class position: {e(position(positions.get('class')) or 'N/A')} &middot; "
+            f"Stream position: {e(position(positions.get('stream')) or 'N/A')}</p>"
+        )
+
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{e(student['full_name'])} - {e(card['term'])} {e(card['year'])}</title>"
+        "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;width:100%;margin-bottom:1em}"
+        "td,th{border:1px solid #999;padding:4px 8px;text-align:left}</style></head><body>"
+        f"<h1>Report Card - {e(card['term'])} {e(card['year'])}</h1>"
+        f"<p><strong>{e(student['full_name'])}</strong> ({e(student['admission_number'])})<br>"
+        f"Grade: {e(student['grade'])} &middot; Stream: {e(student['stream'])} &middot; "
+        f"Class teacher: {e(student['class_teacher'])}</p>"
+        f"{attendance}{standing}"
+        "<table><tr><th>Subject</th><th>Score</th><th>Level</th><th>Position</th><th>Remarks</th></tr>"
+        f"{subject_rows}</table>"
+        + (f"<table><tr><th>Item</th><th>Type</th><th>Level</th></tr>{entry_rows}</table>" if entry_rows else "")
+        + f"<p><strong>Class teacher's comment:</strong> {e(report.get('teacher_comment'))}</p>"
+        f"<p><strong>Head teacher's comment:</strong> {e(head_teacher_comment)}</p>"
+        "</body></html>"
+    )
+
+def pdf_available() -> bool:
+    # weasyprint raises OSError when the Pango system libraries are missing
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+def render_card(card: Dict, fmt: str = "html") -> bytes:
+    """Renders one card to bytes. Runs inside the process pool."""
+    page = render_html(card)
+    if fmt == "pdf":
+        from weasyprint import HTML
+        return HTML(string=page).write_pdf()
+    return page.encode("utf-8")
+
+def card_filename(card: Dict, fmt: str) -> str:
+    student = card["student"]
+    stem = f"{student['admission_number'] or ''}-{student['full_name'] or ''}".strip("-")
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", stem) or "report-card"
+    return f"{stem}.{fmt}"
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=REPORT_CARD_WORKERS)
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def render_cards(cards: List[Dict], fmt: str = "html") -> Iterable[bytes]:
+    """Renders cards in order, in the process pool when there is more than one worker."""
+    if REPORT_CARD_WORKERS <= 1 or len(cards) <= 1:
+        return (render_card(card, fmt) for card in cards)
+    return get_pool().map(render_card, cards, [fmt] * len(cards), chunksize=RENDER_CHUNK_SIZE)
+
+class _ZipStream:
+    """Write-only file object that hands back what has been written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_zip(cards: List[Dict], fmt: str = "html") -> Iterable[bytes]:
+    """Yields a ZIP of rendered cards, one card at a time."""
+    stream = _ZipStream()
+    used_names = set()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for card, content in zip(cards, render_cards(cards, fmt)):
+            name = card_filename(card, fmt)
+            if name in used_names:
+                name = f"{len(used_names)}-{name}"
+            used_names.add(name)
+            archive.writestr(name, content)
+            yield stream.drain()
+    yield stream.drain()
@@ -0,0 +1,148 @@
+from sqlalchemy.orm import Session
+from .. import models
+from ..cache import TTLCache
+from uuid import UUID
+from typing import Iterable, Optional
+import csv
+import io
+import os
+
+# Class score sheets in columnar form, one entry per (class, stream, term,
+# year). SubjectTermResult writers call invalidate_subjects() after commit;
+# each entry remembers its subject ids so only sheets showing those subjects
+# are dropped. Student and subject writers call invalidate_classes() for the
+# classes whose roster or subject list changed.
+score_sheet_cache = TTLCache(
+    maxsize=int(os.getenv("SCORE_SHEET_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("SCORE_SHEET_CACHE_TTL_SECONDS", "300")),
+)
+
+# Rows per chunk written by the streaming exports
+EXPORT_CHUNK_ROWS = 200
+
+def _uuid(value):
+    return UUID(str(value)) if value else None
+
+def build_score_sheet(db: Session, class_id, stream_id, term: Optional[str], year: Optional[int]):
+    """
+    Builds the sheet as parallel arrays: levels[i][j] is the performance level
+    of student i in subject j (None when there is no summary yet).
+    """
+    student_query = db.query(
+        models.Student.id, models.Student.full_name, models.Student.admission_number
+    ).filter(models.Student.class_id == class_id)
+    if stream_id:
+        student_query = student_query.filter(models.Student.stream_id == stream_id)
+    students = student_query.order_by(models.Student.full_name, models.Student.id).all()
+
+    subject_query = db.query(models.Subject.id, models.Subject.name).filter(models.Subject.class_id == class_id)
+    if stream_id:
+        subject_query = subject_query.filter(
+            (models.Subject.stream_id == stream_id) | (models.Subject.stream_id == None)
+        )
+    subjects = subject_query.order_by(models.Subject.name, models.Subject.id).all()
+
+    student_index = {s.id: i for i, s in enumerate(students)}
+    subject_index = {s.id: j for j, s in enumerate(subjects)}
+    levels = [[None] * len(subjects) for _ in students]
+
+    if students and subjects:
+        r = models.SubjectTermResult
+        results_query = db.query(r.student_id, r.subject_id, r.performance_level).filter(
+            r.student_id.in_(list(student_index)),
+            r.subject_id.in_(list(subject_index))
+        )
+        if term:
+            results_query = results_query.filter(r.term == term)
+        if year:
+            results_query = results_query.filter(r.year == year)
+        for student_id, subject_id, level in results_query:
+            levels[student_index[student_id]][subject_index[subject_id]] = level
+
+    return {
+        "term": term,
+        "year": year,
+        "student_ids": [s.id for s in students],
+        "student_names": [s.full_name for s in students],
+        "admission_numbers": [s.admission_number for s in students],
+        "subject_ids": [s.id for s in subjects],
+        "subject_names": [s.name for s in subjects],
+        "levels": levels,
+    }
+
+def get_score_sheet(db: Session, class_id, stream_id, term: Optional[str], year: Optional[int]):
+    """Cached columnar score sheet. Callers must treat the returned dict as read-only."""
+    class_id, stream_id = _uuid(class_id), _uuid(stream_id)
+    key = (class_id, stream_id, term, year)
+    sheet = score_sheet_cache.get(key)
+    if sheet is None:
+        sheet = build_score_sheet(db, class_id, stream_id, term, year)
+        score_sheet_cache.set(key, sheet)
+    return sheet
+
+def invalidate_subjects(subject_ids: Iterable, term: Optional[str], year: Optional[int]) -> int:
+    """Drops cached sheets that show any of the subjects for that term (or for all terms)."""
+    subject_ids = {_uuid(s) for s in subject_ids}
+    if not subject_ids:
+        return 0
+
+    def stale(key, sheet):
+        _, _, sheet_term, sheet_year = key
+        if sheet_term is not None and sheet_term != term:
+            return False
+        if sheet_year is not None and sheet_year != year:
+            return False
+        return not subject_ids.isdisjoint(sheet["subject_ids"])
+
+    return score_sheet_cache.invalidate_where(stale)
+
+def invalidate_classes(class_ids: Optional[Iterable] = None) -> int:
+    """Drops every sheet of the given classes, or all sheets when none are given."""
+    if class_ids is None:
+        count = len(score_sheet_cache)
+        score_sheet_cache.clear()
+        return count
+    class_ids = {_uuid(c) for c in class_ids if c}
+    if not class_ids:
+        return 0
+    return score_sheet_cache.invalidate_where(lambda key, sheet: key[0] in class_ids)
+
+def _header(sheet):
+    return ["Admission Number", "Student"] + sheet["subject_names"]
+
+def _rows(sheet):
+    for admission_number, name, levels in zip(sheet["admission_numbers"], sheet["student_names"], sheet["levels"]):
+        yield [admission_number, name] + [level or "" for level in levels]
+
+def iter_csv(sheet):
+    """Yields the sheet as CSV text, EXPORT_CHUNK_ROWS rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_header(sheet))
+    for i, row in enumerate(_rows(sheet), start=1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_xlsx(sheet, chunk_size: int = 64 * 1024):
+    """Yields the sheet as an .xlsx workbook. Uses openpyxl's write-only mode."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=f"{sheet['term'] or 'All'} {sheet['year'] or ''}".strip()[:31])
+    worksheet.append(_header(sheet))
+    for row in _rows(sheet):
+        worksheet.append(row)
+
+    # A zip archive cannot be emitted row by row; stream the finished file
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    while True:
+        chunk = output.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from ..services import timetable
 from typing import Optional
 
 def get_streams(db: Session, class_id: Optional[str] = None):
@@ -37,6 +38,8 @@ def update_stream(db: Session, stream_uuid: str, stream_in: schemas.StreamUpdate
         setattr(db_stream, key, value)
     
     db.commit()
+    # The compiled timetable resolves teachers through the stream's class
+    timetable.invalidate([db_stream.id])
     db.refresh(db_stream)
     log_action(db, "info", "stream update", performer_email, f"Updated stream: {db_stream.parent_class.name}{db_stream.name}", target_user=f"{db_stream.parent_class.name}{db_stream.name}")
     return db_stream
@@ -54,5 +57,6 @@ def delete_stream(db: Session, stream_uuid: str, performer_email: str):
     full_name = f"{db_stream.parent_class.name}{db_stream.name}"
     db.delete(db_stream)
     db.commit()
+    timetable.invalidate([stream_uuid])
     log_action(db, "warning", "stream deletion", performer_email, f"Deleted stream: {full_name}", target_user=full_name)
     return {"message": "Stream deleted successfully"}
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from . import student_portal
 import uuid
 import datetime
 
@@ -80,6 +81,7 @@ def create_announcement(db: Session, announcement_in: schemas.AnnouncementCreate
     db.add(announcement)
     db.commit()
     db.refresh(announcement)
+    student_portal.invalidate_announcements()
     return announcement
 
 def get_announcements(db: Session, user: dict):
@@ -130,4 +132,5 @@ def delete_announcement(db: Session, announcement_id: str, user: dict):
     
     db.delete(announcement)
     db.commit()
+    student_portal.invalidate_announcements()
     return {"message": "Announcement deleted successfully"}
@@ -0,0 +1,385 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, cast, Float, select, exists, or_
+from .. import models
+from ..cache import TTLCache
+from . import report_cards, rankings, timetable, finance
+from typing import Optional
+from uuid import UUID
+import datetime
+import os
+
+# Student portal reads. Each function takes the sync Session first so the
+# async portal router can run it through AsyncSession.run_sync(); relationship
+# lazy loads stay legal because they happen inside that call.
+
+# Dashboard announcements per (stream, subject set). Announcement writes clear
+# it; the TTL covers renamed subjects, classes and authors.
+announcement_cache = TTLCache(
+    maxsize=int(os.getenv("PORTAL_ANNOUNCEMENT_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("PORTAL_ANNOUNCEMENT_CACHE_TTL_SECONDS", "60")),
+)
+
+def _dashboard_announcements(db: Session, stream_id, subject_ids) -> list:
+    """Latest five announcements for a stream and subject set, names resolved in the same query."""
+    ann = models.Announcement
+    author = aliased(models.User)
+    ann_class = aliased(models.Class)
+    ann_stream = aliased(models.Stream)
+    stream_class = aliased(models.Class)
+    subject = aliased(models.Subject)
+    subject_class = aliased(models.Class)
+    subject_stream = aliased(models.Stream)
+
+    rows = db.query(
+        ann.id, ann.title, ann.content, ann.category, ann.class_id, ann.stream_id, ann.subject_id,
+        ann.created_at, ann.created_by_id,
+        author.full_name.label("author_name"),
+        ann_class.name.label("class_name"),
+        ann_stream.name.label("stream_name"),
+        stream_class.name.label("stream_class_name"),
+        subject.name.label("subject_name"),
+        subject_class.name.label("subject_class_name"),
+        subject_stream.name.label("subject_stream_name"),
+    ).outerjoin(author, author.id == ann.created_by_id).outerjoin(
+        ann_class, ann_class.id == ann.class_id
+    ).outerjoin(ann_stream, ann_stream.id == ann.stream_id).outerjoin(
+        stream_class, stream_class.id == ann_stream.class_id
+    ).outerjoin(subject, subject.id == ann.subject_id).outerjoin(
+        subject_class, subject_class.id == subject.class_id
+    ).outerjoin(subject_stream, subject_stream.id == subject.stream_id).filter(
+        or_(
+            ann.category == "SCHOOL",
+            (ann.category == "STREAM") & (ann.stream_id == stream_id),
+            (ann.category == "SUBJECT") & ann.subject_id.in_(subject_ids)
+        )
+    ).order_by(ann.created_at.desc()).limit(5).all()
+
+    announcements = []
+    for row in rows:
+        # Friendly target name
+        target_name = None
+        if row.category == "SCHOOL":
+            target_name = "Whole School"
+        elif row.category == "STREAM" and row.stream_id and row.stream_name is not None:
+            class_name = row.class_name or row.stream_class_name or ""
+            target_name = f"{class_name}. {row.stream_name}".strip(". ")
+        elif row.category == "SUBJECT" and row.subject_name is not None:
+            class_name = row.class_name or row.subject_class_name or ""
+            stream_name = row.stream_name or row.subject_stream_name or ""
+            target_name = row.subject_name
+            context = f"{class_name}. {stream_name}".strip(". ")
+            if context:
+                target_name += f" ({context})"
+        elif row.category == "STAFF":
+            target_name = "Staff Only"
+
+        announcements.append({
+            "id": row.id,
+            "title": row.title,
+            "content": row.content,
+            "category": row.category,
+            "class_id": row.class_id,
+            "stream_id": row.stream_id,
+            "subject_id": row.subject_id,
+            "created_at": row.created_at,
+            "created_by_id": row.created_by_id,
+            "author_name": row.author_name or "Unknown",
+            "class_name": row.class_name,
+            "stream_name": row.stream_name,
+            "subject_name": row.subject_name,
+            "target_name": target_name,
+        })
+    return announcements
+
+def get_dashboard_announcements(db: Session, stream_id, subject_ids) -> list:
+    """Cached per (stream, subject set): classmates taking the same subjects share one entry."""
+    key = (UUID(str(stream_id)) if stream_id else None, frozenset(subject_ids))
+    announcements = announcement_cache.get(key)
+    if announcements is None:
+        announcements = _dashboard_announcements(db, stream_id, list(subject_ids))
+        announcement_cache.set(key, announcements)
+    return announcements
+
+def invalidate_announcements():
+    # An announcement can match many (stream, subject set) keys
+    announcement_cache.clear()
+
+def get_dashboard(db: Session, current_student):
+    """
+    Three statements per request once the announcement and timetable sections
+    are cached: the student's subject ids, their assignments, and one row of
+    attendance and fee aggregates.
+    """
+    now = datetime.datetime.utcnow()
+    next_week = now + datetime.timedelta(days=7)
+
+    subject_ids = [
+        row[0] for row in db.query(models.student_subjects.c.subject_id).filter(
+            models.student_subjects.c.student_id == current_student.id
+        ).all()
+    ]
+
+    # 1. Assignments: upcoming (due in next 7 days) and overdue (past due and not submitted)
+    upcoming_assignments, overdue_assignments = [], []
+    if subject_ids:
+        submitted = exists().where(
+            models.AssignmentSubmission.assignment_id == models.Assignment.id,
+            models.AssignmentSubmission.student_id == current_student.id
+        )
+        rows = db.query(
+            models.Assignment.id, models.Assignment.title, models.Assignment.description,
+            models.Assignment.file_url, models.Assignment.file_name, models.Assignment.due_date,
+            models.Assignment.created_at, models.Assignment.subject_id, models.Assignment.teacher_id
+        ).filter(
+            models.Assignment.subject_id.in_(subject_ids),
+            models.Assignment.due_date <= next_week,
+            or_(models.Assignment.due_date >= now, ~submitted)
+        ).order_by(models.Assignment.due_date).all()
+        for row in rows:
+            assignment = dict(row._mapping)
+            if row.due_date >= now:
+                upcoming_assignments.append(assignment)
+            else:
+                overdue_assignments.append(assignment)
+
+    # 2. Attendance and the maintained fee balance in one row
+    attendance = models.AttendanceRecord
+    totals = db.query(
+        select(func.count(attendance.id)).where(attendance.student_id == current_student.id).scalar_subquery(),
+        select(func.count(attendance.id)).where(
+            attendance.student_id == current_student.id,
+            attendance.status.in_(["present", "late"])
+        ).scalar_subquery(),
+        select(models.StudentFeeBalance.balance).where(
+            models.StudentFeeBalance.student_id == current_student.id
+        ).scalar_subquery(),
+    ).one()
+    total_attendance, present_attendance, fee_balance = totals
+    attendance_percentage = (present_attendance / total_attendance * 100) if total_attendance > 0 else 100.0
+    fee_balance = fee_balance or 0.0
+
+    # 3. Announcements (cached per stream and subject set)
+    announcements = get_dashboard_announcements(db, current_student.stream_id, subject_ids)
+
+    # 4. Timetable preview (cached per stream)
+    # Get iso day (1-7), but our system uses 1-6 (Mon-Sat)
+    today_iso = datetime.datetime.now().isoweekday()
+    timetable_weekly = timetable.get_stream_timetable(db, current_student.stream_id)
+    timetable_today = [s for s in timetable_weekly if s["day_of_week"] == today_iso]
+
+    return {
+        "upcoming_assignments": upcoming_assignments,
+        "overdue_assignments": overdue_assignments,
+        "attendance_percentage": attendance_percentage,
+        "announcements": announcements,
+        "timetable_today": timetable_today,
+        "timetable_weekly": timetable_weekly,
+        "fee_balance": fee_balance
+    }
+
+def get_subjects(db: Session, current_student):
+    subjects = db.query(models.Subject).filter(
+        models.Subject.assigned_students.any(id=current_student.id)
+    ).all()
+    
+    result = []
+    for subject in subjects:
+        # Get primary teacher for this subject in student's class
+        assignment = db.query(models.TeacherSubjectAssignment).filter(
+            models.TeacherSubjectAssignment.subject_id == subject.id,
+            models.TeacherSubjectAssignment.class_id == current_student.class_id
+        ).first()
+        
+        teacher_name = assignment.teacher.full_name if assignment and assignment.teacher else "Not Assigned"
+        
+        result.append({
+            "id": subject.id,
+            "name": subject.name,
+            "teacher_name": teacher_name
+        })
+    return result
+
+def get_subject_details(db: Session, current_student, subject_id: str):
+    subject = db.query(models.Subject).filter(models.Subject.id == subject_id).first()
+    if not subject:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    
+    # Check if student is enrolled
+    if not any(s.id == current_student.id for s in subject.assigned_students):
+        raise HTTPException(status_code=403, detail="Not enrolled in this subject")
+
+    # performance analytics (assignment average)
+    avg_marks = db.query(func.avg(cast(models.AssignmentSubmission.grade, Float))).filter(
+        models.AssignmentSubmission.student_id == current_student.id,
+        models.AssignmentSubmission.assignment_id.in_(
+            db.query(models.Assignment.id).filter(models.Assignment.subject_id == subject_id)
+        ),
+        models.AssignmentSubmission.grade != None
+    ).scalar()
+
+    announcements = db.query(models.Announcement).filter(
+        models.Announcement.subject_id == subject_id,
+        models.Announcement.category == "SUBJECT"
+    ).order_by(models.Announcement.created_at.desc()).all()
+    
+    # Populate names for response
+    for ann in announcements:
+        ann.author_name = ann.author.full_name if ann.author else "Unknown"
+        ann.class_name = ann.assigned_class.name if ann.assigned_class else None
+        ann.stream_name = ann.assigned_stream.name if ann.assigned_stream else None
+        ann.subject_name = ann.subject.name if ann.subject else None
+        
+        # Friendly target name
+        if ann.category == "SUBJECT" and ann.subject:
+            class_name = ann.assigned_class.name if ann.assigned_class else (ann.subject.assigned_class.name if ann.subject.assigned_class else "")
+            stream_name = ann.assigned_stream.name if ann.assigned_stream else (ann.subject.assigned_stream.name if ann.subject.assigned_stream else "")
+            
+            target = f"{ann.subject.name}"
+            context = f"{class_name}. {stream_name}".strip(". ")
+            if context:
+                target += f" ({context})"
+            ann.target_name = target
+        else:
+            ann.target_name = "Subject Target"
+
+    materials = db.query(models.CourseMaterial).filter(
+        models.CourseMaterial.subject_id == subject_id
+    ).order_by(models.CourseMaterial.created_at.desc()).all()
+
+    assignments = db.query(models.Assignment).outerjoin(
+        models.AssignmentSubmission,
+        (models.AssignmentSubmission.assignment_id == models.Assignment.id) &
+        (models.AssignmentSubmission.student_id == current_student.id)
+    ).filter(
+        models.Assignment.subject_id == subject_id
+    ).all()
+
+    exam_results = db.query(models.ExamResult).filter(
+        models.ExamResult.student_id == current_student.id,
+        models.ExamResult.subject_id == subject_id
+    ).all()
+
+    return {
+        "id": subject.id,
+        "name": subject.name,
+        "performance_avg": avg_marks or 0.0,
+        "announcements": announcements,
+        "materials": materials,
+        "assignments": assignments,
+        "exam_results": exam_results
+    }
+
+def get_results(db: Session, current_student):
+    # Fetch all data
+    exam_results = db.query(models.ExamResult).join(models.Subject).filter(
+        models.ExamResult.student_id == current_student.id
+    ).all()
+    
+    term_summaries = db.query(models.SubjectTermResult).join(models.Subject).filter(
+        models.SubjectTermResult.student_id == current_student.id
+    ).all()
+    
+    grouped = {}
+    
+    # 1. Initialize structure and collect unique exams per term
+    for res in exam_results:
+        year = str(res.year)
+        term = res.term
+        if year not in grouped:
+            grouped[year] = {}
+        if term not in grouped[year]:
+            grouped[year][term] = {
+                "exams": set(),
+                "subjects": {}
+            }
+        
+        exam_name = res.exam.name if res.exam else "Assessment"
+        grouped[year][term]["exams"].add(exam_name)
+        
+        sub_id = str(res.subject_id)
+        if sub_id not in grouped[year][term]["subjects"]:
+            grouped[year][term]["subjects"][sub_id] = {
+                "name": res.subject.name,
+                "scores": {},
+                "grade": "N/A"
+            }
+        
+        grouped[year][term]["subjects"][sub_id]["scores"][exam_name] = res.marks
+
+    # 2. Add term summaries (calculated grade levels)
+    for summ in term_summaries:
+        year = str(summ.year)
+        term = summ.term
+        if year not in grouped: continue
+        if term not in grouped[year]: continue
+        
+        sub_id = str(summ.subject_id)
+        if sub_id in grouped[year][term]["subjects"]:
+            grouped[year][term]["subjects"][sub_id]["grade"] = summ.performance_level or "N/A"
+            grouped[year][term]["subjects"][sub_id]["average"] = summ.total_score
+
+    # 2b. Materialized positions (class / stream overall, per subject, per exam)
+    exam_subjects = {res.exam_id: (str(res.subject_id), res.exam.name if res.exam else "Assessment")
+                     for res in exam_results if res.exam_id}
+    for (_, term, year), ranked in rankings.get_student_positions(db, [current_student.id]).items():
+        year = str(year)
+        if year not in grouped or term not in grouped[year]:
+            continue
+        grouped[year][term]["positions"] = {
+            "class": report_cards.position_summary(ranked["class"]),
+            "stream": report_cards.position_summary(ranked["stream"]),
+        }
+        subjects = grouped[year][term]["subjects"]
+        for subject_id, subject_ranking in ranked["subjects"].items():
+            if str(subject_id) in subjects:
+                subjects[str(subject_id)]["position"] = report_cards.position_summary(subject_ranking)
+        for exam_id, exam_ranking in ranked["exams"].items():
+            sub_id, exam_name = exam_subjects.get(exam_id, (None, None))
+            if sub_id in subjects:
+                subjects[sub_id].setdefault("exam_positions", {})[exam_name] = report_cards.position_summary(exam_ranking)
+
+    # 3. Finalize structure: Convert sets to sorted lists and subjects to lists
+    final_output = {}
+    for year, terms in grouped.items():
+        final_output[year] = {}
+        for term, data in terms.items():
+            # Sort exams (try to keep common ones like Opener, Mid-term, Final in order)
+            exam_order = ["Opener", "Mid-term", "Final"]
+            sorted_exams = sorted(list(data["exams"]), key=lambda x: exam_order.index(x) if x in exam_order else 99)
+            
+            final_output[year][term] = {
+                "exams": sorted_exams,
+                "subjects": sorted(list(data["subjects"].values()), key=lambda x: x["name"]),
+                "positions": data.get("positions", {"class": None, "stream": None})
+            }
+
+    return final_output
+
+def get_fee_ledger(db: Session, current_student, cursor: Optional[str] = None, limit: int = finance.LEDGER_PAGE_SIZE):
+    return finance.get_ledger(db, current_student.id, cursor, limit)
+
+def get_report_card_snapshot(db: Session, current_student, term: str, year: int):
+    """The frozen (document, etag) for a completed term, or None while the term is open."""
+    return report_cards.get_snapshot(db, current_student.id, term, year)
+
+def get_report_card(db: Session, current_student, term: str, year: int):
+    """Return full CBC report card data for the logged-in student."""
+    students = report_cards.student_query(db).filter(models.Student.id == current_student.id).all()
+    if not students:
+        raise HTTPException(status_code=404, detail="Student not found")
+    # Same builder as the class batch and the completed-term snapshots
+    [card] = report_cards.build_cards(db, students, term, year)
+    return card
+
+def get_available_terms(db: Session, current_student):
+    """Return a list of {term, year} combinations for which a term report exists."""
+    reports = db.query(
+        models.TermReport.term,
+        models.TermReport.year
+    ).filter(
+        models.TermReport.student_id == current_student.id
+    ).distinct().order_by(models.TermReport.year.desc(), models.TermReport.term.desc()).all()
+
+    return [{"term": r.term, "year": r.year} for r in reports]
+
@@ -2,7 +2,33 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from ..services import counters, score_sheet, exam_statistics
+from ..cache import TTLCache
 from typing import Optional
+import os
+
+# Current token_version per student, so portal requests can check for
+# revoked tokens without reading the students table every time.
+token_version_cache = TTLCache(
+    maxsize=int(os.getenv("STUDENT_TOKEN_CACHE_MAX_ENTRIES", "4096")),
+    ttl=float(os.getenv("STUDENT_TOKEN_CACHE_TTL_SECONDS", "60")),
+)
+
+def get_token_version(db: Session, student_id):
+    """Returns the student's current token_version, or None if the student no longer exists."""
+    version = token_version_cache.get(student_id)
+    if version is None:
+        version = db.query(models.Student.token_version).filter(models.Student.id == student_id).scalar()
+        if version is not None:
+            token_version_cache.set(student_id, version)
+    return version
+
+def revoke_student_tokens(db_student: models.Student):
+    """
+    Invalidates every portal token issued to this student. The caller commits
+    and then drops the cached version so other requests pick up the new one.
+    """
+    db_student.token_version = (db_student.token_version or 0) + 1
 
 def get_students(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None, class_id: Optional[str] = None, stream_id: Optional[str] = None, subject_id: Optional[str] = None):
     query = db.query(models.Student)
@@ -75,7 +101,9 @@ def create_student(db: Session, student_in: schemas.StudentCreate):
 
     db_student = models.Student(**student_data)
     db.add(db_student)
+    counters.bump(db, total_students=1)
     db.commit()
+    score_sheet.invalidate_classes([student_in.class_id])
     db.refresh(db_student)
     return db_student
 
@@ -89,11 +117,26 @@ def update_student(db: Session, student_uuid: str, student_in: schemas.StudentUp
         stream = db.query(models.Stream).filter(models.Stream.id == student_in.stream_id).first()
         if stream:
             update_data["stream"] = stream.name
+
+    # Class, stream and activation are embedded in portal tokens
+    previous = (db_student.class_id, db_student.stream_id, db_student.activated)
+    previous_class_id = db_student.class_id
             
     for key, value in update_data.items():
         setattr(db_student, key, value)
+
+    claims_changed = (db_student.class_id, db_student.stream_id, db_student.activated) != previous
+    if claims_changed:
+        revoke_student_tokens(db_student)
     
     db.commit()
+    if claims_changed:
+        token_version_cache.invalidate(db_student.id)
+    # Name, admission number or class/stream may have changed on the sheets
+    score_sheet.invalidate_classes([previous_class_id, db_student.class_id])
+    if (db_student.class_id, db_student.stream_id) != previous[:2]:
+        # Exam statistics are grouped by the student's current class and stream
+        exam_statistics.invalidate_students(db, [db_student.id])
     db.refresh(db_student)
     return db_student
 
@@ -104,8 +147,17 @@ def delete_student(db: Session, student_uuid: str, performer_email: str):
     
     std_name = db_student.full_name
     admin_num = db_student.admission_number
+    class_id = db_student.class_id
+    # The student's borrow records are kept with the link cleared; open loans stop counting
+    open_loans = counters.open_loan_count(db, models.BorrowRecord.student_id == db_student.id)
+    # The student's exam results are deleted with them
+    exam_ids = exam_statistics.exam_ids_for_students(db, [db_student.id])
     db.delete(db_student)
+    counters.bump(db, total_students=-1, active_borrows=-open_loans)
     db.commit()
+    token_version_cache.invalidate(db_student.id)
+    score_sheet.invalidate_classes([class_id])
+    exam_statistics.invalidate(exam_ids)
     log_action(db, "warning", "student deletion", performer_email, f"Deleted student: {std_name}", target_user=admin_num)
     return {"message": "Student deleted successfully"}
 
@@ -116,7 +168,9 @@ def reset_student_account(db: Session, student_uuid: str, performer_email: str):
     
     db_student.activated = False
     db_student.password = None
+    revoke_student_tokens(db_student)
     db.commit()
+    token_version_cache.invalidate(db_student.id)
     log_action(db, "info", "student account reset", performer_email, f"Reset account for student: {db_student.full_name}", target_user=db_student.admission_number)
     return {"message": "Student account reset successfully. They can now onboard again."}
 
@@ -146,6 +200,7 @@ def promote_students(db: Session, performer_email: str):
                     # Move to next class
                     next_class = class_map[next_form_name.lower()]
                     s.class_id = next_class.id
+                    revoke_student_tokens(s)
                     
                     # Try to find matching stream in new class
                     if s.assigned_stream:
@@ -176,6 +231,10 @@ def promote_students(db: Session, performer_email: str):
             errors += 1
             
     db.commit()
+    if promoted:
+        token_version_cache.clear()
+        score_sheet.invalidate_classes()
+        exam_statistics.invalidate()
     log_action(db, "info", "bulk promotion", performer_email, f"Promoted: {promoted}, Graduated: {graduated}, Errors: {errors}")
     return {
         "message": "Promotion process completed",
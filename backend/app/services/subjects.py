@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from typing import List, Optional
 from .. import models, schemas
+from . import timetable, score_sheet
 import uuid
 from uuid import UUID
 
@@ -142,6 +143,7 @@ def create_subject(db: Session, subject: schemas.SubjectCreate):
             db_subject.assigned_students = all_students
             
         db.commit()
+        score_sheet.invalidate_classes([db_subject.class_id])
         db.refresh(db_subject)
 
         # Handle teacher assignment if provided
@@ -155,6 +157,7 @@ def create_subject(db: Session, subject: schemas.SubjectCreate):
             )
             db.add(db_assignment)
             db.commit()
+            timetable.invalidate()
 
         return db_subject
     except IntegrityError:
@@ -167,6 +170,7 @@ def update_subject(db: Session, subject_id: str, subject_update: schemas.Subject
         return None
     
     update_data = subject_update.dict(exclude_unset=True)
+    previous_class_id = db_subject.class_id
     
     # Handle teacher assignment separately since it's a different table
     if 'teacher_id' in update_data:
@@ -194,6 +198,8 @@ def update_subject(db: Session, subject_id: str, subject_update: schemas.Subject
     try:
         db.commit()
         db.refresh(db_subject)
+        timetable.invalidate()
+        score_sheet.invalidate_classes([previous_class_id, db_subject.class_id])
         return db_subject
     except IntegrityError:
         db.rollback()
@@ -202,8 +208,11 @@ def update_subject(db: Session, subject_id: str, subject_update: schemas.Subject
 def delete_subject(db: Session, subject_id: str):
     db_subject = db.query(models.Subject).filter(models.Subject.id == subject_id).first()
     if db_subject:
+        class_id = db_subject.class_id
         db.delete(db_subject)
         db.commit()
+        timetable.invalidate()
+        score_sheet.invalidate_classes([class_id])
         return True
     return False
 
@@ -272,6 +281,7 @@ def assign_subjects_to_teacher_with_classes(db: Session, teacher_id: str, assign
         db.add(db_assignment)
     
     db.commit()
+    timetable.invalidate()
     return get_teacher_subject_assignments(db, teacher_id)
 
 def get_teacher_subject_assignments(db: Session, teacher_id: str):
@@ -331,6 +341,7 @@ def batch_update_teacher_assignments(db: Session, assignments: List[schemas.Subj
             db.add(db_assignment)
     
     db.commit()
+    timetable.invalidate()
     return True
 
 def enroll_students_in_subject(db: Session, subject_id: str, student_ids: List[str]):
@@ -357,4 +368,6 @@ def delete_all_subjects(db: Session):
     for s in subjects:
         db.delete(s)
     db.commit()
+    timetable.invalidate()
+    score_sheet.invalidate_classes()
     return True
@@ -0,0 +1,175 @@
+from sqlalchemy.orm import Session
+from .. import models
+from . import bulk, cbc, rankings
+import datetime
+import threading
+import time
+import os
+
+# Keeps SubjectTermResult rows current after exam result writes. Writers mark
+# (subject, term, year, student) keys dirty after they commit; the keys are
+# stored in pending_summary_refreshes so they survive a restart and are seen
+# by every worker. A debounced timer then recomputes only those summaries,
+# grouped per subject so each group is one grouped query plus one upsert.
+# Positions of the affected classes are then rematerialized.
+# Engines with queued keys are tracked so the refresh always runs against the
+# database that was written to; the app also drains the queue on startup and
+# shutdown. Groups that fail are retried on their own, with backoff.
+REFRESH_DELAY_SECONDS = float(os.getenv("SUMMARY_REFRESH_DELAY_SECONDS", "2"))
+REFRESH_MAX_DELAY_SECONDS = float(os.getenv("SUMMARY_REFRESH_MAX_DELAY_SECONDS", "10"))
+REFRESH_MAX_RETRY_DELAY_SECONDS = float(os.getenv("SUMMARY_REFRESH_MAX_RETRY_DELAY_SECONDS", "300"))
+
+KEY_COLUMNS = ["subject_id", "term", "year", "student_id"]
+
+_lock = threading.Lock()
+_binds = set()
+_timer = None
+_first_marked_at = None
+_failed_flushes = 0
+
+def _schedule(delay: float):
+    """Arms the refresh timer. Call with _lock held."""
+    global _timer
+    if _timer is not None:
+        _timer.cancel()
+    _timer = threading.Timer(delay, flush)
+    _timer.daemon = True
+    _timer.start()
+
+def mark_dirty(db: Session, keys):
+    """
+    Queues (subject_id, term, year, student_id) keys for recomputation and
+    commits them. Each call pushes the refresh back by REFRESH_DELAY_SECONDS
+    so a burst of saves is handled once, but never beyond
+    REFRESH_MAX_DELAY_SECONDS.
+    """
+    global _timer, _first_marked_at
+    keys = set(keys)
+    if not keys:
+        return
+
+    now = datetime.datetime.utcnow()
+    # Re-marking a queued key moves its marked_at forward, so a refresh that
+    # is already running leaves it queued for the next one
+    bulk.upsert_rows(
+        db, models.PendingSummaryRefresh,
+        [dict(zip(KEY_COLUMNS, key), marked_at=now) for key in keys],
+        index_elements=KEY_COLUMNS,
+        update_columns=["marked_at"]
+    )
+    db.commit()
+
+    with _lock:
+        _binds.add(db.get_bind())
+        now = time.monotonic()
+        if _first_marked_at is None:
+            _first_marked_at = now
+        if _timer is not None and now - _first_marked_at >= REFRESH_MAX_DELAY_SECONDS:
+            return
+        _schedule(REFRESH_DELAY_SECONDS)
+
+def pending_keys():
+    with _lock:
+        binds = set(_binds)
+    keys = set()
+    for bind in binds:
+        db = Session(bind=bind)
+        try:
+            keys.update(
+                tuple(getattr(row, col) for col in KEY_COLUMNS)
+                for row in db.query(models.PendingSummaryRefresh)
+            )
+        finally:
+            db.close()
+    return keys
+
+def _refresh(bind):
+    """
+    Recomputes the summaries queued in one database, then the positions of
+    the classes they belong to. Returns (written, failed groups).
+    """
+    db = Session(bind=bind)
+    written, failed = 0, 0
+    try:
+        started = datetime.datetime.utcnow()
+        q = models.PendingSummaryRefresh
+        groups = {}
+        for row in db.query(q.id, q.subject_id, q.term, q.year, q.student_id):
+            groups.setdefault((row.subject_id, row.term, row.year), []).append(row)
+        db.rollback()
+
+        refreshed = {}
+        for (subject_id, term, year), rows in groups.items():
+            try:
+                student_ids = {row.student_id for row in rows}
+                summaries = cbc.calculate_subject_term_summaries(db, subject_id, term, year, student_ids=student_ids)
+                written += len(summaries)
+                db.query(q).filter(
+                    q.id.in_([row.id for row in rows]),
+                    q.marked_at <= started
+                ).delete(synchronize_session=False)
+                db.commit()
+                refreshed.setdefault((term, year), set()).update(student_ids)
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                print(f"[SUMMARIES ERROR] Refresh failed for subject {subject_id} ({term} {year}): {str(e)}")
+
+        for (term, year), student_ids in refreshed.items():
+            try:
+                class_ids = {class_id for (class_id,) in db.query(models.Student.class_id).filter(
+                    models.Student.id.in_(list(student_ids)),
+                    models.Student.class_id.is_not(None)
+                ).distinct()}
+                if class_ids:
+                    rankings.compute_term_rankings(db, term, year, class_ids=class_ids)
+            except Exception as e:
+                db.rollback()
+                print(f"[SUMMARIES ERROR] Ranking refresh failed for {term} {year}: {str(e)}")
+    finally:
+        db.close()
+    return written, failed
+
+def flush(bind=None):
+    """
+    Recomputes every queued summary now, in the databases written to since
+    the last flush (plus `bind`, to pick up keys left by a previous process).
+    Groups that fail stay queued and are retried after a delay that doubles
+    with each failed flush, up to REFRESH_MAX_RETRY_DELAY_SECONDS. Returns
+    the number of summaries written.
+    """
+    global _timer, _first_marked_at, _failed_flushes
+    with _lock:
+        binds = set(_binds)
+        _binds.clear()
+        if bind is not None:
+            binds.add(bind)
+        if _timer is not None:
+            _timer.cancel()
+        _timer = None
+        _first_marked_at = None
+
+    written = 0
+    retry = False
+    for target in binds:
+        target_written, failed = _refresh(target)
+        written += target_written
+        if failed:
+            retry = True
+            with _lock:
+                _binds.add(target)
+
+    with _lock:
+        if retry:
+            _failed_flushes += 1
+            delay = min(REFRESH_DELAY_SECONDS * 2 ** _failed_flushes, REFRESH_MAX_RETRY_DELAY_SECONDS)
+            # A mark_dirty since this flush began may have armed a sooner timer
+            if _timer is None:
+                _schedule(delay)
+                print(f"[SUMMARIES] Retrying failed refreshes in {delay:.0f}s")
+        else:
+            _failed_flushes = 0
+
+    if written:
+        print(f"[SUMMARIES] Refreshed {written} term summaries")
+    return written
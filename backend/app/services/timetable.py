@@ -0,0 +1,101 @@
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .. import models
+from ..cache import TTLCache
+from uuid import UUID
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+
+# Compiled timetable per stream (subject and teacher names resolved, JSON and
+# ETag precomputed), shared by the staff timetable view and every student in
+# the stream. Slot writes invalidate the streams they touch; subject and
+# teacher assignment writes clear everything. The TTL covers staff renames.
+timetable_cache = TTLCache(
+    maxsize=int(os.getenv("TIMETABLE_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("TIMETABLE_CACHE_TTL_SECONDS", "300")),
+)
+
+def build_stream_timetable(db: Session, stream_id) -> Optional[Dict]:
+    """
+    Compiles a stream's week: all slots in one query, ordered by day and start
+    time, plus the serialized JSON and its ETag. None if the stream is unknown.
+    """
+    stream = db.query(models.Stream.class_id).filter(models.Stream.id == stream_id).first()
+    if stream is None:
+        return None
+
+    slot = models.TimetableSlot
+    tsa = models.TeacherSubjectAssignment
+    # First teacher assigned to the slot's subject in the stream's class
+    teacher_name = select(models.User.full_name).join(
+        tsa, tsa.teacher_id == models.User.id
+    ).where(
+        tsa.subject_id == slot.subject_id,
+        tsa.class_id == stream.class_id
+    ).order_by(tsa.created_at, tsa.id).limit(1).correlate(slot).scalar_subquery()
+
+    rows = db.query(
+        slot.id, slot.stream_id, slot.subject_id, slot.start_time, slot.end_time, slot.day_of_week, slot.type,
+        models.Subject.name.label("subject_name"), teacher_name.label("teacher_name")
+    ).outerjoin(models.Subject, models.Subject.id == slot.subject_id).filter(
+        slot.stream_id == stream_id
+    ).order_by(slot.day_of_week, slot.start_time).all()
+
+    slots = [
+        {
+            "id": row.id,
+            "stream_id": row.stream_id,
+            "subject_id": row.subject_id,
+            "subject_name": row.subject_name or "Free",
+            "teacher_name": row.teacher_name or ("-" if row.type == "lesson" else None),
+            "start_time": row.start_time,
+            "end_time": row.end_time,
+            "day_of_week": row.day_of_week,
+            "type": row.type,
+        }
+        for row in rows
+    ]
+    document = json.dumps(slots, sort_keys=True, separators=(",", ":"), default=str)
+    return {
+        "slots": slots,
+        "document": document,
+        "etag": hashlib.sha256(document.encode("utf-8")).hexdigest(),
+    }
+
+def get_compiled_timetable(db: Session, stream_id) -> Optional[Dict]:
+    """Cached build_stream_timetable. Callers must treat the result as read-only."""
+    stream_id = UUID(str(stream_id))
+    compiled = timetable_cache.get(stream_id)
+    if compiled is None:
+        compiled = build_stream_timetable(db, stream_id)
+        if compiled is not None:
+            timetable_cache.set(stream_id, compiled)
+    return compiled
+
+def get_stream_timetable(db: Session, stream_id) -> List[dict]:
+    """The stream's slots as dicts; empty for a missing or unknown stream."""
+    compiled = get_compiled_timetable(db, stream_id) if stream_id else None
+    return compiled["slots"] if compiled else []
+
+def timetable_response(request: Request, compiled: Dict) -> Response:
+    """
+    The compiled JSON with a strong ETag. Clients may store it but must
+    revalidate, which costs a 304 and no queries while the entry is cached.
+    """
+    etag = f'"{compiled["etag"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=compiled["document"], media_type="application/json", headers=headers)
+
+def invalidate(stream_ids: Optional[Iterable] = None):
+    """Drops the given streams, or every stream when none are given."""
+    if stream_ids is None:
+        timetable_cache.clear()
+        return
+    for stream_id in {UUID(str(s)) for s in stream_ids if s}:
+        timetable_cache.invalidate(stream_id)
@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException
 from ..services.logs import log_action
+from ..services import counters
+from .. import auth
 from typing import Optional
 
 def get_staff(db: Session, search: Optional[str] = None, role_filter: Optional[str] = None):
@@ -61,6 +63,7 @@ def appoint_self_as_director(db: Session, current_user: dict):
     db_subrole = models.UserSubrole(user_id=db_user.id, subrole_name="director")
     db.add(db_subrole)
     db.commit()
+    auth.invalidate_principal(db_user.clerk_id)
     
     log_action(
         db, 
@@ -132,6 +135,7 @@ def update_user_role(db: Session, user_uuid: str, role_update: schemas.UserRoleU
     if new_role not in ["admin", "librarian", "teacher", "SUPER_ADMIN", "none"]:
         raise HTTPException(status_code=400, detail="Invalid role specified")
 
+    counters.bump(db, **counters.role_deltas(target_user.role, new_role))
     target_user.role = new_role
     
     # Assign class/stream if it's a teacher or admin
@@ -171,6 +175,7 @@ def update_user_role(db: Session, user_uuid: str, role_update: schemas.UserRoleU
 
     db.commit()
     db.refresh(target_user)
+    auth.invalidate_principal(target_user.clerk_id)
     
     log_action(
         db, 
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from jose import jwt, JWTError
+
+
+class TokenVerificationError(Exception):
+    pass
+
+
+class JWKSVerifier:
+    """
+    Verifies Clerk session JWTs locally against a cached JSON Web Key Set.
+
+    The key set is fetched once and kept in memory. It is refreshed lazily
+    when it is older than `cache_ttl`, or when a token names a `kid` we have
+    not seen (key rotation) - the latter at most once per
+    `min_refresh_interval` so that garbage tokens cannot trigger a fetch
+    storm. If a refresh fails, the previously cached keys stay in use.
+    """
+
+    def __init__(
+        self,
+        jwks_url: Optional[str] = None,
+        jwks_file: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        cache_ttl: float = 3600,
+        min_refresh_interval: float = 60,
+        leeway: int = 5,
+        authorized_parties: Optional[List[str]] = None,
+        timeout: float = 5,
+    ):
+        self.jwks_url = jwks_url
+        self.jwks_file = jwks_file
+        self.secret_key = secret_key
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.leeway = leeway
+        self.authorized_parties = authorized_parties or []
+        self.timeout = timeout
+
+        self._keys: Dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._last_attempt: Optional[float] = None  # monotonic time of the last fetch, None before the first
+        self._lock = threading.Lock()
+
+    def _load_jwks(self) -> dict:
+        if self.jwks_file:
+            with open(self.jwks_file) as f:
+                return json.load(f)
+
+        headers = {"Accept": "application/json"}
+        if self.secret_key:
+            headers["Authorization"] = f"Bearer {self.secret_key}"
+        request = urllib.request.Request(self.jwks_url, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reloads the key set. Returns False if throttled or the fetch failed."""
+        with self._lock:
+            now = time.monotonic()
+            throttled = self._last_attempt is not None and now - self._last_attempt < self.min_refresh_interval
+            if not force and throttled:
+                return False
+            self._last_attempt = now
+            try:
+                jwks = self._load_jwks()
+            except Exception as e:
+                print(f"[AUTH ERROR] JWKS refresh failed: {str(e)}")
+                return False
+
+            keys = {k["kid"]: k for k in jwks.get("keys", []) if k.get("kid")}
+            if not keys:
+                print("[AUTH ERROR] JWKS refresh returned no usable keys")
+                return False
+            self._keys = keys
+            self._fetched_at = now
+            print(f"[AUTH] JWKS loaded ({len(keys)} keys)")
+            return True
+
+    def get_key(self, kid: str) -> dict:
+        if not self._keys or time.monotonic() - self._fetched_at > self.cache_ttl:
+            self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None and self.refresh():
+            key = self._keys.get(kid)
+        if key is None:
+            raise TokenVerificationError(f"No signing key found for kid '{kid}'")
+        return key
+
+    def verify(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise TokenVerificationError(f"Malformed token: {str(e)}")
+
+        kid = header.get("kid")
+        if not kid:
+            raise TokenVerificationError("Token header has no kid")
+        key = self.get_key(kid)
+
+        try:
+            payload = jwt.decode(
+                token,
+                key,
+                algorithms=[key.get("alg", "RS256")],
+                options={"verify_aud": False, "leeway": self.leeway},
+            )
+        except JWTError as e:
+            raise TokenVerificationError(str(e))
+
+        if self.authorized_parties and payload.get("azp") not in self.authorized_parties:
+            raise TokenVerificationError("Token azp is not an authorized party")
+        return payload
+
+
+def verifier_from_env() -> JWKSVerifier:
+    parties = os.getenv("CLERK_AUTHORIZED_PARTIES")
+    return JWKSVerifier(
+        jwks_url=os.getenv("CLERK_JWKS_URL", "https://api.clerk.com/v1/jwks"),
+        jwks_file=os.getenv("CLERK_JWKS_FILE"),
+        secret_key=os.getenv("CLERK_SECRET_KEY"),
+        cache_ttl=float(os.getenv("CLERK_JWKS_CACHE_TTL_SECONDS", "3600")),
+        min_refresh_interval=float(os.getenv("CLERK_JWKS_MIN_REFRESH_SECONDS", "60")),
+        authorized_parties=[p.strip() for p in parties.split(",") if p.strip()] if parties else None,
+    )
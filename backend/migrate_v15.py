@@ -0,0 +1,34 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v15: Student token versions...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        # Bumped whenever a student's portal tokens must stop working
+        # (account reset, class/stream change)
+        print("Adding token_version to students table...")
+        cur.execute("""
+            ALTER TABLE students
+            ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+        """)
+
+        conn.commit()
+        print("Migration v15 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v15 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
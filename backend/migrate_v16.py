@@ -0,0 +1,46 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v16: Dashboard counters...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        # Rollup counters maintained by the write paths; the app reconciles
+        # them on startup and periodically, which also seeds the rows
+        print("Creating dashboard_counters table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS dashboard_counters (
+                name VARCHAR PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # overdue_count is counted live rather than stored; this index keeps
+        # that count cheap
+        print("Dropping stored overdue_count and indexing open loans by due date...")
+        cur.execute("DELETE FROM dashboard_counters WHERE name = 'overdue_count';")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_borrow_records_status_due_date
+            ON borrow_records (status, due_date);
+        """)
+
+        conn.commit()
+        print("Migration v16 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v16 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,56 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# (table, constraint name, natural key). NULLS NOT DISTINCT needs Postgres 15+.
+CONSTRAINTS = [
+    ("exam_results", "unique_exam_result",
+     ["student_id", "exam_id", "subject_id", "term", "year"]),
+    ("subject_term_results", "unique_subject_term_result",
+     ["student_id", "subject_id", "term", "year"]),
+    ("student_competency_assessments", "unique_competency_assessment",
+     ["student_id", "subject_id", "competency_id", "exam_id", "term", "year"]),
+]
+
+def migrate():
+    print("Starting migration v17: Natural-key unique constraints for grading tables...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        for table, name, columns in CONSTRAINTS:
+            cur.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", (name,))
+            if cur.fetchone():
+                print(f"{name} already exists, skipping.")
+                continue
+
+            # Keep one row per natural key before the constraint can be added
+            same_key = " AND ".join(f"a.{c} IS NOT DISTINCT FROM b.{c}" for c in columns)
+            print(f"Removing duplicate rows from {table}...")
+            cur.execute(f"""
+                DELETE FROM {table} a
+                USING {table} b
+                WHERE a.ctid < b.ctid AND {same_key};
+            """)
+            print(f"Removed {cur.rowcount} duplicates. Adding {name}...")
+            cur.execute(f"""
+                ALTER TABLE {table}
+                ADD CONSTRAINT {name} UNIQUE NULLS NOT DISTINCT ({", ".join(columns)});
+            """)
+
+        conn.commit()
+        print("Migration v17 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v17 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
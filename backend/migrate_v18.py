@@ -0,0 +1,64 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v18: Recalculation jobs...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        print("Creating recalculation_jobs table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS recalculation_jobs (
+                id UUID PRIMARY KEY,
+                term VARCHAR NOT NULL,
+                year INTEGER NOT NULL,
+                status VARCHAR DEFAULT 'pending',
+                total_subjects INTEGER NOT NULL DEFAULT 0,
+                completed_subjects INTEGER NOT NULL DEFAULT 0,
+                failed_subjects INTEGER NOT NULL DEFAULT 0,
+                created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                heartbeat_at TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+        """)
+        cur.execute("ALTER TABLE recalculation_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;")
+
+        print("Creating recalculation_job_items table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS recalculation_job_items (
+                id UUID PRIMARY KEY,
+                job_id UUID NOT NULL REFERENCES recalculation_jobs(id) ON DELETE CASCADE,
+                subject_id UUID NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+                status VARCHAR DEFAULT 'pending',
+                summaries_count INTEGER,
+                error TEXT,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+        """)
+        cur.execute("ALTER TABLE recalculation_job_items ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_recalculation_job_items_job_id
+            ON recalculation_job_items (job_id);
+        """)
+
+        conn.commit()
+        print("Migration v18 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v18 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,44 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v19: Report card snapshots...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        print("Creating report_card_snapshots table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS report_card_snapshots (
+                id UUID PRIMARY KEY,
+                student_id UUID NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                term VARCHAR NOT NULL,
+                year INTEGER NOT NULL,
+                document TEXT NOT NULL,
+                etag VARCHAR NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT unique_report_card_snapshot UNIQUE (student_id, term, year)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_report_card_snapshots_term_year
+            ON report_card_snapshots (term, year);
+        """)
+
+        conn.commit()
+        print("Migration v19 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v19 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
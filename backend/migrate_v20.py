@@ -0,0 +1,45 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v20: Student rankings...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        print("Creating student_rankings table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS student_rankings (
+                term VARCHAR NOT NULL,
+                year INTEGER NOT NULL,
+                scope VARCHAR NOT NULL,
+                ref_id UUID NOT NULL,
+                student_id UUID NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                score DOUBLE PRECISION,
+                position INTEGER NOT NULL,
+                out_of INTEGER NOT NULL,
+                PRIMARY KEY (term, year, scope, ref_id, student_id)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_student_rankings_student_term
+            ON student_rankings (student_id, term, year);
+        """)
+
+        conn.commit()
+        print("Migration v20 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v20 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
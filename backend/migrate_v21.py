@@ -0,0 +1,60 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v21: Student fee balances...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        print("Creating student_fee_balances table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS student_fee_balances (
+                student_id UUID PRIMARY KEY REFERENCES students(id) ON DELETE CASCADE,
+                total_charged DOUBLE PRECISION NOT NULL DEFAULT 0,
+                total_paid DOUBLE PRECISION NOT NULL DEFAULT 0,
+                balance DOUBLE PRECISION NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+
+        print("Backfilling balances from fee_records...")
+        cur.execute("""
+            INSERT INTO student_fee_balances (student_id, total_charged, total_paid, balance, updated_at)
+            SELECT student_id,
+                   COALESCE(SUM(CASE WHEN type = 'charge' THEN amount ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN type = 'payment' THEN amount ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN type = 'charge' THEN amount WHEN type = 'payment' THEN -amount ELSE 0 END), 0),
+                   NOW()
+            FROM fee_records
+            GROUP BY student_id
+            ON CONFLICT (student_id) DO UPDATE SET
+                total_charged = EXCLUDED.total_charged,
+                total_paid = EXCLUDED.total_paid,
+                balance = EXCLUDED.balance,
+                updated_at = EXCLUDED.updated_at;
+        """)
+
+        print("Adding ledger index on fee_records...")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_fee_records_student_date
+            ON fee_records (student_id, date, id);
+        """)
+
+        conn.commit()
+        print("Migration v21 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v21 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,110 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v22: Fee structure charges...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        print("Adding fee_structure_id to fee_records...")
+        cur.execute("""
+            ALTER TABLE fee_records
+            ADD COLUMN IF NOT EXISTS fee_structure_id UUID REFERENCES fee_structures(id) ON DELETE SET NULL;
+        """)
+
+        # Link charges made before the column existed, so re-running an old
+        # structure does not charge those students again. bulk_charge wrote
+        # "<title> (<term> <year>)" and the structure's amount; when a fee was
+        # charged more than once, the n-th charge of a student pairs with the
+        # n-th structure of the same amount, so a charge is never linked to a
+        # structure billing a different amount. Structures have no creation
+        # column; among equal-amount duplicates the order is by id.
+        print("Linking existing charges to their fee structures...")
+        cur.execute("""
+            WITH recs AS (
+                SELECT fr.id, s.class_id, fr.description, fr.amount,
+                       ROW_NUMBER() OVER (PARTITION BY fr.student_id, fr.description, fr.amount ORDER BY fr.date, fr.id) AS rn
+                FROM fee_records fr
+                JOIN students s ON s.id = fr.student_id
+                WHERE fr.type = 'charge' AND fr.fee_structure_id IS NULL
+            ), structs AS (
+                SELECT fs.id, fs.class_id, fs.amount, fs.title || ' (' || fs.term || ' ' || fs.year || ')' AS description,
+                       ROW_NUMBER() OVER (PARTITION BY fs.class_id, fs.title, fs.term, fs.year, fs.amount ORDER BY fs.id) AS rn
+                FROM fee_structures fs
+            )
+            UPDATE fee_records fr
+            SET fee_structure_id = structs.id
+            FROM recs
+            JOIN structs ON structs.class_id = recs.class_id
+                AND structs.description = recs.description
+                AND structs.amount = recs.amount
+                AND structs.rn = recs.rn
+            WHERE fr.id = recs.id;
+        """)
+        print(f"Linked {cur.rowcount} charges.")
+
+        # Existing duplicates are separate charges (possibly of different
+        # amounts), so they are kept and numbered rather than merged: the
+        # structure charged first keeps the title, later ones become
+        # "<title> (2)", "<title> (3)", ...
+        print("Numbering duplicate fee structures...")
+        cur.execute("""
+            WITH ranked AS (
+                SELECT fs.id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY fs.class_id, fs.title, fs.term, fs.year
+                           ORDER BY (SELECT MIN(fr.date) FROM fee_records fr WHERE fr.fee_structure_id = fs.id) NULLS LAST, fs.id
+                       ) AS rn
+                FROM fee_structures fs
+            )
+            UPDATE fee_structures fs
+            SET title = fs.title || ' (' || ranked.rn || ')'
+            FROM ranked
+            WHERE fs.id = ranked.id AND ranked.rn > 1;
+        """)
+        print(f"Renamed {cur.rowcount} duplicate structures.")
+
+        print("Adding unique constraint on fee_structures (class_id, title, term, year)...")
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'uq_fee_structure_class_title_term_year'
+                ) THEN
+                    ALTER TABLE fee_structures
+                    ADD CONSTRAINT uq_fee_structure_class_title_term_year UNIQUE (class_id, title, term, year);
+                END IF;
+            END $$;
+        """)
+
+        print("Adding unique constraint on (fee_structure_id, student_id)...")
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'uq_fee_record_structure_student'
+                ) THEN
+                    ALTER TABLE fee_records
+                    ADD CONSTRAINT uq_fee_record_structure_student UNIQUE (fee_structure_id, student_id);
+                END IF;
+            END $$;
+        """)
+
+        conn.commit()
+        print("Migration v22 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v22 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,42 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def migrate():
+    print("Starting migration v23: Pending summary refreshes...")
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    try:
+        # Keys marked dirty by exam result writes survive restarts here until
+        # the debounced refresh (or the next startup) recomputes them
+        print("Creating pending_summary_refreshes table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pending_summary_refreshes (
+                id UUID PRIMARY KEY,
+                subject_id UUID NOT NULL,
+                term VARCHAR,
+                year INTEGER,
+                student_id UUID NOT NULL,
+                marked_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                CONSTRAINT unique_pending_summary_refresh
+                    UNIQUE NULLS NOT DISTINCT (subject_id, term, year, student_id)
+            );
+        """)
+
+        conn.commit()
+        print("Migration v23 completed successfully!")
+    except Exception as e:
+        conn.rollback()
+        print(f"Migration v23 failed: {e}")
+        raise e
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
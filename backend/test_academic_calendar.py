@@ -0,0 +1,80 @@
+import sys
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import schemas, query_stats
+from app.database import Base
+from app.services import admin_exams as service
+from app.routers.cbc import resolve_term
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_academic_calendar.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+@pytest.fixture
+def db():
+    service.calendar_cache.clear()
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        service.calendar_cache.clear()
+
+def count_statements(fn, *args):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        result = fn(*args)
+    finally:
+        query_stats.current_stats.reset(token)
+    return result, stats.count
+
+def term_exam(name, term, year, edit_status="current"):
+    return schemas.TermExamCreate(name=name, term=term, year=year, edit_status=edit_status)
+
+def test_current_term_is_cached(db):
+    service.create_term_exam(db, term_exam("Mid-term", "Term 1", 2024))
+
+    current, first = count_statements(service.get_current_term, db)
+    assert current == ("Term 1", 2024)
+    assert first >= 1
+
+    (term, year), cached = count_statements(resolve_term, db, None, None)
+    assert (term, year) == ("Term 1", 2024)
+    assert cached == 0
+
+    # Explicit parameters win over the calendar
+    assert resolve_term(db, "Term 3", None) == ("Term 3", 2024)
+
+def test_missing_calendar_is_cached_too(db):
+    assert service.get_current_term(db) is None
+    _, statements = count_statements(service.get_current_term, db)
+    assert statements == 0
+    assert resolve_term(db, None, None) == (None, None)
+
+def test_term_exam_writes_invalidate_calendar(db):
+    first = service.create_term_exam(db, term_exam("End-term", "Term 1", 2024))
+    assert service.get_current_term(db) == ("Term 1", 2024)
+
+    second = service.create_term_exam(db, term_exam("Mid-term", "Term 2", 2024))
+    assert service.get_current_term(db) == ("Term 2", 2024)
+
+    service.batch_update_term_exams(db, schemas.TermExamBatchUpdate(term="Term 2", year=2024, edit_status="completed"))
+    assert service.get_current_term(db) == ("Term 1", 2024)
+
+    service.update_term_exam(db, first.id, term_exam("End-term", "Term 1", 2024, edit_status="completed"))
+    # No current term left: falls back to the latest one overall
+    assert service.get_current_term(db) == ("Term 2", 2024)
+
+    service.delete_term_exam(db, second.id)
+    assert service.get_current_term(db) == ("Term 1", 2024)
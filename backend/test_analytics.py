@@ -0,0 +1,112 @@
+import sys
+import os
+import uuid
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, query_stats
+from app.database import Base
+from app.services import analytics, counters
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_analytics.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db):
+    now = datetime.datetime.utcnow()
+    cls = models.Class(id=uuid.uuid4(), name="Form 1")
+    student = models.Student(id=uuid.uuid4(), full_name="Student", admission_number="1", class_id=cls.id)
+    books = [
+        models.Book(id=uuid.uuid4(), book_id="B1", title="Algebra", category="Maths"),
+        models.Book(id=uuid.uuid4(), book_id="B2", title="Geometry", category="Maths"),
+        models.Book(id=uuid.uuid4(), book_id="B3", title="Poems", category="English"),
+        models.Book(id=uuid.uuid4(), book_id="B4", title="Untagged", category=None),
+    ]
+    borrows = [
+        # overdue, borrowed today
+        models.BorrowRecord(book_id=books[0].id, student_id=student.id, class_id=cls.id, status="borrowed",
+                            borrow_date=now, due_date=now - datetime.timedelta(days=1)),
+        # active, borrowed 2 days ago
+        models.BorrowRecord(book_id=books[0].id, student_id=student.id, class_id=cls.id, status="borrowed",
+                            borrow_date=now - datetime.timedelta(days=2), due_date=now + datetime.timedelta(days=5)),
+        # returned, outside the 7-day window
+        models.BorrowRecord(book_id=books[2].id, student_id=student.id, class_id=cls.id, status="returned",
+                            borrow_date=now - datetime.timedelta(days=30), due_date=now - datetime.timedelta(days=20)),
+    ]
+    users = [
+        models.User(id=uuid.uuid4(), email="t1@school.test", role="teacher"),
+        models.User(id=uuid.uuid4(), email="t2@school.test", role="teacher"),
+        models.User(id=uuid.uuid4(), email="l@school.test", role="librarian"),
+        models.User(id=uuid.uuid4(), email="p@school.test", role="none"),
+        models.User(id=uuid.uuid4(), email="s@school.test", role="SUPER_ADMIN"),
+    ]
+    logs = [
+        models.SystemLog(level="critical", action="x", timestamp=now),
+        models.SystemLog(level="error", action="y", timestamp=now - datetime.timedelta(days=3)),
+    ]
+    db.add_all([cls, student, *books, *borrows, *users, *logs])
+    db.commit()
+    return now
+
+def test_super_admin_dashboard_in_few_statements(db):
+    now = seed(db)
+    counters.reconcile(db)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        data = analytics.get_analytics(db, {"role": "SUPER_ADMIN", "id": str(uuid.uuid4())})
+    finally:
+        query_stats.current_stats.reset(token)
+
+    assert data["stats"] == {
+        "total_books": 4,
+        "total_students": 1,
+        "active_borrows": 2,
+        "overdue_count": 1,
+        "total_staff": 4,
+        "total_teachers": 2,
+        "total_librarians": 1,
+        "pending_registrations": 1,
+        "critical_logs_count": 1,
+        "total_assignments": 0,
+        "total_subjects": 0,
+    }
+    assert sorted(data["category_distribution"], key=lambda c: c["name"]) == [
+        {"name": "English", "value": 1},
+        {"name": "Maths", "value": 2},
+    ]
+    assert data["top_books"][0] == {"title": "Algebra", "count": 2}
+
+    trends = {t["date"]: t["count"] for t in data["trends"]}
+    assert len(trends) == 7
+    assert trends[now.strftime("%Y-%m-%d")] == 1
+    assert trends[(now - datetime.timedelta(days=2)).strftime("%Y-%m-%d")] == 1
+    assert sum(trends.values()) == 2
+
+    assert stats.count <= 7
+
+def test_librarian_dashboard(db):
+    seed(db)
+    data = analytics.get_analytics(db, {"role": "librarian", "id": str(uuid.uuid4())})
+    assert data["stats"]["total_books"] == 4
+    assert data["stats"]["overdue_count"] == 1
+    assert data["stats"]["total_staff"] == 0
+    assert data["trends"] == []
@@ -0,0 +1,99 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from typing import List
+from pydantic import TypeAdapter
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import cbc as service
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_assessment_reads.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db, students=40, competencies=8):
+    subject_id, exam_id = uuid.uuid4(), uuid.uuid4()
+    comps = [models.Competency(id=uuid.uuid4(), subject_id=subject_id, name=f"Competency {i}") for i in range(competencies)]
+    student_ids = [uuid.uuid4() for _ in range(students)]
+    db.add_all(comps)
+    db.add_all([
+        models.StudentCompetencyAssessment(
+            student_id=s, subject_id=subject_id, competency_id=c.id, exam_id=exam_id,
+            term=TERM, year=YEAR, performance_level="ME"
+        )
+        for s in student_ids for c in comps
+    ])
+    names = [c.name for c in comps]
+    db.commit()
+    db.expunge_all()
+    return subject_id, student_ids, names
+
+def count_statements(fn, *args, **kwargs):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        query_stats.current_stats.reset(token)
+    return result, stats.count
+
+def test_subject_assessments_are_one_query(db):
+    subject_id, student_ids, comps = seed(db)
+
+    rows, statements = count_statements(service.get_subject_assessments, db, subject_id, TERM, YEAR)
+    assert statements == 1
+    assert len(rows) == len(student_ids) * len(comps)
+    assert {r["competency_name"] for r in rows} == set(comps)
+
+    # Rows validate straight into the response schema
+    parsed = TypeAdapter(List[schemas.StudentCompetencyAssessmentResponse]).validate_python(rows)
+    assert parsed[0].term == TERM
+
+def test_assessment_pagination_is_stable(db):
+    subject_id, student_ids, comps = seed(db, students=5, competencies=4)
+
+    everything = service.get_subject_assessments(db, subject_id, TERM, YEAR)
+    pages = [
+        service.get_subject_assessments(db, subject_id, TERM, YEAR, skip=skip, limit=6)
+        for skip in range(0, len(everything), 6)
+    ]
+    assert [len(p) for p in pages] == [6, 6, 6, 2]
+    assert [r["id"] for p in pages for r in p] == [r["id"] for r in everything]
+
+def test_student_assessments_filter_and_unknown_competency(db):
+    subject_id, student_ids, comps = seed(db, students=2, competencies=3)
+    orphan = models.StudentCompetencyAssessment(
+        student_id=student_ids[0], subject_id=uuid.uuid4(), competency_id=uuid.uuid4(), exam_id=uuid.uuid4(),
+        term=TERM, year=YEAR, performance_level="BE"
+    )
+    db.add(orphan)
+    db.commit()
+
+    rows, statements = count_statements(service.get_student_assessments, db, student_ids[0])
+    assert statements == 1
+    assert len(rows) == 4
+    assert sum(r["competency_name"] == "Unknown" for r in rows) == 1
+
+    rows = service.get_student_assessments(db, student_ids[0], subject_id)
+    assert len(rows) == 3
@@ -113,3 +113,28 @@ def test_performance_level_mapping(db):
     db.commit()
     summaries = service.calculate_subject_term_summaries(db, subid, term, year)
     assert summaries[0].performance_level == "AE"
+
+def test_recalculation_keeps_remarks_and_scales(db):
+    subid = uuid.uuid4()
+    term = "Term 1"
+    year = 2024
+    students = [uuid.uuid4() for _ in range(40)]
+    for i, sid in enumerate(students):
+        db.add(models.ExamResult(
+            id=uuid.uuid4(), student_id=sid, subject_id=subid, term=term, year=year,
+            marks=i + 40, max_score=100
+        ))
+    db.add(models.SubjectTermResult(
+        id=uuid.uuid4(), student_id=students[0], subject_id=subid, term=term, year=year,
+        total_score=0, performance_level="BE", remarks="Keep working"
+    ))
+    db.commit()
+
+    summaries = service.calculate_subject_term_summaries(db, subid, term, year)
+    assert len(summaries) == 40
+    assert db.query(models.SubjectTermResult).count() == 40
+
+    first = next(s for s in summaries if s.student_id == students[0])
+    assert first.total_score == 40.0
+    assert first.performance_level == "AE"
+    assert first.remarks == "Keep working"
@@ -0,0 +1,108 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import cbc as service
+from app.services import summary_refresh
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_bulk_upsert.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        summary_refresh.flush()
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def grading_sheet(student_ids, subject_id, exam_id, competency_ids, marks, level):
+    term, year = "Term 1", 2024
+    return schemas.BulkExamResultCreate(
+        results=[
+            schemas.ExamResultCreate(student_id=s, subject_id=subject_id, exam_id=exam_id, term=term, year=year, marks=marks, max_score=100)
+            for s in student_ids
+        ],
+        summaries=[
+            schemas.SubjectTermResultCreate(student_id=s, subject_id=subject_id, term=term, year=year, total_score=marks, performance_level=level)
+            for s in student_ids
+        ],
+        assessments=[
+            schemas.StudentCompetencyAssessmentCreate(
+                student_id=s, subject_id=subject_id, competency_id=c, exam_id=exam_id,
+                term=term, year=year, performance_level=level
+            )
+            for s in student_ids for c in competency_ids
+        ],
+    )
+
+def save(db, sheet, teacher_id):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        results = service.bulk_upsert_exam_results(db, sheet, teacher_id=teacher_id)
+    finally:
+        query_stats.current_stats.reset(token)
+    return results, stats.count
+
+def test_bulk_save_is_constant_statements_and_idempotent(db):
+    subject_id, exam_id = uuid.uuid4(), uuid.uuid4()
+    teacher_id = str(uuid.uuid4())
+    competency_ids = [uuid.uuid4() for _ in range(8)]
+    small = [uuid.uuid4() for _ in range(5)]
+    large = small + [uuid.uuid4() for _ in range(55)]
+
+    _, small_count = save(db, grading_sheet(small, subject_id, exam_id, competency_ids, 50, "AE"), teacher_id)
+    results, large_count = save(db, grading_sheet(large, subject_id, exam_id, competency_ids, 85, "EE"), teacher_id)
+    assert small_count == large_count
+
+    assert [r.student_id for r in results] == large
+    assert all(r.marks == 85 for r in results)
+    assert db.query(models.ExamResult).count() == 60
+    assert db.query(models.SubjectTermResult).count() == 60
+    assert db.query(models.StudentCompetencyAssessment).count() == 480
+
+    updated = db.query(models.StudentCompetencyAssessment).filter(
+        models.StudentCompetencyAssessment.student_id == small[0]
+    ).all()
+    assert {a.performance_level for a in updated} == {"EE"}
+    assert {str(a.assessed_by) for a in updated} == {teacher_id}
+
+def test_duplicate_keys_in_one_batch_keep_last(db):
+    sid, subject_id, exam_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    sheet = schemas.BulkExamResultCreate(results=[
+        schemas.ExamResultCreate(student_id=sid, subject_id=subject_id, exam_id=exam_id, term="Term 1", year=2024, marks=10),
+        schemas.ExamResultCreate(student_id=sid, subject_id=subject_id, exam_id=exam_id, term="Term 1", year=2024, marks=20),
+    ])
+    results, _ = save(db, sheet, None)
+    assert len(results) == 1 and results[0].marks == 20
+    assert db.query(models.ExamResult).count() == 1
+
+def test_results_without_exam_update_in_place(db):
+    sid, subject_id = uuid.uuid4(), uuid.uuid4()
+
+    def result(marks):
+        return schemas.ExamResultCreate(student_id=sid, subject_id=subject_id, exam_id=None, term="Term 1", year=2024, marks=marks)
+
+    first = service.create_exam_result(db, result(40))
+    second = service.create_exam_result(db, result(70))
+    assert second.id == first.id
+    results, _ = save(db, schemas.BulkExamResultCreate(results=[result(90)]), None)
+    assert results[0].id == first.id
+
+    assert db.query(models.ExamResult).count() == 1
+    assert db.query(models.ExamResult).one().marks == 90
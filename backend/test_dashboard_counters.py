@@ -0,0 +1,114 @@
+import sys
+import os
+import uuid
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas
+from app.database import Base
+from app.services import counters, books, students, circulation, users
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_dashboard_counters.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ADMIN = {"role": "SUPER_ADMIN", "id": str(uuid.uuid4()), "email": "admin@school.test", "full_name": "Admin", "subroles": []}
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    counters.reconcile(db)
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def stored(db):
+    db.expire_all()
+    return counters.get_counters(db)
+
+def test_write_paths_keep_counters_in_step(db):
+    cls = models.Class(id=uuid.uuid4(), name="Form 1")
+    db.add(cls)
+    db.commit()
+
+    book = books.create_book(db, schemas.BookCreate(book_id="B1", title="Algebra", author="A", category="Maths", subject="Maths", total_copies=3), "admin@school.test")
+    books.create_book(db, schemas.BookCreate(book_id="B2", title="Poems", author="B", category="English", subject="English"), "admin@school.test")
+    student = students.create_student(db, schemas.StudentCreate(full_name="Jane", admission_number="1", class_id=cls.id))
+    other = students.create_student(db, schemas.StudentCreate(full_name="John", admission_number="2", class_id=cls.id))
+
+    circulation.borrow_book(db, book.id, student.id, "admin@school.test")
+    circulation.borrow_book(db, book.id, student.id, "admin@school.test")
+    record = db.query(models.BorrowRecord).first()
+    # Overdue loans are counted live, without waiting for a reconciliation
+    record.due_date = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    db.commit()
+    assert stored(db)["overdue_count"] == 1
+    circulation.return_book(db, record.id, "admin@school.test")
+
+    students.delete_student(db, other.id, "admin@school.test")
+
+    user = models.User(id=uuid.uuid4(), email="t@school.test", full_name="Teacher", role="none")
+    db.add(user)
+    db.commit()
+    counters.reconcile(db)
+    users.update_user_role(db, user.id, schemas.UserRoleUpdate(role="teacher"), ADMIN)
+
+    values = stored(db)
+    assert {name: values[name] for name in counters.COUNTER_NAMES} == counters.compute_counters(db)
+    assert values["total_books"] == 2
+    assert values["total_students"] == 1
+    assert values["active_borrows"] == 1
+    assert values["overdue_count"] == 0
+    assert values["total_teachers"] == 1
+    assert values["total_staff"] == 1
+    assert values["pending_registrations"] == 0
+
+def test_deletes_release_open_loans(db):
+    cls = models.Class(id=uuid.uuid4(), name="Form 1")
+    db.add(cls)
+    db.commit()
+    book = books.create_book(db, schemas.BookCreate(book_id="B1", title="Algebra", author="A", category="Maths", subject="Maths", total_copies=3), "admin@school.test")
+    other_book = books.create_book(db, schemas.BookCreate(book_id="B2", title="Poems", author="B", category="English", subject="English"), "admin@school.test")
+    jane = students.create_student(db, schemas.StudentCreate(full_name="Jane", admission_number="1", class_id=cls.id))
+    john = students.create_student(db, schemas.StudentCreate(full_name="John", admission_number="2", class_id=cls.id))
+
+    circulation.borrow_book(db, book.id, jane.id, "admin@school.test")
+    circulation.borrow_book(db, book.id, jane.id, "admin@school.test")
+    circulation.borrow_book(db, other_book.id, john.id, "admin@school.test")
+    assert stored(db)["active_borrows"] == 3
+
+    students.delete_student(db, jane.id, "admin@school.test")
+    assert stored(db)["active_borrows"] == 1
+    books.delete_book(db, other_book.id, "admin@school.test")
+    assert stored(db)["active_borrows"] == 0
+    assert counters.reconcile(db) == {}
+
+    # Loan history survives the deletes with the links cleared
+    records = db.query(models.BorrowRecord).all()
+    assert len(records) == 3
+    assert all(r.status == "borrowed" for r in records)
+    assert sum(r.student_id is None for r in records) == 2
+    assert sum(r.book_id is None for r in records) == 1
+
+def test_reconcile_corrects_drift(db):
+    db.add(models.Book(id=uuid.uuid4(), book_id="B9", title="Imported", category="Maths"))
+    db.commit()
+    assert stored(db)["total_books"] == 0
+
+    assert counters.reconcile(db) == {"total_books": 1}
+    assert stored(db)["total_books"] == 1
+    assert counters.reconcile(db) == {}
+
+def test_role_deltas():
+    assert counters.role_deltas("none", "teacher") == {"pending_registrations": -1, "total_staff": 1, "total_teachers": 1}
+    assert counters.role_deltas("teacher", "librarian") == {"total_staff": 0, "total_teachers": -1, "total_librarians": 1}
+    assert counters.role_deltas(None, "SUPER_ADMIN") == {"total_staff": 1}
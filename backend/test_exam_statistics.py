@@ -0,0 +1,115 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import cbc, exam_statistics, students as student_service, summary_refresh
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_exam_statistics.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    exam_statistics.statistics_cache.clear()
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        summary_refresh.flush()
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        exam_statistics.statistics_cache.clear()
+
+def seed(db):
+    """Marks out of 50: North 45, 35 / South 25, 15 -> 90, 70, 50, 30 percent."""
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    north = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    south = models.Stream(id=uuid.uuid4(), name="South", class_id=cls.id)
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    exam = models.Exam(id=uuid.uuid4(), subject_id=maths.id, name="Mid-term", term=TERM, year=YEAR)
+    db.add_all([cls, north, south, maths, exam])
+    students = []
+    for i, (marks, stream) in enumerate([(45, north), (35, north), (25, south), (15, south)]):
+        student = models.Student(id=uuid.uuid4(), full_name=f"Student {i}", admission_number=f"A{i}",
+                                 class_id=cls.id, stream_id=stream.id)
+        students.append(student.id)
+        db.add(student)
+        db.add(models.ExamResult(student_id=student.id, subject_id=maths.id, exam_id=exam.id,
+                                 term=TERM, year=YEAR, marks=marks, max_score=50))
+    db.commit()
+    return exam.id, maths.id, students
+
+def test_statistics_overall_and_per_stream(db):
+    exam_id, _, _ = seed(db)
+    stats = exam_statistics.get_exam_statistics(db, exam_id)
+    schemas.ExamStatisticsResponse(**stats)
+
+    overall = stats["overall"]
+    assert overall["count"] == 4
+    assert overall["mean"] == 60.0
+    assert overall["median"] == 60.0
+    assert overall["std_dev"] == 22.36
+    assert (overall["min"], overall["q1"], overall["q3"], overall["max"]) == (30.0, 45.0, 75.0, 90.0)
+    assert overall["levels"] == {"EE": 1, "ME": 1, "AE": 1, "BE": 1}
+    assert [b["count"] for b in overall["histogram"]] == [0, 0, 0, 1, 0, 1, 0, 1, 0, 1]
+
+    assert [c["name"] for c in stats["classes"]] == ["Grade 7"]
+    assert [(s["name"], s["mean"]) for s in stats["streams"]] == [("North", 80.0), ("South", 40.0)]
+
+def test_statistics_cached_until_results_change(db):
+    exam_id, subject_id, students = seed(db)
+    exam_statistics.get_exam_statistics(db, exam_id)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        exam_statistics.get_exam_statistics(db, exam_id)
+    finally:
+        query_stats.current_stats.reset(token)
+    assert stats.count == 0
+
+    cbc.create_exam_result(db, schemas.ExamResultCreate(
+        student_id=students[3], subject_id=subject_id, exam_id=exam_id, term=TERM, year=YEAR, marks=50, max_score=50
+    ))
+    refreshed = exam_statistics.get_exam_statistics(db, exam_id)
+    assert refreshed["overall"]["max"] == 100.0
+    assert refreshed["overall"]["levels"]["EE"] == 2
+
+def test_student_moves_and_deletes_refresh_statistics(db):
+    exam_id, _, students = seed(db)
+    north = db.query(models.Stream).filter(models.Stream.name == "North").one()
+    exam_statistics.get_exam_statistics(db, exam_id)
+
+    # Moving the 50% student to North changes both stream groups
+    student_service.update_student(db, students[2], schemas.StudentUpdate(stream_id=north.id))
+    stats = exam_statistics.get_exam_statistics(db, exam_id)
+    assert [(s["name"], s["count"]) for s in stats["streams"]] == [("North", 3), ("South", 1)]
+
+    # Deleting a student removes their result from the statistics
+    student_service.delete_student(db, students[0], "admin@school.test")
+    stats = exam_statistics.get_exam_statistics(db, exam_id)
+    assert stats["overall"]["count"] == 3 and stats["overall"]["max"] == 70.0
+
+def test_exam_without_results_and_missing_exam(db):
+    exam = models.Exam(id=uuid.uuid4(), subject_id=uuid.uuid4(), name="Opener", term=TERM, year=YEAR)
+    db.add(exam)
+    db.commit()
+
+    stats = exam_statistics.get_exam_statistics(db, exam.id)
+    assert stats["overall"]["count"] == 0 and stats["overall"]["mean"] is None
+    assert stats["classes"] == [] and stats["streams"] == []
+
+    assert exam_statistics.get_exam_statistics(db, uuid.uuid4()) is None
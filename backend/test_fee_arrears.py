@@ -0,0 +1,106 @@
+import sys
+import os
+import csv
+import io
+import uuid
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import finance
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_fee_arrears.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+NOW = datetime.datetime(2024, 6, 30, 12, 0)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    north = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    south = models.Stream(id=uuid.uuid4(), name="South", class_id=cls.id)
+    db.add_all([cls, north, south])
+
+    # (stream, [(type, amount, days ago)])
+    ledgers = [
+        # FIFO: the 12000 paid clears the oldest charge and 2000 of the next
+        (north, [("charge", 10000, 100), ("charge", 5000, 45), ("charge", 2000, 10), ("payment", 12000, 5)]),
+        (north, [("charge", 8000, 70)]),
+        # In credit: nothing outstanding
+        (south, [("charge", 3000, 200), ("payment", 5000, 150)]),
+        (south, [("charge", 4000, 120)]),
+    ]
+    for i, (stream, records) in enumerate(ledgers):
+        student = models.Student(id=uuid.uuid4(), full_name=f"Student {i}", admission_number=f"A{i}",
+                                 class_id=cls.id, stream_id=stream.id)
+        db.add(student)
+        for kind, amount, days_ago in records:
+            db.add(models.FeeRecord(student_id=student.id, type=kind, amount=amount, description=kind,
+                                    date=NOW - datetime.timedelta(days=days_ago)))
+    db.commit()
+    finance.rebuild_balances(db)
+    return cls.id, north.id, south.id
+
+def buckets(group):
+    return [group[key] for key, _, _ in finance.ARREARS_BUCKETS]
+
+def test_fifo_aging_grouped_by_stream_in_one_query(db):
+    seed(db)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        report = finance.get_arrears(db, as_of=NOW)
+    finally:
+        query_stats.current_stats.reset(token)
+    assert stats.count == 1
+    schemas.ArrearsReport(**report)
+
+    north, south = report["groups"]
+    assert (north["stream_name"], north["students_in_arrears"]) == ("North", 2)
+    assert buckets(north) == [2000, 3000, 8000, 0]
+    assert north["total"] == 13000
+    assert (south["stream_name"], south["students_in_arrears"]) == ("South", 1)
+    assert buckets(south) == [0, 0, 0, 4000]
+
+    assert report["totals"]["total"] == 17000
+    assert report["totals"]["students_in_arrears"] == 3
+
+def test_filters_and_settled_groups(db):
+    class_id, north_id, south_id = seed(db)
+    [group] = finance.get_arrears(db, stream_id=south_id, as_of=NOW)["groups"]
+    assert group["total"] == 4000
+
+    # Settling the debt drops the group from the report
+    student_id = db.query(models.Student.id).filter(models.Student.admission_number == "A3").scalar()
+    finance.record_payment(db, student_id, 4000, "Cash", None, "bursar@example.com")
+    assert finance.get_arrears(db, stream_id=south_id, as_of=NOW)["groups"] == []
+    assert len(finance.get_arrears(db, class_id=class_id, as_of=NOW)["groups"]) == 1
+
+def test_csv_export(db):
+    seed(db)
+    report = finance.get_arrears(db, as_of=NOW)
+    rows = list(csv.reader(io.StringIO("".join(finance.iter_arrears_csv(report)))))
+
+    assert rows[0] == ["Class", "Stream", "Students in arrears", "0-30 days", "31-60 days", "61-90 days", "90+ days", "Total"]
+    assert rows[1][:3] == ["Grade 7", "North", "2"]
+    assert rows[-1][0] == "All"
+    assert float(rows[-1][-1]) == 17000
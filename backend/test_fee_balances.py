@@ -0,0 +1,109 @@
+import sys
+import os
+import uuid
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import finance
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_fee_balances.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db, students=3):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    db.add(cls)
+    ids = []
+    for i in range(students):
+        student = models.Student(id=uuid.uuid4(), full_name=f"Student {i}", admission_number=f"A{i}", class_id=cls.id)
+        ids.append(student.id)
+        db.add(student)
+    db.commit()
+    return cls.id, ids
+
+def balances(db):
+    return {
+        b.student_id: (b.total_charged, b.total_paid, b.balance)
+        for b in db.query(models.StudentFeeBalance).all()
+    }
+
+def test_charges_and_payments_maintain_balances(db):
+    class_id, students = seed(db)
+    finance.bulk_charge(db, class_id, "Tuition", 10000, "Term 1", 2024, "bursar@example.com")
+    finance.bulk_charge(db, class_id, "Lunch", 2500, "Term 1", 2024, "bursar@example.com")
+    finance.record_payment(db, students[0], 4000, "M-Pesa", None, "bursar@example.com")
+    finance.record_payment(db, students[0], 1000, "Cash", None, "bursar@example.com")
+
+    maintained = balances(db)
+    assert maintained[students[0]] == (12500, 5000, 7500)
+    assert maintained[students[1]] == (12500, 0, 12500)
+
+    # The maintained totals match a full recount
+    finance.rebuild_balances(db)
+    assert balances(db) == maintained
+
+def test_school_balances_in_one_query(db):
+    class_id, students = seed(db)
+    finance.bulk_charge(db, class_id, "Tuition", 10000, "Term 1", 2024, "bursar@example.com")
+    db.add(models.Student(id=uuid.uuid4(), full_name="New", admission_number="A9", class_id=class_id))
+    db.commit()
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        rows = finance.get_balances(db, class_id=class_id)
+    finally:
+        query_stats.current_stats.reset(token)
+    assert stats.count == 1
+    assert [(r["admission_number"], r["balance"]) for r in rows] == [("A0", 10000), ("A1", 10000), ("A2", 10000), ("A9", 0)]
+    schemas.StudentFeeBalanceResponse(**rows[0])
+
+    assert len(finance.get_balances(db, skip=1, limit=2)) == 2
+
+def test_ledger_running_balance_and_keyset_pages(db):
+    _, [student] = seed(db, students=1)
+    start = datetime.datetime(2024, 1, 1)
+    for day, (kind, amount) in enumerate([("charge", 10000), ("payment", 3000), ("charge", 500), ("payment", 2000), ("payment", 1500)]):
+        db.add(models.FeeRecord(student_id=student, amount=amount, type=kind, description=f"{kind} {day}",
+                                date=start + datetime.timedelta(days=day)))
+    db.commit()
+    finance.rebuild_balances(db)
+
+    first = finance.get_ledger(db, student, limit=2)
+    assert first["balance"] == 4000
+    assert [(e["description"], e["running_balance"]) for e in first["history"]] == [("payment 4", 4000), ("payment 3", 5500)]
+
+    second = finance.get_ledger(db, student, cursor=first["next_cursor"], limit=2)
+    assert [e["running_balance"] for e in second["history"]] == [7500, 7000]
+
+    # A record added while paging does not shift later pages
+    db.add(models.FeeRecord(student_id=student, amount=100, type="charge", description="new", date=start + datetime.timedelta(days=30)))
+    db.commit()
+    third = finance.get_ledger(db, student, cursor=second["next_cursor"], limit=2)
+    assert [(e["description"], e["running_balance"]) for e in third["history"]] == [("charge 0", 10000)]
+    assert third["next_cursor"] is None
+    schemas.FeeLedgerResponse(**third)
+
+    with pytest.raises(HTTPException) as exc:
+        finance.get_ledger(db, student, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
@@ -0,0 +1,131 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, query_stats
+from app.database import Base
+from app.services import finance
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_fee_charging.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+BURSAR = "bursar@example.com"
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db, per_stream=3):
+    """Two classes with streams North and South, `per_stream` students in each stream."""
+    classes, streams = [], {}
+    for c in range(2):
+        cls = models.Class(id=uuid.uuid4(), name=f"Grade {7 + c}")
+        classes.append(cls.id)
+        db.add(cls)
+        for name in ["North", "South"]:
+            stream = models.Stream(id=uuid.uuid4(), name=name, class_id=cls.id)
+            streams.setdefault(name, []).append(stream.id)
+            db.add(stream)
+            for i in range(per_stream):
+                db.add(models.Student(id=uuid.uuid4(), full_name=f"{cls.name} {name} {i}",
+                                      admission_number=f"{c}{name[0]}{i}", class_id=cls.id, stream_id=stream.id))
+    db.commit()
+    return classes, streams
+
+def charge(db, class_ids, stream_ids=None, amount=10000):
+    return finance.bulk_charge_classes(db, class_ids, stream_ids, "Tuition", amount, "Term 1", 2024, BURSAR)
+
+def charges(db):
+    return db.query(models.FeeRecord).filter(models.FeeRecord.type == "charge").count()
+
+def test_charges_many_classes_in_fixed_statements(db):
+    classes, _ = seed(db, per_stream=10)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        result = charge(db, classes)
+    finally:
+        query_stats.current_stats.reset(token)
+
+    assert result["charged"] == 40
+    assert len(result["structure_ids"]) == 2
+    # Structure upsert and read-back, lock, balances, records and the audit log
+    # (insert + refresh); nothing scales with the number of students or classes
+    assert stats.count == 7
+
+    record = db.query(models.FeeRecord).first()
+    assert record.description == "Tuition (Term 1 2024)"
+    assert record.fee_structure_id in result["structure_ids"]
+    assert {b.balance for b in db.query(models.StudentFeeBalance)} == {10000}
+
+def test_rerun_is_idempotent_and_reaches_new_students(db):
+    classes, _ = seed(db)
+    assert charge(db, classes)["charged"] == 12
+    assert charge(db, classes)["charged"] == 0
+    assert charges(db) == 12
+    assert db.query(models.FeeStructure).count() == 2
+
+    late = models.Student(id=uuid.uuid4(), full_name="Late joiner", admission_number="L1", class_id=classes[0])
+    db.add(late)
+    db.commit()
+
+    structure_id = db.query(models.FeeStructure.id).filter(models.FeeStructure.class_id == classes[0]).scalar()
+    assert finance.charge_fee_structure(db, structure_id, None, BURSAR)["charged"] == 1
+    assert charges(db) == 13
+    assert db.query(models.StudentFeeBalance).filter_by(student_id=late.id).one().balance == 10000
+
+    # Balances still match a full recount
+    maintained = {b.student_id: b.balance for b in db.query(models.StudentFeeBalance)}
+    finance.rebuild_balances(db)
+    assert {b.student_id: b.balance for b in db.query(models.StudentFeeBalance)} == maintained
+
+def test_stream_filter_and_amount_conflict(db):
+    classes, streams = seed(db)
+    assert charge(db, classes, stream_ids=streams["North"])["charged"] == 6
+    # The rest of the classes can be charged later under the same structures
+    assert charge(db, classes)["charged"] == 6
+
+    with pytest.raises(HTTPException) as exc:
+        charge(db, classes, amount=12000)
+    assert exc.value.status_code == 409
+
+    with pytest.raises(HTTPException) as exc:
+        finance.charge_fee_structure(db, uuid.uuid4(), None, BURSAR)
+    assert exc.value.status_code == 404
+
+def test_single_class_bulk_charge(db):
+    classes, _ = seed(db)
+    result = finance.bulk_charge(db, classes[1], "Lunch", 2500, "Term 1", 2024, BURSAR)
+    assert result["message"] == "Successfully charged 6 students."
+
+def test_structure_created_elsewhere_is_reused(db):
+    classes, _ = seed(db)
+    # e.g. a concurrent charge of the same fee committed first
+    existing = models.FeeStructure(id=uuid.uuid4(), class_id=classes[0], title="Tuition", amount=10000, term="Term 1", year=2024)
+    db.add(existing)
+    db.commit()
+
+    assert charge(db, classes)["structure_ids"][0] == existing.id
+    assert db.query(models.FeeStructure).count() == 2
+
+    db.add(models.FeeStructure(id=uuid.uuid4(), class_id=classes[0], title="Tuition", amount=10000, term="Term 1", year=2024))
+    with pytest.raises(IntegrityError):
+        db.commit()
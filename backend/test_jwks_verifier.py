@@ -0,0 +1,111 @@
+import sys
+import os
+import json
+import time
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.token_verifier import JWKSVerifier, TokenVerificationError
+
+def make_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return pem, public_jwk
+
+def write_jwks(path, *keys):
+    path.write_text(json.dumps({"keys": list(keys)}))
+
+def mint(pem, kid, **claims):
+    payload = {"sub": "user_abc", "exp": int(time.time()) + 60, "iat": int(time.time()), **claims}
+    return jwt.encode(payload, pem, algorithm="RS256", headers={"kid": kid})
+
+@pytest.fixture
+def jwks_file(tmp_path):
+    return tmp_path / "jwks.json"
+
+class CountingVerifier(JWKSVerifier):
+    loads = 0
+
+    def _load_jwks(self):
+        self.loads += 1
+        return super()._load_jwks()
+
+def test_verifies_locally_after_single_fetch(jwks_file):
+    pem, public_jwk = make_key("k1")
+    write_jwks(jwks_file, public_jwk)
+    verifier = CountingVerifier(jwks_file=str(jwks_file))
+
+    for _ in range(5):
+        assert verifier.verify(mint(pem, "k1"))["sub"] == "user_abc"
+    assert verifier.loads == 1
+
+def test_first_fetch_not_throttled_on_fresh_host(jwks_file, monkeypatch):
+    # A freshly booted container's monotonic clock can read below the interval
+    monkeypatch.setattr("app.token_verifier.time.monotonic", lambda: 5.0)
+    pem, public_jwk = make_key("k1")
+    write_jwks(jwks_file, public_jwk)
+    verifier = CountingVerifier(jwks_file=str(jwks_file), min_refresh_interval=60)
+
+    assert verifier.verify(mint(pem, "k1"))["sub"] == "user_abc"
+    assert verifier.loads == 1
+
+def test_rejects_expired_and_tampered_tokens(jwks_file):
+    pem, public_jwk = make_key("k1")
+    other_pem, _ = make_key("k1")
+    write_jwks(jwks_file, public_jwk)
+    verifier = JWKSVerifier(jwks_file=str(jwks_file), leeway=0)
+
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(mint(pem, "k1", exp=int(time.time()) - 10))
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(mint(other_pem, "k1"))
+
+def test_key_rotation_triggers_throttled_refresh(jwks_file):
+    pem1, jwk1 = make_key("k1")
+    pem2, jwk2 = make_key("k2")
+    write_jwks(jwks_file, jwk1)
+    verifier = CountingVerifier(jwks_file=str(jwks_file), min_refresh_interval=0)
+    verifier.verify(mint(pem1, "k1"))
+
+    write_jwks(jwks_file, jwk1, jwk2)
+    assert verifier.verify(mint(pem2, "k2"))["sub"] == "user_abc"
+    assert verifier.loads == 2
+
+    # Unknown kids within the throttle window do not refetch
+    verifier.min_refresh_interval = 3600
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(mint(pem2, "unknown"))
+    assert verifier.loads == 2
+
+def test_failed_refresh_keeps_cached_keys(jwks_file):
+    pem, public_jwk = make_key("k1")
+    write_jwks(jwks_file, public_jwk)
+    verifier = JWKSVerifier(jwks_file=str(jwks_file), cache_ttl=0, min_refresh_interval=0)
+    verifier.verify(mint(pem, "k1"))
+
+    jwks_file.unlink()
+    assert verifier.verify(mint(pem, "k1"))["sub"] == "user_abc"
+
+def test_authorized_parties(jwks_file):
+    pem, public_jwk = make_key("k1")
+    write_jwks(jwks_file, public_jwk)
+    verifier = JWKSVerifier(jwks_file=str(jwks_file), authorized_parties=["https://olabs-ten.vercel.app"])
+
+    assert verifier.verify(mint(pem, "k1", azp="https://olabs-ten.vercel.app"))
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(mint(pem, "k1", azp="https://evil.example"))
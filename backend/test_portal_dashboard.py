@@ -0,0 +1,150 @@
+import sys
+import os
+import uuid
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import student_portal, student_features, timetable, finance
+from app.routers.student_auth import StudentPrincipal
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_portal_dashboard.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+def clear_caches():
+    student_portal.announcement_cache.clear()
+    timetable.timetable_cache.clear()
+
+@pytest.fixture
+def db():
+    clear_caches()
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        clear_caches()
+
+def seed(db):
+    now = datetime.datetime.utcnow()
+    today = datetime.datetime.now().isoweekday()
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    north = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    south = models.Stream(id=uuid.uuid4(), name="South", class_id=cls.id)
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    music = models.Subject(id=uuid.uuid4(), name="Music", class_id=cls.id)
+    teacher = models.User(id=uuid.uuid4(), full_name="Mr. Otieno", email="otieno@example.com", role="teacher")
+    student = models.Student(id=uuid.uuid4(), full_name="Amina", admission_number="A1", class_id=cls.id, stream_id=north.id)
+    student.subjects = [maths]
+    db.add_all([cls, north, south, maths, music, teacher, student])
+    db.add(models.TeacherSubjectAssignment(teacher_id=teacher.id, subject_id=maths.id, class_id=cls.id))
+
+    db.add_all([
+        models.TimetableSlot(stream_id=north.id, subject_id=maths.id, start_time="08:00", end_time="09:00",
+                             day_of_week=today, type="lesson"),
+        models.TimetableSlot(stream_id=north.id, start_time="10:00", end_time="10:30",
+                             day_of_week=today % 6 + 1, type="break"),
+        models.TimetableSlot(stream_id=south.id, subject_id=maths.id, start_time="08:00", end_time="09:00",
+                             day_of_week=today, type="lesson"),
+    ])
+
+    for i, (category, extra) in enumerate([
+        ("SCHOOL", {}),
+        ("STREAM", {"stream_id": north.id}),
+        ("STREAM", {"stream_id": south.id}),
+        ("SUBJECT", {"subject_id": maths.id}),
+        ("SUBJECT", {"subject_id": music.id}),
+    ]):
+        db.add(models.Announcement(title=f"Notice {i}", content="...", category=category, created_by_id=teacher.id,
+                                   created_at=now - datetime.timedelta(hours=i), **extra))
+
+    upcoming = models.Assignment(id=uuid.uuid4(), title="Upcoming", subject_id=maths.id, teacher_id=teacher.id,
+                                 due_date=now + datetime.timedelta(days=2))
+    overdue = models.Assignment(id=uuid.uuid4(), title="Overdue", subject_id=maths.id, teacher_id=teacher.id,
+                                due_date=now - datetime.timedelta(days=2))
+    handed_in = models.Assignment(id=uuid.uuid4(), title="Handed in", subject_id=maths.id, teacher_id=teacher.id,
+                                  due_date=now - datetime.timedelta(days=3))
+    later = models.Assignment(id=uuid.uuid4(), title="Later", subject_id=maths.id, teacher_id=teacher.id,
+                              due_date=now + datetime.timedelta(days=30))
+    other = models.Assignment(id=uuid.uuid4(), title="Not enrolled", subject_id=music.id, teacher_id=teacher.id,
+                              due_date=now + datetime.timedelta(days=1))
+    db.add_all([upcoming, overdue, handed_in, later, other])
+    db.add(models.AssignmentSubmission(assignment_id=handed_in.id, student_id=student.id, status="submitted"))
+
+    session_id = uuid.uuid4()
+    for status in ["present", "late", "absent", "present"]:
+        db.add(models.AttendanceRecord(attendance_session_id=session_id, student_id=student.id, status=status))
+    db.add_all([
+        models.FeeRecord(student_id=student.id, amount=15000, type="charge"),
+        models.FeeRecord(student_id=student.id, amount=4000, type="payment"),
+    ])
+    db.commit()
+    finance.rebuild_balances(db)
+    return StudentPrincipal(student.id, cls.id, north.id, True), teacher.id, north.id
+
+def dashboard(db, principal):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        return student_portal.get_dashboard(db, principal), stats.count
+    finally:
+        query_stats.current_stats.reset(token)
+
+def test_dashboard_sections(db):
+    principal, _, _ = seed(db)
+    data, _ = dashboard(db, principal)
+
+    assert [a["title"] for a in data["upcoming_assignments"]] == ["Upcoming"]
+    assert [a["title"] for a in data["overdue_assignments"]] == ["Overdue"]
+    assert data["attendance_percentage"] == 75.0
+    assert data["fee_balance"] == 11000
+
+    assert [a["title"] for a in data["announcements"]] == ["Notice 0", "Notice 1", "Notice 3"]
+    assert [a["target_name"] for a in data["announcements"]] == ["Whole School", "Grade 7. North", "Mathematics (Grade 7)"]
+    assert data["announcements"][0]["author_name"] == "Mr. Otieno"
+
+    assert len(data["timetable_weekly"]) == 2
+    [lesson] = data["timetable_today"]
+    assert (lesson["subject_name"], lesson["teacher_name"]) == ("Mathematics", "Mr. Otieno")
+    [brk] = [s for s in data["timetable_weekly"] if s["type"] == "break"]
+    assert (brk["subject_name"], brk["teacher_name"]) == ("Free", None)
+
+def test_dashboard_statement_count_is_fixed(db):
+    principal, _, _ = seed(db)
+    _, cold = dashboard(db, principal)
+    _, warm = dashboard(db, principal)
+    # Subject ids, assignments, aggregates + announcements, stream and timetable on a miss
+    assert cold == 6
+    assert warm == 3
+
+def test_announcement_writes_invalidate_dashboard(db):
+    principal, teacher_id, north_id = seed(db)
+    dashboard(db, principal)
+
+    created = student_features.create_announcement(
+        db, schemas.AnnouncementCreate(title="Sports day", content="Friday", category="SCHOOL"),
+        {"id": teacher_id, "role": "SUPER_ADMIN"}
+    )
+    data, _ = dashboard(db, principal)
+    assert data["announcements"][0]["title"] == "Sports day"
+
+    student_features.delete_announcement(db, created.id, {"id": teacher_id, "role": "SUPER_ADMIN"})
+    data, _ = dashboard(db, principal)
+    assert "Sports day" not in [a["title"] for a in data["announcements"]]
+
+    db.query(models.TimetableSlot).filter(models.TimetableSlot.stream_id == north_id).delete()
+    db.commit()
+    timetable.invalidate([north_id])
+    data, _ = dashboard(db, principal)
+    assert data["timetable_weekly"] == []
@@ -0,0 +1,139 @@
+import sys
+import os
+import time
+import uuid
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from fastapi import BackgroundTasks
+from fastapi.security import HTTPAuthorizationCredentials
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, auth
+from app.database import Base
+from app.cache import TTLCache
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_principal_cache.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# get_current_user reads through an AsyncSession; each asyncio.run() gets a fresh connection
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_principal_cache.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+class FakeUsers:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, user_id):
+        self.calls += 1
+        return {
+            "first_name": "Jane",
+            "last_name": "Doe",
+            "email_addresses": [{"email_address": "jane@school.test"}],
+            "public_metadata": {},
+        }
+
+@pytest.fixture
+def db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    fake_users = FakeUsers()
+    monkeypatch.setattr(auth.token_verifier, "verify", lambda token: {"sub": "user_abc", "exp": time.time() + 60})
+    monkeypatch.setattr(auth.clerk, "users", fake_users)
+    monkeypatch.setattr(auth, "SessionLocal", TestingSessionLocal)
+    auth.principal_cache.clear()
+    auth.profile_sync_marks.clear()
+    try:
+        yield db, fake_users
+    finally:
+        db.close()
+        auth.principal_cache.clear()
+        auth.profile_sync_marks.clear()
+        Base.metadata.drop_all(bind=engine)
+
+def resolve(db, background_tasks=None):
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+    background_tasks = background_tasks if background_tasks is not None else BackgroundTasks()
+
+    async def run():
+        async with AsyncTestingSessionLocal() as async_db:
+            return await auth.get_current_user(background_tasks=background_tasks, auth=creds, db=async_db)
+    return asyncio.run(run())
+
+def test_repeated_requests_are_served_from_cache(db):
+    session, fake_users = db
+    session.add(models.User(id=uuid.uuid4(), clerk_id="user_abc", email="jane@school.test", full_name="Jane Doe", role="teacher"))
+    session.commit()
+
+    for _ in range(10):
+        user = resolve(session)
+        assert user["role"] == "teacher"
+
+    # Linked users never hit Clerk on the request path
+    assert fake_users.calls == 0
+
+def test_linked_user_fast_path_defers_profile_sync(db):
+    session, fake_users = db
+    session.add(models.User(id=uuid.uuid4(), clerk_id="user_abc", email="old@school.test", full_name="Old Name", role="teacher"))
+    session.commit()
+
+    tasks = BackgroundTasks()
+    user = resolve(session, tasks)
+    assert user["email"] == "old@school.test"
+    assert not session.dirty and not session.new
+    assert len(tasks.tasks) == 1
+
+    # Only one sync is scheduled per interval
+    auth.principal_cache.clear()
+    more_tasks = BackgroundTasks()
+    resolve(session, more_tasks)
+    assert len(more_tasks.tasks) == 0
+
+    asyncio.run(tasks())
+    assert fake_users.calls == 1
+    session.expire_all()
+    synced = session.query(models.User).filter(models.User.clerk_id == "user_abc").first()
+    assert synced.email == "jane@school.test"
+    assert synced.full_name == "Jane Doe"
+    assert resolve(session)["email"] == "jane@school.test"
+
+def test_unlinked_user_is_linked_by_email(db):
+    session, fake_users = db
+    session.add(models.User(id=uuid.uuid4(), email="jane@school.test", full_name="Jane", role="librarian"))
+    session.commit()
+
+    user = resolve(session)
+    assert user["role"] == "librarian"
+    assert user["clerk_id"] == "user_abc"
+    assert fake_users.calls == 1
+
+def test_invalidation_picks_up_role_change(db):
+    session, fake_users = db
+    db_user = models.User(id=uuid.uuid4(), clerk_id="user_abc", email="jane@school.test", full_name="Jane Doe", role="teacher")
+    session.add(db_user)
+    session.commit()
+
+    assert resolve(session)["role"] == "teacher"
+    db_user.role = "admin"
+    session.commit()
+    auth.invalidate_principal("user_abc")
+
+    assert resolve(session)["role"] == "admin"
+
+def test_ttl_cache_respects_expiry_and_lru():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("expired", 4, expires_at=time.time() - 1)
+    assert cache.get("expired") is None
@@ -0,0 +1,86 @@
+import sys
+import os
+import uuid
+import pytest
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, query_stats
+from app.database import Base
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_query_stats.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+def get_test_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app = FastAPI()
+app.middleware("http")(query_stats.query_stats_middleware)
+
+@app.get("/classes")
+def list_class_streams(db: Session = Depends(get_test_db)):
+    # Lazy-loads streams once per class: the classic N+1
+    return [len(c.streams) for c in db.query(models.Class).all()]
+
+@app.get("/ping")
+def ping():
+    return {"ok": True}
+
+def setup_module():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    for i in range(6):
+        cls = models.Class(id=uuid.uuid4(), name=f"Grade {i}")
+        db.add_all([cls, models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)])
+    db.commit()
+    db.close()
+
+def teardown_module():
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def nplusone_logging(monkeypatch):
+    # N+1 logging is off by default outside development
+    monkeypatch.setattr(query_stats, "NPLUSONE_LOGGING_ENABLED", True)
+
+def test_headers_count_statements_per_request(capsys):
+    client = TestClient(app)
+    response = client.get("/classes")
+    assert response.json() == [1] * 6
+    assert response.headers["X-DB-Queries"] == "7"
+    assert float(response.headers["X-DB-Time"]) >= 0
+
+    out = capsys.readouterr().out
+    assert "[DB] Probable N+1 in GET /classes (list_class_streams): 6x" in out
+
+def test_requests_without_queries(capsys):
+    client = TestClient(app)
+    response = client.get("/ping")
+    assert response.headers["X-DB-Queries"] == "0"
+    assert "[DB]" not in capsys.readouterr().out
+
+def test_disabled_stats_add_no_headers(monkeypatch, capsys):
+    monkeypatch.setattr(query_stats, "QUERY_STATS_ENABLED", False)
+    client = TestClient(app)
+    response = client.get("/classes")
+    assert "X-DB-Queries" not in response.headers
+    assert "[DB]" not in capsys.readouterr().out
+
+def test_nplusone_logging_off_keeps_headers(monkeypatch, capsys):
+    monkeypatch.setattr(query_stats, "NPLUSONE_LOGGING_ENABLED", False)
+    client = TestClient(app)
+    response = client.get("/classes")
+    assert response.headers["X-DB-Queries"] == "7"
+    assert "[DB]" not in capsys.readouterr().out
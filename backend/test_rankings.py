@@ -0,0 +1,152 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import rankings, summary_refresh
+from app.services import cbc as cbc_service
+from app.routers import cbc as cbc_router
+from app.services import student_portal as portal_service
+from app.routers.student_auth import StudentPrincipal
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_rankings.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db):
+    """Two streams; Mathematics scores 90, 80, 80, 60 and English 70 for everyone."""
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    north = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    south = models.Stream(id=uuid.uuid4(), name="South", class_id=cls.id)
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    english = models.Subject(id=uuid.uuid4(), name="English", class_id=cls.id)
+    exam = models.Exam(id=uuid.uuid4(), subject_id=maths.id, name="Mid-term", term=TERM, year=YEAR)
+    db.add_all([cls, north, south, maths, english, exam])
+
+    students = []
+    for i, (score, stream) in enumerate([(90, north), (80, north), (80, south), (60, south)]):
+        student = models.Student(id=uuid.uuid4(), full_name=f"Student {i}", admission_number=f"A{i}",
+                                 class_id=cls.id, stream_id=stream.id)
+        students.append(student)
+        db.add(student)
+        db.add(models.SubjectTermResult(student_id=student.id, subject_id=maths.id, term=TERM, year=YEAR,
+                                        total_score=score, performance_level="EE"))
+        db.add(models.SubjectTermResult(student_id=student.id, subject_id=english.id, term=TERM, year=YEAR,
+                                        total_score=70, performance_level="ME"))
+        db.add(models.ExamResult(student_id=student.id, subject_id=maths.id, exam_id=exam.id, term=TERM, year=YEAR,
+                                 marks=score / 2, max_score=50))
+    db.commit()
+    return cls.id, (north.id, south.id), maths.id, exam.id, [s.id for s in students]
+
+def positions(db, scope, ref_id):
+    return [(r["admission_number"], r["position"], r["out_of"]) for r in rankings.get_rankings(db, TERM, YEAR, scope, ref_id)]
+
+def test_window_function_positions(db):
+    class_id, (north, south), maths, exam, students = seed(db)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        counts = rankings.compute_term_rankings(db, TERM, YEAR)
+    finally:
+        query_stats.current_stats.reset(token)
+    # One DELETE and one INSERT ... SELECT per scope, whatever the class size
+    assert stats.count == 5
+    assert counts == {"class": 4, "stream": 4, "subject": 8, "exam": 4}
+
+    assert positions(db, "class", class_id) == [("A0", 1, 4), ("A1", 2, 4), ("A2", 2, 4), ("A3", 4, 4)]
+    assert positions(db, "stream", south) == [("A2", 1, 2), ("A3", 2, 2)]
+    assert positions(db, "subject", maths) == [("A0", 1, 4), ("A1", 2, 4), ("A2", 2, 4), ("A3", 4, 4)]
+    assert positions(db, "exam", exam)[0] == ("A0", 1, 4)
+
+@pytest.mark.parametrize("tie_method, expected", [
+    ("standard", [1, 2, 2, 4]),
+    ("dense", [1, 2, 2, 3]),
+    ("ordinal", [1, 2, 3, 4]),
+])
+def test_tie_methods(db, tie_method, expected):
+    class_id, *_ = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR, tie_method)
+    assert [p for _, p, _ in positions(db, "class", class_id)] == expected
+
+def test_recompute_replaces_rows_and_rejects_unknown_tie_method(db):
+    class_id, *_ = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+    assert db.query(models.StudentRanking).count() == 20
+
+    with pytest.raises(HTTPException):
+        rankings.compute_term_rankings(db, TERM, YEAR, "random")
+
+def test_portal_results_include_positions(db):
+    class_id, (north, _), maths, exam, students = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+
+    results = portal_service.get_results(db, StudentPrincipal(students[1], class_id, north, True))
+    term = results[str(YEAR)][TERM]
+    assert term["positions"]["class"] == {"position": 2, "out_of": 4}
+    assert term["positions"]["stream"] == {"position": 2, "out_of": 2}
+    [subject] = [s for s in term["subjects"] if s["name"] == "Mathematics"]
+    assert subject["position"] == {"position": 2, "out_of": 4}
+    assert subject["exam_positions"]["Mid-term"] == {"position": 2, "out_of": 4}
+
+def test_class_scoped_recompute_leaves_other_classes(db):
+    class_id, *_ = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+    other = models.StudentRanking(term=TERM, year=YEAR, scope="class", ref_id=uuid.uuid4(),
+                                  student_id=uuid.uuid4(), score=50, position=1, out_of=1)
+    db.add(other)
+    db.commit()
+
+    counts = rankings.compute_term_rankings(db, TERM, YEAR, class_ids=[class_id])
+    assert counts == {"class": 4, "stream": 4, "subject": 8, "exam": 4}
+    assert db.query(models.StudentRanking).count() == 21
+
+def test_summary_refresh_updates_positions(db, monkeypatch):
+    monkeypatch.setattr(summary_refresh, "REFRESH_DELAY_SECONDS", 3600)
+    class_id, _, maths, exam, students = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+
+    # The last student tops Mathematics once their mark is corrected
+    cbc_service.create_exam_result(db, schemas.ExamResultCreate(
+        student_id=students[3], subject_id=maths, exam_id=exam, term=TERM, year=YEAR, marks=50, max_score=50
+    ))
+    summary_refresh.flush()
+    assert positions(db, "subject", maths)[0] == ("A3", 1, 4)
+    assert positions(db, "class", class_id)[0] == ("A3", 1, 4)
+
+def test_staff_report_card_matches_portal_card(db):
+    class_id, (north, _), *_, students = seed(db)
+    rankings.compute_term_rankings(db, TERM, YEAR)
+
+    card = cbc_router.get_student_report_card(students[1], (TERM, YEAR), db, {"role": "teacher"})
+    assert card == portal_service.get_report_card(db, StudentPrincipal(students[1], class_id, north, True), TERM, YEAR)
+    assert card["positions"]["class"] == {"position": 2, "out_of": 4}
+    schemas.FullReportCardResponse(**card)
+
+def test_only_admins_compute_rankings(db):
+    with pytest.raises(HTTPException) as exc:
+        cbc_router.compute_rankings(schemas.RankingComputeRequest(term=TERM, year=YEAR), db, {"role": "teacher"})
+    assert exc.value.status_code == 403
@@ -0,0 +1,189 @@
+import sys
+import os
+import uuid
+import time
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models
+from app.database import Base
+from app.services import recalculation
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_recalculation_jobs.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(recalculation, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(recalculation, "RECALC_CHUNK_SIZE", 2)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def make_subjects(db, count):
+    cls = models.Class(id=uuid.uuid4(), name="Form 1")
+    subjects = [models.Subject(id=uuid.uuid4(), name=f"Subject {i}", class_id=cls.id) for i in range(count)]
+    db.add(cls)
+    db.add_all(subjects)
+    return subjects
+
+def test_term_job_recalculates_every_subject(db):
+    term, year = "Term 1", 2024
+    db.add(models.TermExam(id=uuid.uuid4(), name="End-term", term=term, year=year))
+    subjects = make_subjects(db, 5)
+    students = [uuid.uuid4() for _ in range(3)]
+    for subject in subjects:
+        for i, sid in enumerate(students):
+            db.add(models.ExamResult(id=uuid.uuid4(), student_id=sid, subject_id=subject.id,
+                                     term=term, year=year, marks=50 + i * 20, max_score=100))
+    # Results from another term are not part of the job
+    db.add(models.ExamResult(id=uuid.uuid4(), student_id=students[0], subject_id=subjects[0].id,
+                             term="Term 2", year=year, marks=10, max_score=100))
+    db.commit()
+
+    job = recalculation.create_job(db, term, year)
+    assert job.status == "pending"
+    assert job.total_subjects == 5
+
+    recalculation.run_job(job.id)
+
+    db.expire_all()
+    job = recalculation.get_job(db, job.id)
+    assert job.status == "completed"
+    assert job.completed_subjects == 5 and job.failed_subjects == 0
+    assert {item.status for item in job.items} == {"completed"}
+    assert {item.summaries_count for item in job.items} == {3}
+    assert {item.subject_name for item in job.items} == {s.name for s in subjects}
+
+    assert db.query(models.SubjectTermResult).filter(models.SubjectTermResult.term == term).count() == 15
+    assert db.query(models.SubjectTermResult).filter(models.SubjectTermResult.term == "Term 2").count() == 0
+
+def test_failed_subject_is_recorded(db, monkeypatch):
+    term, year = "Term 1", 2024
+    db.add(models.TermExam(id=uuid.uuid4(), name="End-term", term=term, year=year))
+    subjects = make_subjects(db, 2)
+    for subject in subjects:
+        db.add(models.ExamResult(id=uuid.uuid4(), student_id=uuid.uuid4(), subject_id=subject.id,
+                                 term=term, year=year, marks=50, max_score=100))
+    db.commit()
+
+    original = recalculation.cbc.calculate_subject_term_summaries
+    def flaky(session, subject_id, term, year):
+        if subject_id == subjects[0].id:
+            raise RuntimeError("boom")
+        return original(session, subject_id, term, year)
+    monkeypatch.setattr(recalculation.cbc, "calculate_subject_term_summaries", flaky)
+
+    job = recalculation.create_job(db, term, year)
+    recalculation.run_job(job.id)
+
+    db.expire_all()
+    job = recalculation.get_job(db, job.id)
+    assert job.status == "completed_with_errors"
+    assert job.completed_subjects == 1 and job.failed_subjects == 1
+    failed = next(item for item in job.items if item.subject_id == subjects[0].id)
+    assert failed.status == "failed" and failed.error == "boom"
+
+def test_unknown_term_is_rejected(db):
+    with pytest.raises(HTTPException) as exc:
+        recalculation.create_job(db, "Term 9", 2024)
+    assert exc.value.status_code == 404
+
+def test_items_are_running_while_their_chunk_runs(db, monkeypatch):
+    term, year = "Term 1", 2024
+    db.add(models.TermExam(id=uuid.uuid4(), name="End-term", term=term, year=year))
+    subjects = make_subjects(db, 3)
+    for subject in subjects:
+        db.add(models.ExamResult(id=uuid.uuid4(), student_id=uuid.uuid4(), subject_id=subject.id,
+                                 term=term, year=year, marks=50, max_score=100))
+    db.commit()
+
+    seen = {}
+    original = recalculation.cbc.calculate_subject_term_summaries
+    def spy(session, subject_id, term, year):
+        observer = TestingSessionLocal()
+        try:
+            seen[subject_id] = {item.subject_id: item.status for item in observer.query(models.RecalculationJobItem)}
+        finally:
+            observer.close()
+        return original(session, subject_id, term, year)
+    monkeypatch.setattr(recalculation.cbc, "calculate_subject_term_summaries", spy)
+    monkeypatch.setattr(recalculation, "RECALC_CHUNK_SIZE", 3)
+
+    job = recalculation.create_job(db, term, year)
+    recalculation.run_job(job.id)
+
+    # One chunk: every subject is already marked running before the first one is computed
+    assert set(seen) == {s.id for s in subjects}
+    assert all("pending" not in statuses.values() for statuses in seen.values())
+    assert "running" in seen[subjects[2].id].values()
+
+    db.expire_all()
+    items = recalculation.get_job(db, job.id).items
+    assert all(item.started_at is not None and item.finished_at >= item.started_at for item in items)
+
+def test_jobs_with_stale_heartbeat_fail(db):
+    term, year = "Term 1", 2024
+    subjects = make_subjects(db, 3)
+    stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=recalculation.RECALC_STALE_SECONDS + 60)
+    job = models.RecalculationJob(term=term, year=year, status="running", total_subjects=3, completed_subjects=1, heartbeat_at=stale)
+    job.items = [
+        models.RecalculationJobItem(subject_id=subjects[0].id, status="completed"),
+        models.RecalculationJobItem(subject_id=subjects[1].id, status="running"),
+        models.RecalculationJobItem(subject_id=subjects[2].id, status="pending"),
+    ]
+    # Still heartbeating in another worker, and queued just now
+    live = models.RecalculationJob(term=term, year=year, status="running", heartbeat_at=datetime.datetime.utcnow())
+    queued = models.RecalculationJob(term=term, year=year, status="pending")
+    done = models.RecalculationJob(term=term, year=year, status="completed", heartbeat_at=stale)
+    db.add_all([job, live, queued, done])
+    db.commit()
+
+    assert recalculation.fail_interrupted_jobs(db) == 1
+
+    db.expire_all()
+    job = recalculation.get_job(db, job.id)
+    assert job.status == "failed" and job.finished_at is not None
+    assert (job.completed_subjects, job.failed_subjects) == (1, 2)
+    assert sorted(item.status for item in job.items) == ["completed", "failed", "failed"]
+    assert {item.error for item in job.items if item.status == "failed"} == {recalculation.INTERRUPTED_ERROR}
+    assert recalculation.get_job(db, live.id).status == "running"
+    assert recalculation.get_job(db, queued.id).status == "pending"
+    assert recalculation.get_job(db, done.id).status == "completed"
+    assert recalculation.fail_interrupted_jobs(db) == 0
+
+def test_running_job_heartbeats(db, monkeypatch):
+    term, year = "Term 1", 2024
+    db.add(models.TermExam(id=uuid.uuid4(), name="End-term", term=term, year=year))
+    subjects = make_subjects(db, 1)
+    db.add(models.ExamResult(id=uuid.uuid4(), student_id=uuid.uuid4(), subject_id=subjects[0].id,
+                             term=term, year=year, marks=50, max_score=100))
+    db.commit()
+    def slow(session, subject_id, term, year):
+        time.sleep(0.15)
+        return []
+    monkeypatch.setattr(recalculation.cbc, "calculate_subject_term_summaries", slow)
+    monkeypatch.setattr(recalculation, "RECALC_HEARTBEAT_SECONDS", 0.05)
+    beats = []
+    heartbeat = recalculation._heartbeat
+    monkeypatch.setattr(recalculation, "_heartbeat", lambda session, job_id: beats.append(job_id) or heartbeat(session, job_id))
+
+    job = recalculation.create_job(db, term, year)
+    recalculation.run_job(job.id)
+
+    assert beats and set(beats) == {job.id}
+    db.expire_all()
+    job = recalculation.get_job(db, job.id)
+    assert job.status == "completed" and job.heartbeat_at >= job.started_at
@@ -0,0 +1,116 @@
+import sys
+import os
+import json
+import uuid
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.requests import Request
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas
+from app.database import Base
+from app.services import admin_exams, report_cards
+from app.services import student_portal as portal_service
+from app.routers import student_portal
+from app.routers.student_auth import StudentPrincipal
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_report_card_snapshots.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_report_card_snapshots.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        admin_exams.calendar_cache.clear()
+
+def seed(db):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    student = models.Student(id=uuid.uuid4(), full_name="Amina", admission_number="A1", class_id=cls.id)
+    idle = models.Student(id=uuid.uuid4(), full_name="No Results", admission_number="A2", class_id=cls.id)
+    db.add_all([cls, maths, student, idle])
+    db.add(models.SubjectTermResult(
+        student_id=student.id, subject_id=maths.id, term=TERM, year=YEAR, total_score=72, performance_level="ME"
+    ))
+    db.add(models.TermReport(student_id=student.id, term=TERM, year=YEAR, total_days=60, present_days=59))
+    db.add(models.TermExam(id=uuid.uuid4(), name="End-term", term=TERM, year=YEAR, edit_status="current"))
+    db.commit()
+    return StudentPrincipal(student.id, cls.id, None, True)
+
+def set_status(db, edit_status):
+    admin_exams.batch_update_term_exams(db, schemas.TermExamBatchUpdate(term=TERM, year=YEAR, edit_status=edit_status))
+
+def snapshot_count(db):
+    return db.query(models.ReportCardSnapshot).count()
+
+def view(principal, if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    request = Request({"type": "http", "method": "GET", "path": "/report-card", "headers": headers})
+
+    async def run():
+        async with AsyncTestingSessionLocal() as async_db:
+            return await student_portal.get_student_report_card(
+                request, TERM, YEAR, current_student=principal, db=async_db
+            )
+    return asyncio.run(run())
+
+def test_completing_a_term_snapshots_report_cards(db):
+    principal = seed(db)
+
+    set_status(db, "completed")
+    # Only students with data for the term get a card
+    assert snapshot_count(db) == 1
+    live = portal_service.get_report_card(db, principal, TERM, YEAR)
+
+    snapshot = report_cards.get_snapshot(db, principal.id, TERM, YEAR)
+    document = json.loads(snapshot.document)
+    assert document["subjects"] == live["subjects"]
+    assert document["student"] == live["student"]
+    assert document["term_report"]["present_days"] == 59
+    # Positions are computed when the term is completed
+    assert document["positions"]["class"] == {"position": 1, "out_of": 1}
+
+    # Completing again keeps the existing snapshot
+    set_status(db, "completed")
+    assert report_cards.get_snapshot(db, principal.id, TERM, YEAR).etag == snapshot.etag
+
+    # Reopening drops it
+    set_status(db, "current")
+    assert snapshot_count(db) == 0
+
+def test_portal_serves_snapshot_with_etag(db):
+    principal = seed(db)
+
+    # Open term: built live, no validators
+    assert isinstance(view(principal), dict)
+
+    set_status(db, "completed")
+    live = portal_service.get_report_card(db, principal, TERM, YEAR)
+    response = view(principal)
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+    assert "max-age" in response.headers["cache-control"]
+    assert json.loads(response.body)["subjects"] == live["subjects"]
+
+    not_modified = view(principal, if_none_match=etag)
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+    assert view(principal, if_none_match='"stale"').status_code == 200
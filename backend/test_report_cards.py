@@ -0,0 +1,104 @@
+import sys
+import os
+import io
+import uuid
+import zipfile
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, query_stats
+from app.database import Base
+from app.services import report_cards
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_report_cards.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed(db, students=6):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    stream = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    item = models.ReportItem(id=uuid.uuid4(), name="Communication", type="competency")
+    db.add_all([cls, stream, maths, item])
+    db.add(models.User(id=uuid.uuid4(), email="teacher@example.com", full_name="Ms. Wanjiru", assigned_class_id=cls.id))
+    db.add(models.HeadTeacherCommentTemplate(id=uuid.uuid4(), level="EE", comment="Outstanding work."))
+
+    for i in range(students):
+        student = models.Student(
+            id=uuid.uuid4(), full_name=f"Student <{i}>", admission_number=f"ADM{i:03d}",
+            class_id=cls.id, stream_id=stream.id
+        )
+        db.add(student)
+        db.add(models.SubjectTermResult(
+            student_id=student.id, subject_id=maths.id, term=TERM, year=YEAR,
+            total_score=85, performance_level="EE"
+        ))
+        report = models.TermReport(
+            id=uuid.uuid4(), student_id=student.id, term=TERM, year=YEAR,
+            total_days=60, present_days=58, teacher_comment="Keep it up"
+        )
+        db.add(report)
+        db.add(models.TermReportEntry(report_id=report.id, item_id=item.id, level="ME"))
+    db.commit()
+    return cls.id, stream.id
+
+def test_loads_whole_class_in_fixed_queries(db):
+    class_id, stream_id = seed(db)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        cards = report_cards.load_class_report_cards(db, class_id, stream_id, TERM, YEAR)
+    finally:
+        query_stats.current_stats.reset(token)
+
+    assert stats.count == 7
+    assert len(cards) == 6
+    card = cards[0]
+    assert card["student"]["class_teacher"] == "Ms. Wanjiru"
+    assert card["student"]["stream"] == "North"
+    assert card["subjects"][0]["performance_level"] == "EE"
+    assert card["term_report"]["entries"][0]["item"]["name"] == "Communication"
+
+    page = report_cards.render_html(card)
+    assert "Student &lt;0&gt;" in page
+    # No head teacher comment on the report: the template for the dominant level is used
+    assert "Outstanding work." in page
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_zip_contains_one_card_per_student(db, monkeypatch, workers):
+    monkeypatch.setattr(report_cards, "REPORT_CARD_WORKERS", workers)
+    class_id, _ = seed(db, students=4)
+    cards = report_cards.load_class_report_cards(db, class_id, None, TERM, YEAR)
+
+    try:
+        data = b"".join(report_cards.iter_zip(cards, "html"))
+    finally:
+        report_cards.shutdown_pool()
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        assert names == [f"ADM00{i}-Student_{i}_.html" for i in range(4)]
+        assert b"ADM002" in archive.read(names[2])
+
+def test_empty_class_has_no_cards(db):
+    seed(db, students=0)
+    assert report_cards.load_class_report_cards(db, uuid.uuid4(), None, TERM, YEAR) == []
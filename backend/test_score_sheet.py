@@ -0,0 +1,136 @@
+import sys
+import os
+import io
+import csv
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import cbc, score_sheet, students, subjects
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_score_sheet.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    score_sheet.score_sheet_cache.clear()
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        score_sheet.score_sheet_cache.clear()
+
+def seed(db):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    english = models.Subject(id=uuid.uuid4(), name="English", class_id=cls.id)
+    amina = models.Student(id=uuid.uuid4(), full_name="Amina", admission_number="A1", class_id=cls.id)
+    brian = models.Student(id=uuid.uuid4(), full_name="Brian", admission_number="B2", class_id=cls.id)
+    db.add_all([cls, maths, english, amina, brian])
+    db.add(models.SubjectTermResult(
+        student_id=amina.id, subject_id=maths.id, term=TERM, year=YEAR, total_score=85, performance_level="EE"
+    ))
+    db.commit()
+    return cls.id, maths.id, english.id, amina.id, brian.id
+
+def count_statements(fn, *args):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        result = fn(*args)
+    finally:
+        query_stats.current_stats.reset(token)
+    return result, stats.count
+
+def test_columnar_sheet_is_cached(db):
+    class_id, maths, english, amina, brian = seed(db)
+
+    sheet, statements = count_statements(score_sheet.get_score_sheet, db, str(class_id), None, TERM, YEAR)
+    assert statements == 3
+    assert sheet["student_ids"] == [amina, brian]
+    assert sheet["subject_ids"] == [english, maths]
+    assert sheet["levels"] == [[None, "EE"], [None, None]]
+    schemas.ClassScoreSheetColumnarResponse(**sheet)
+
+    again, statements = count_statements(score_sheet.get_score_sheet, db, str(class_id), None, TERM, YEAR)
+    assert statements == 0
+    assert again is sheet
+
+def test_summary_writes_invalidate_matching_sheets(db):
+    class_id, maths, english, amina, brian = seed(db)
+    score_sheet.get_score_sheet(db, class_id, None, TERM, YEAR)
+    score_sheet.get_score_sheet(db, class_id, None, "Term 2", YEAR)
+    assert len(score_sheet.score_sheet_cache) == 2
+
+    cbc.create_or_update_subject_term_result(db, schemas.SubjectTermResultCreate(
+        student_id=brian, subject_id=english, term=TERM, year=YEAR, total_score=45, performance_level="AE"
+    ))
+    # Only the Term 1 sheet shows that summary
+    assert len(score_sheet.score_sheet_cache) == 1
+
+    sheet = score_sheet.get_score_sheet(db, class_id, None, TERM, YEAR)
+    assert sheet["levels"] == [[None, "EE"], ["AE", None]]
+
+    # Other classes' subjects leave the sheet alone
+    assert score_sheet.invalidate_subjects([uuid.uuid4()], TERM, YEAR) == 0
+
+def test_roster_and_subject_writes_invalidate_class_sheets(db):
+    class_id, maths, english, amina, brian = seed(db)
+    other_class = models.Class(id=uuid.uuid4(), name="Grade 8")
+    db.add(other_class)
+    db.commit()
+    score_sheet.get_score_sheet(db, other_class.id, None, TERM, YEAR)
+
+    def sheet():
+        return score_sheet.get_score_sheet(db, class_id, None, TERM, YEAR)
+
+    sheet()
+    carol = students.create_student(db, schemas.StudentCreate(full_name="Carol", admission_number="C3", class_id=class_id))
+    assert sheet()["student_names"] == ["Amina", "Brian", "Carol"]
+
+    students.update_student(db, brian, schemas.StudentUpdate(full_name="Brian O."))
+    assert sheet()["student_names"] == ["Amina", "Brian O.", "Carol"]
+
+    # Moving a student drops the sheets of both classes
+    score_sheet.get_score_sheet(db, other_class.id, None, TERM, YEAR)
+    students.update_student(db, carol.id, schemas.StudentUpdate(class_id=other_class.id))
+    assert sheet()["student_names"] == ["Amina", "Brian O."]
+    assert score_sheet.get_score_sheet(db, other_class.id, None, TERM, YEAR)["student_names"] == ["Carol"]
+
+    students.delete_student(db, brian, "admin@school.test")
+    assert sheet()["student_names"] == ["Amina"]
+
+    subjects.create_subject(db, schemas.SubjectCreate(name="Science", class_id=class_id, is_compulsory=False))
+    assert sheet()["subject_names"] == ["English", "Mathematics", "Science"]
+    subjects.delete_subject(db, english)
+    assert sheet()["subject_names"] == ["Mathematics", "Science"]
+
+def test_exports(db):
+    class_id, *_ = seed(db)
+    sheet = score_sheet.get_score_sheet(db, class_id, None, TERM, YEAR)
+
+    rows = list(csv.reader(io.StringIO("".join(score_sheet.iter_csv(sheet)))))
+    assert rows == [
+        ["Admission Number", "Student", "English", "Mathematics"],
+        ["A1", "Amina", "", "EE"],
+        ["B2", "Brian", "", ""],
+    ]
+
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.load_workbook(io.BytesIO(b"".join(score_sheet.iter_xlsx(sheet))))
+    values = [[cell or "" for cell in row] for row in workbook.active.iter_rows(values_only=True)]
+    assert values == rows
@@ -0,0 +1,109 @@
+import sys
+import os
+import uuid
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from fastapi import HTTPException
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas
+from app.database import Base
+from app.services import students as students_service
+from app.routers import student_auth
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_student_principal.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_student_principal.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+class NoQuerySession:
+    """Stands in for a session when the principal must be resolved from the token alone."""
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        raise AssertionError("students table should not be queried")
+
+    def query(self, *args, **kwargs):
+        raise AssertionError("students table should not be queried")
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    students_service.token_version_cache.clear()
+    try:
+        yield db
+    finally:
+        db.close()
+        students_service.token_version_cache.clear()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def student(db):
+    cls = models.Class(id=uuid.uuid4(), name="Form 1")
+    stream = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    student = models.Student(
+        id=uuid.uuid4(), full_name="Student User", admission_number="123",
+        class_id=cls.id, stream_id=stream.id, activated=True
+    )
+    db.add_all([cls, stream, student])
+    db.commit()
+    return student
+
+def resolve(token, db=None):
+    async def run():
+        if db is not None:
+            return await student_auth.get_current_student(token=token, db=db)
+        async with AsyncTestingSessionLocal() as async_db:
+            return await student_auth.get_current_student(token=token, db=async_db)
+    return asyncio.run(run())
+
+def test_principal_is_built_from_token_claims(db, student):
+    token = student_auth.create_access_token(student_auth.student_token_claims(student))
+
+    principal = resolve(token)
+    assert principal.id == student.id
+    assert principal.class_id == student.class_id
+    assert principal.stream_id == student.stream_id
+
+    # Version is cached: later requests never touch the students table
+    principal = resolve(token, NoQuerySession())
+    assert principal.stream_id == student.stream_id
+
+def test_reset_account_revokes_token(db, student):
+    token = student_auth.create_access_token(student_auth.student_token_claims(student))
+    resolve(token)
+
+    students_service.reset_student_account(db, student.id, "admin@school.test")
+
+    with pytest.raises(HTTPException) as exc:
+        resolve(token)
+    assert exc.value.status_code == 401
+
+def test_stream_change_revokes_token(db, student):
+    token = student_auth.create_access_token(student_auth.student_token_claims(student))
+    resolve(token)
+
+    new_stream = models.Stream(id=uuid.uuid4(), name="South", class_id=student.class_id)
+    db.add(new_stream)
+    db.commit()
+    students_service.update_student(db, student.id, schemas.StudentUpdate(stream_id=new_stream.id))
+
+    with pytest.raises(HTTPException):
+        resolve(token)
+
+    fresh = student_auth.create_access_token(student_auth.student_token_claims(student))
+    assert resolve(fresh).stream_id == new_stream.id
+
+def test_legacy_token_falls_back_to_row(db, student):
+    token = student_auth.create_access_token({"sub": str(student.id), "role": "student"})
+    assert resolve(token).class_id == student.class_id
@@ -0,0 +1,168 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas
+from app.database import Base
+from app.services import cbc as service
+from app.services import summary_refresh
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_summary_refresh.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db(monkeypatch):
+    # Keep the timer from firing mid-test; tests flush explicitly
+    monkeypatch.setattr(summary_refresh, "REFRESH_DELAY_SECONDS", 3600)
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        summary_refresh.flush()
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def result(student_id, subject_id, marks, exam_id=None):
+    return schemas.ExamResultCreate(
+        student_id=student_id, subject_id=subject_id, exam_id=exam_id or uuid.uuid4(),
+        term=TERM, year=YEAR, marks=marks, max_score=100
+    )
+
+def summaries_for(db, subject_id):
+    return {
+        s.student_id: s for s in db.query(models.SubjectTermResult).filter(
+            models.SubjectTermResult.subject_id == subject_id
+        ).populate_existing()
+    }
+
+def test_saving_a_result_refreshes_only_its_summary(db):
+    subject_id = uuid.uuid4()
+    s1, s2 = uuid.uuid4(), uuid.uuid4()
+    exam_id = uuid.uuid4()
+
+    service.create_exam_result(db, result(s1, subject_id, 80, exam_id))
+    service.create_exam_result(db, result(s2, subject_id, 50, exam_id))
+    assert summaries_for(db, subject_id) == {}
+    assert summary_refresh.flush() == 2
+
+    rows = summaries_for(db, subject_id)
+    assert rows[s1].total_score == 80 and rows[s1].performance_level == "EE"
+    assert rows[s2].total_score == 50 and rows[s2].performance_level == "AE"
+
+    # Updating one student's mark only marks that student's summary dirty
+    service.create_exam_result(db, result(s2, subject_id, 70, exam_id))
+    assert summary_refresh.pending_keys() == {(subject_id, TERM, YEAR, s2)}
+    assert summary_refresh.flush() == 1
+    rows = summaries_for(db, subject_id)
+    assert rows[s2].total_score == 70 and rows[s2].performance_level == "ME"
+    assert rows[s1].total_score == 80
+
+def test_bulk_save_keeps_explicit_summaries(db):
+    subject_id = uuid.uuid4()
+    s1, s2 = uuid.uuid4(), uuid.uuid4()
+    exam_id = uuid.uuid4()
+
+    sheet = schemas.BulkExamResultCreate(
+        results=[result(s1, subject_id, 90, exam_id), result(s2, subject_id, 30, exam_id)],
+        summaries=[schemas.SubjectTermResultCreate(
+            student_id=s1, subject_id=subject_id, term=TERM, year=YEAR,
+            total_score=75, performance_level="ME", remarks="Moderated"
+        )],
+    )
+    service.bulk_upsert_exam_results(db, sheet)
+
+    assert summary_refresh.pending_keys() == {(subject_id, TERM, YEAR, s2)}
+    summary_refresh.flush()
+
+    rows = summaries_for(db, subject_id)
+    assert rows[s1].total_score == 75 and rows[s1].remarks == "Moderated"
+    assert rows[s2].total_score == 30 and rows[s2].performance_level == "BE"
+
+def test_refresh_is_debounced(db, monkeypatch):
+    monkeypatch.setattr(summary_refresh, "REFRESH_DELAY_SECONDS", 0.05)
+    subject_id = uuid.uuid4()
+    students = [uuid.uuid4() for _ in range(3)]
+    for s in students:
+        service.create_exam_result(db, result(s, subject_id, 60))
+
+    timer = summary_refresh._timer
+    assert timer is not None
+    timer.join(5)
+
+    assert summary_refresh.pending_keys() == set()
+    assert set(summaries_for(db, subject_id)) == set(students)
+
+def test_queued_keys_survive_a_restart(db):
+    subject_id, s1 = uuid.uuid4(), uuid.uuid4()
+    service.create_exam_result(db, result(s1, subject_id, 80))
+
+    # A new process knows nothing about the keys queued by the old one
+    summary_refresh._binds.clear()
+    assert summary_refresh.flush() == 0
+    assert db.query(models.PendingSummaryRefresh).count() == 1
+
+    # Startup drains the queue of the app's database
+    assert summary_refresh.flush(engine) == 1
+    assert db.query(models.PendingSummaryRefresh).count() == 0
+    assert set(summaries_for(db, subject_id)) == {s1}
+
+def test_failed_refresh_is_retried_with_backoff(db, monkeypatch):
+    monkeypatch.setattr(summary_refresh, "REFRESH_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(summary_refresh, "_failed_flushes", 0)
+    subject_id, s1 = uuid.uuid4(), uuid.uuid4()
+    service.create_exam_result(db, result(s1, subject_id, 80))
+    summary_refresh._timer.cancel()
+
+    calculate = service.calculate_subject_term_summaries
+    calls = []
+    def flaky(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return calculate(*args, **kwargs)
+    monkeypatch.setattr(service, "calculate_subject_term_summaries", flaky)
+
+    assert summary_refresh.flush() == 0
+    assert summary_refresh._failed_flushes == 1
+    timer = summary_refresh._timer
+    assert timer is not None and timer.interval == 0.1
+
+    # The retry runs by itself, without another write
+    timer.join(5)
+    assert len(calls) == 2
+    assert summary_refresh._failed_flushes == 0
+    assert summary_refresh.pending_keys() == set()
+    assert set(summaries_for(db, subject_id)) == {s1}
+
+def test_deleting_an_exam_refreshes_its_summaries(db):
+    subject_id = uuid.uuid4()
+    s1, s2 = uuid.uuid4(), uuid.uuid4()
+    cat = models.Exam(id=uuid.uuid4(), subject_id=subject_id, name="CAT", term=TERM, year=YEAR)
+    final = models.Exam(id=uuid.uuid4(), subject_id=subject_id, name="Final", term=TERM, year=YEAR)
+    db.add_all([cat, final])
+    db.commit()
+
+    service.create_exam_result(db, result(s1, subject_id, 40, cat.id))
+    service.create_exam_result(db, result(s1, subject_id, 80, final.id))
+    service.create_exam_result(db, result(s2, subject_id, 50, cat.id))
+    summary_refresh.flush()
+
+    assert service.delete_exam(db, cat.id)
+    assert summary_refresh.pending_keys() == {(subject_id, TERM, YEAR, s1), (subject_id, TERM, YEAR, s2)}
+    summary_refresh.flush()
+
+    # s1 keeps a summary from the remaining exam; s2 has no results left
+    rows = summaries_for(db, subject_id)
+    assert set(rows) == {s1}
+    assert rows[s1].total_score == 80
@@ -0,0 +1,104 @@
+import sys
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import cbc as service
+from app.routers import cbc as cbc_router
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_term_report_bulk.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+TERM, YEAR = "Term 1", 2024
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def seed_items(db, count=3):
+    items = [models.ReportItem(id=uuid.uuid4(), name=f"Item {i}", type="value", order=i) for i in range(count)]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+def class_sheet(student_ids, levels, comment="Good term"):
+    return [
+        schemas.TermReportCreate(
+            student_id=s, term=TERM, year=YEAR, total_days=60, present_days=55,
+            teacher_comment=comment,
+            entries=[schemas.TermReportEntryCreate(item_id=item_id, level=level) for item_id, level in levels.items()]
+        )
+        for s in student_ids
+    ]
+
+def save(db, reports):
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        result = service.upsert_term_reports(db, reports)
+    finally:
+        query_stats.current_stats.reset(token)
+    return result, stats.count
+
+def entry_levels(db, student_id):
+    return {
+        e.item_id: e.level for e in db.query(models.TermReportEntry).join(models.TermReport).filter(
+            models.TermReport.student_id == student_id
+        )
+    }
+
+def test_bulk_save_applies_entry_diff(db):
+    items = seed_items(db)
+    small = [uuid.uuid4() for _ in range(5)]
+    large = [uuid.uuid4() for _ in range(40)]
+
+    result, statements_small = save(db, class_sheet(small, {items[0]: "EE", items[1]: "ME"}))
+    assert result == {"reports": 5, "entries_inserted": 10, "entries_updated": 0, "entries_deleted": 0}
+    _, statements_large = save(db, class_sheet(large, {items[0]: "EE", items[1]: "ME"}))
+    assert statements_large == statements_small
+
+    # Change one level, drop one item and add another
+    result, _ = save(db, class_sheet(small, {items[0]: "AE", items[2]: "BE"}, comment="Revised"))
+    assert result == {"reports": 5, "entries_inserted": 5, "entries_updated": 5, "entries_deleted": 5}
+    assert entry_levels(db, small[0]) == {items[0]: "AE", items[2]: "BE"}
+
+    headers = db.query(models.TermReport).filter(models.TermReport.student_id.in_(small)).all()
+    assert {h.teacher_comment for h in headers} == {"Revised"}
+    assert db.query(models.TermReport).count() == 45
+
+    # Re-sending the same sheet writes no entries
+    result, _ = save(db, class_sheet(small, {items[0]: "AE", items[2]: "BE"}, comment="Revised"))
+    assert result["entries_inserted"] == result["entries_updated"] == result["entries_deleted"] == 0
+
+def test_reports_without_entries_keep_them(db):
+    items = seed_items(db)
+    student = uuid.uuid4()
+    save(db, class_sheet([student], {items[0]: "EE"}))
+
+    header_only = schemas.TermReportCreate(student_id=student, term=TERM, year=YEAR, present_days=50, entries=[])
+    result, _ = save(db, [header_only])
+    assert result["entries_deleted"] == 0
+    assert entry_levels(db, student) == {items[0]: "EE"}
+
+def test_single_report_endpoint_uses_diff(db):
+    items = seed_items(db)
+    student = uuid.uuid4()
+    report = cbc_router.upsert_term_report(class_sheet([student], {items[0]: "ME", items[1]: "EE"})[0], db=db, teacher={})
+    assert report.present_days == 55
+    assert {e.item_id: e.level for e in report.entries} == {items[0]: "ME", items[1]: "EE"}
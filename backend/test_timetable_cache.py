@@ -0,0 +1,126 @@
+import sys
+import os
+import json
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+from starlette.requests import Request
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, schemas, query_stats
+from app.database import Base
+from app.services import timetable, subjects, streams
+from app.routers import timetable as timetable_router
+
+# Setup test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_timetable_cache.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_stats.instrument_engine(engine)
+
+ADMIN = {"id": str(uuid.uuid4()), "role": "SUPER_ADMIN"}
+
+@pytest.fixture
+def db():
+    timetable.timetable_cache.clear()
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        timetable.timetable_cache.clear()
+
+def seed(db):
+    cls = models.Class(id=uuid.uuid4(), name="Grade 7")
+    stream = models.Stream(id=uuid.uuid4(), name="North", class_id=cls.id)
+    maths = models.Subject(id=uuid.uuid4(), name="Mathematics", class_id=cls.id)
+    english = models.Subject(id=uuid.uuid4(), name="English", class_id=cls.id)
+    otieno = models.User(id=uuid.uuid4(), full_name="Mr. Otieno", email="otieno@example.com", role="teacher")
+    achieng = models.User(id=uuid.uuid4(), full_name="Ms. Achieng", email="achieng@example.com", role="teacher")
+    db.add_all([cls, stream, maths, english, otieno, achieng])
+    db.add(models.TeacherSubjectAssignment(teacher_id=otieno.id, subject_id=maths.id, class_id=cls.id))
+    slots = []
+    for day in range(1, 6):
+        for hour, subject in [(8, maths), (9, english), (10, None)]:
+            slot = models.TimetableSlot(id=uuid.uuid4(), stream_id=stream.id, subject_id=subject.id if subject else None,
+                                        start_time=f"{hour:02d}:00", end_time=f"{hour + 1:02d}:00", day_of_week=day,
+                                        type="lesson" if subject else "break")
+            slots.append(slot)
+    db.add_all(slots)
+    db.commit()
+    return stream.id, maths.id, english.id, achieng.id, slots[0].id
+
+def fetch(db, stream_id, if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    request = Request({"type": "http", "method": "GET", "path": "/timetable", "headers": headers})
+    return timetable_router.get_timetable_by_stream(stream_id, request, db=db, current_user=ADMIN)
+
+def test_compiled_in_one_query_and_shared(db):
+    stream_id, *_ = seed(db)
+
+    stats = query_stats.RequestQueryStats()
+    token = query_stats.current_stats.set(stats)
+    try:
+        response = fetch(db, stream_id)
+        # Stream lookup + one join for all 15 slots
+        assert stats.count == 2
+        fetch(db, stream_id)
+        assert stats.count == 2
+    finally:
+        query_stats.current_stats.reset(token)
+
+    slots = json.loads(response.body)
+    assert len(slots) == 15
+    first = slots[0]
+    assert (first["day_of_week"], first["subject_name"], first["teacher_name"]) == (1, "Mathematics", "Mr. Otieno")
+    # Lessons without a teacher show "-", breaks show no teacher
+    assert {(s["subject_name"], s["teacher_name"]) for s in slots[1:3]} == {("English", "-"), ("Free", None)}
+
+def test_etag_revalidation(db):
+    stream_id, *_ = seed(db)
+    response = fetch(db, stream_id)
+    etag = response.headers["etag"]
+
+    not_modified = fetch(db, stream_id, if_none_match=etag)
+    assert not_modified.status_code == 304
+    assert fetch(db, stream_id, if_none_match='"stale"').status_code == 200
+
+def test_writes_invalidate(db):
+    stream_id, maths_id, english_id, achieng_id, first_slot = seed(db)
+    etag = fetch(db, stream_id).headers["etag"]
+
+    timetable_router.bulk_update_timetable_slots(
+        schemas.TimetableSlotBulkUpdate(updates=[{"id": first_slot, "subject_id": english_id}]), db=db, admin_user=ADMIN
+    )
+    response = fetch(db, stream_id, if_none_match=etag)
+    assert response.status_code == 200
+    assert json.loads(response.body)[0]["subject_name"] == "English"
+
+    etag = response.headers["etag"]
+    subjects.batch_update_teacher_assignments(db, [schemas.SubjectTeacherPair(subject_id=english_id, teacher_id=achieng_id)])
+    response = fetch(db, stream_id, if_none_match=etag)
+    assert json.loads(response.body)[0]["teacher_name"] == "Ms. Achieng"
+
+    timetable_router.delete_timetable_slot(first_slot, db=db, admin_user=ADMIN)
+    assert len(json.loads(fetch(db, stream_id).body)) == 14
+
+def test_deleted_stream_is_not_served(db):
+    stream_id, *_ = seed(db)
+    assert fetch(db, stream_id).status_code == 200
+
+    streams.delete_stream(db, stream_id, "admin@school.test")
+    with pytest.raises(HTTPException) as exc:
+        fetch(db, stream_id)
+    assert exc.value.status_code == 404
+
+def test_unknown_stream(db):
+    seed(db)
+    with pytest.raises(HTTPException) as exc:
+        fetch(db, uuid.uuid4())
+    assert exc.value.status_code == 404